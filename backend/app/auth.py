@@ -1,10 +1,15 @@
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS
+
+logger = logging.getLogger(__name__)
 
 # Prefer pure-Python schemes to avoid bcrypt backend issues in CI
 # Use only pure-Python schemes to avoid binary backend issues on serverless
@@ -30,6 +35,41 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+_hash_executor: Optional[Executor] = None
+
+
+def _get_hash_executor() -> Executor:
+    """Lazily create the bounded pool used for PBKDF2 work."""
+    global _hash_executor
+    if _hash_executor is None:
+        workers = max(1, PASSWORD_HASH_WORKERS)
+        if PASSWORD_HASH_EXECUTOR == "process":
+            try:
+                _hash_executor = ProcessPoolExecutor(max_workers=workers)
+            except Exception as e:
+                logger.warning(f"Process pool unavailable for password hashing ({e}); using threads")
+        if _hash_executor is None:
+            _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+    return _hash_executor
+
+
+def shutdown_hash_executor():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False)
+        _hash_executor = None
+
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), get_password_hash, password)
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -41,6 +81,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def create_scoped_token(subject: str, scope: str, expires_delta: timedelta, **claims) -> str:
+    """Short-lived token for one purpose (e.g. an SSE URL); it is not accepted as an access token."""
+    return create_access_token({**claims, "sub": subject, "scope": scope}, expires_delta)
+
+
+def decode_scoped_token(token: Optional[str], scope: str) -> Optional[dict]:
+    """Claims of a valid token created for `scope`, else None."""
+    try:
+        payload = jwt.decode(token or "", SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload if payload.get("scope") == scope and payload.get("sub") else None
+
+
+def token_subject(token: Optional[str]) -> Optional[str]:
+    """The "sub" of a valid token, or None (for code outside the dependency system)."""
+    try:
+        payload = jwt.decode(token or "", SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    # Scoped tokens only work where their scope is checked
+    return None if payload.get("scope") else payload.get("sub")
+
+
 def decode_access_token(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,7 +114,7 @@ def decode_access_token(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope"):
             raise credentials_exception
         return user_id
     except JWTError:
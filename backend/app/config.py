@@ -5,6 +5,16 @@ load_dotenv()
 
 # MongoDB settings
 MONGODB_URI = os.getenv("MONGODB_URI") or os.getenv("MONGO_URI") or "mongodb://localhost:27017/"
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "1000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+# 0 disables the socket timeout (pymongo default)
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+# primary | primaryPreferred | secondary | secondaryPreferred | nearest
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# Threads dedicated to running pymongo calls for async route handlers
+MONGO_EXECUTOR_WORKERS = int(os.getenv("MONGO_EXECUTOR_WORKERS", "16"))
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -12,6 +22,95 @@ ALGORITHM = "HS256"
 # Support both ACCESS_TOKEN_EXPIRE_MINUTES and legacy JWT_EXPIRATION_MINUTES
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", os.getenv("JWT_EXPIRATION_MINUTES", "30")))
 
+# Password hashing runs off the event loop in a bounded pool.
+# "process" isolates the CPU-heavy PBKDF2 work; "thread" suits serverless runtimes.
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread" if os.getenv("VERCEL") == "1" else "process")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Per-process user profile cache used by authenticated endpoints (0 disables)
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "1024"))
+
+# Meal plans store recipes by content hash in the `recipes` collection
+RECIPE_DEDUP_ENABLED = os.getenv("RECIPE_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+RECIPE_CACHE_MAXSIZE = int(os.getenv("RECIPE_CACHE_MAXSIZE", "4096"))
+
+# Plans older than this many days move from meal_plans into compressed monthly bundles
+MEALPLAN_ARCHIVE_AFTER_DAYS = int(os.getenv("MEALPLAN_ARCHIVE_AFTER_DAYS", "90"))
+
+# Ingredient storage: "documents" (one per item), "inventory" (one per user) or
+# "dual" (write both, read inventory first) while migrating between them
+INGREDIENT_LAYOUT = os.getenv("INGREDIENT_LAYOUT", "documents").lower()
+
+# When today's plan already exists: "always" reuse it, reuse it only "if_unchanged"
+# (same ingredients as when it was generated), or "never" reuse (regenerate)
+PLAN_REUSE_POLICY = os.getenv("PLAN_REUSE_POLICY", "always").strip().lower()
+if PLAN_REUSE_POLICY not in ("always", "if_unchanged", "never"):
+    raise ValueError(f"PLAN_REUSE_POLICY must be always, if_unchanged or never, not {PLAN_REUSE_POLICY!r}")
+
+# Provisional plans whose background upgrade is still "pending" after this long
+# are marked failed (the upgrade task died with its process)
+PLAN_UPGRADE_STALE_MINUTES = int(os.getenv("PLAN_UPGRADE_STALE_MINUTES", "15"))
+
+# Idempotency-Key: how long responses are kept for replay, how long a
+# duplicate waits for an in-flight original before answering 409, and how long
+# a claimed key stays "pending" before another request may take it over (an
+# original whose worker died never completes; keep this above the slowest request)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "60"))
+IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "300"))
+
+# Inbound limits for plan-generating endpoints: a per-user token bucket
+# (RATE/minute refill, BURST capacity) and a global cap on concurrent LLM
+# generations with a bounded wait queue; beyond that requests are shed (429)
+GENERATION_RATE_PER_MINUTE = float(os.getenv("GENERATION_RATE_PER_MINUTE", "6"))
+GENERATION_BURST = int(os.getenv("GENERATION_BURST", "3"))
+GENERATION_MAX_CONCURRENT = int(os.getenv("GENERATION_MAX_CONCURRENT", "8"))
+GENERATION_MAX_QUEUE = int(os.getenv("GENERATION_MAX_QUEUE", "16"))
+GENERATION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GENERATION_QUEUE_TIMEOUT_SECONDS", "20"))
+
+# Outbound LLM quota per provider (requests and tokens per minute). Interactive
+# calls wait up to PROVIDER_INTERACTIVE_WAIT_SECONDS and always go first; batch
+# (scheduler) calls only use capacity above PROVIDER_BATCH_HEADROOM of the budget
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "60"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "150000"))
+PROVIDER_BATCH_HEADROOM = float(os.getenv("PROVIDER_BATCH_HEADROOM", "0.25"))
+PROVIDER_INTERACTIVE_WAIT_SECONDS = float(os.getenv("PROVIDER_INTERACTIVE_WAIT_SECONDS", "10"))
+PROVIDER_BATCH_WAIT_SECONDS = float(os.getenv("PROVIDER_BATCH_WAIT_SECONDS", "900"))
+
+# Cross-user plan reuse: serve an adapted copy of a stored plan whose ingredient
+# set is Jaccard-similar (>= THRESHOLD) to the pantry instead of calling the LLM.
+# Candidates come from a MinHash/LSH index of BANDS x ROWS hash functions.
+PLAN_SIMILARITY_REUSE = os.getenv("PLAN_SIMILARITY_REUSE", "false").lower() in ("1", "true", "yes")
+PLAN_SIMILARITY_THRESHOLD = float(os.getenv("PLAN_SIMILARITY_THRESHOLD", "0.8"))
+PLAN_SIMILARITY_BANDS = int(os.getenv("PLAN_SIMILARITY_BANDS", "16"))
+PLAN_SIMILARITY_ROWS = int(os.getenv("PLAN_SIMILARITY_ROWS", "4"))
+
+# Local recipe corpus (JSON, see services/recipe_corpus.py); empty uses app/data/recipe_corpus.json.
+# LOCAL_CORPUS_FIRST serves corpus plans before calling any LLM when the pantry covers all meals.
+RECIPE_CORPUS_PATH = os.getenv("RECIPE_CORPUS_PATH", "")
+LOCAL_CORPUS_FIRST = os.getenv("LOCAL_CORPUS_FIRST", "false").lower() in ("1", "true", "yes")
+
+# Beginner-mode step templates (JSON, see services/beginner_mode.py); empty uses app/data/beginner_templates.json.
+# Rendered step lists are kept in an LRU cache of this many entries.
+BEGINNER_TEMPLATES_PATH = os.getenv("BEGINNER_TEMPLATES_PATH", "")
+BEGINNER_STEPS_CACHE_SIZE = int(os.getenv("BEGINNER_STEPS_CACHE_SIZE", "1024"))
+
+# Scheduler pre-generation: build today's plan at batch priority up to this many
+# minutes before each user's delivery time so delivery reuses it (0 disables)
+SCHEDULER_PREGENERATE_MINUTES = int(os.getenv("SCHEDULER_PREGENERATE_MINUTES", "60"))
+
+# /agentic/run?mode=job: concurrent background runs per process, and how long job records are kept
+AGENTIC_JOB_CONCURRENCY = int(os.getenv("AGENTIC_JOB_CONCURRENCY", "4"))
+AGENTIC_JOB_TTL_HOURS = int(os.getenv("AGENTIC_JOB_TTL_HOURS", "24"))
+# Jobs run in the process that accepted them and are lost if it stops: queued/running
+# jobs whose heartbeat (once a minute) stopped this long ago are marked failed
+AGENTIC_JOB_STALE_MINUTES = int(os.getenv("AGENTIC_JOB_STALE_MINUTES", "5"))
+# Lifetime of the job-scoped token in events_url (EventSource cannot send headers)
+AGENTIC_STREAM_TOKEN_SECONDS = int(os.getenv("AGENTIC_STREAM_TOKEN_SECONDS", "600"))
+
 # WhatsApp webhook verification (Meta Cloud legacy support)
 WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "")
 
@@ -0,0 +1,165 @@
+"""
+Async data-access layer for the FastAPI routes.
+
+pymongo is synchronous, so every call here runs on a dedicated, bounded
+executor and async handlers never block the event loop on Mongo I/O. The
+scheduler and maintenance scripts keep using the sync collections in
+app.database directly.
+"""
+import asyncio
+import functools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypedDict
+
+from bson import ObjectId
+
+from app.config import MONGO_EXECUTOR_WORKERS
+from app.database import (
+    mealplans_col,
+    users_col,
+    find_user_by_email,
+    update_user_by_email,
+)
+from app.services import inventory
+from app.services.archive import load_plan_history
+from app.services.plan_similarity import index_plan
+from app.services.recipe_store import dehydrate_plan, hydrate_plan
+
+_executor = ThreadPoolExecutor(max_workers=max(1, MONGO_EXECUTOR_WORKERS), thread_name_prefix="mongo")
+
+
+async def run_db(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking pymongo call on the Mongo executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+class UserDoc(TypedDict, total=False):
+    _id: ObjectId
+    name: str
+    email: str
+    phone: str
+    password: str
+    whatsappVerified: bool
+    timezone: str
+    delivery_time: str
+    delivery_date: str
+    delivery_enabled: bool
+
+
+class IngredientDoc(TypedDict, total=False):
+    _id: ObjectId
+    name: str
+    name_key: str
+    quantity: float
+    unit: str
+    user_id: str
+
+
+class MealPlanDoc(TypedDict, total=False):
+    _id: ObjectId
+    user_id: str
+    date: str
+    created_at: str
+    origin: str
+    breakfast: dict
+    lunch: dict
+    dinner: dict
+    whatsapp_sent_at: str
+
+
+class UserRepository:
+    async def get(self, email: str, projection: Optional[dict] = None) -> Optional[UserDoc]:
+        return await run_db(find_user_by_email, email, projection)
+
+    async def insert(self, doc: UserDoc) -> ObjectId:
+        result = await run_db(users_col.insert_one, doc)
+        return result.inserted_id
+
+    async def update(self, email: str, fields: Dict[str, Any]) -> int:
+        """$set fields on the user; returns the matched count."""
+        result = await run_db(update_user_by_email, email, {"$set": fields})
+        return result.matched_count
+
+
+class IngredientRepository:
+    """Layout-aware (see app.services.inventory and INGREDIENT_LAYOUT)."""
+
+    async def list_for_user(self, user_id: str, projection: Optional[dict] = None) -> List[IngredientDoc]:
+        return await run_db(inventory.list_ingredients, user_id, projection)
+
+    async def revision(self, user_id: str) -> int:
+        return await run_db(inventory.get_revision, user_id)
+
+    async def insert(self, doc: IngredientDoc) -> ObjectId:
+        fields = {k: v for k, v in doc.items() if k != "user_id"}
+        return await run_db(inventory.insert_ingredient, doc["user_id"], fields)
+
+    async def update(self, user_id: str, name: str, fields: Dict[str, Any]) -> int:
+        return await run_db(inventory.update_ingredient, user_id, name, fields)
+
+    async def upsert(self, user_id: str, name: str, fields: Dict[str, Any]) -> None:
+        await run_db(inventory.bulk_upsert, user_id, [{**fields, "name": name}])
+
+    async def delete(self, user_id: str, name: str) -> int:
+        return await run_db(inventory.delete_ingredient, user_id, name)
+
+    async def bulk_upsert(self, user_id: str, items: List[IngredientDoc], ordered: bool = False) -> List[Dict[str, Any]]:
+        """Upsert items keyed by (user_id, canonical name) in one round trip.
+        Returns one {"name", "status", "error"?} per item, in input order, where
+        status is created | updated | failed | skipped (after an ordered failure)."""
+        return await run_db(inventory.bulk_upsert, user_id, items, ordered)
+
+
+class MealPlanRepository:
+    async def get_for_date(self, user_id: str, date: str, projection: Optional[dict] = None) -> Optional[MealPlanDoc]:
+        """The user's newest plan for date (several may exist under PLAN_REUSE_POLICY=never)."""
+        if projection is None:
+            projection = {"_id": 0}
+        return await run_db(lambda: hydrate_plan(mealplans_col.find_one(
+            {"user_id": user_id, "date": date}, projection, sort=[("created_at", -1)])))
+
+    async def latest_version(self, user_id: str, date: str) -> Optional[MealPlanDoc]:
+        """_id and timestamps of the user's newest plan for date (no recipe bodies)."""
+        projection = {"_id": 1, "created_at": 1, "updated_at": 1, "whatsapp_sent_at": 1}
+        return await run_db(lambda: mealplans_col.find_one(
+            {"user_id": user_id, "date": date}, projection, sort=[("created_at", -1)]))
+
+    async def latest_for_fingerprint(self, user_id: str, fingerprint: str) -> Optional[MealPlanDoc]:
+        """The user's newest non-provisional plan generated for this inventory fingerprint."""
+        return await run_db(lambda: hydrate_plan(mealplans_col.find_one(
+            {"user_id": user_id, "inventory_fingerprint": fingerprint, "provisional": {"$ne": True}},
+            {"_id": 0}, sort=[("created_at", -1)])))
+
+    async def get(self, plan_id: ObjectId, projection: Optional[dict] = None) -> Optional[MealPlanDoc]:
+        if projection is None:
+            projection = {"_id": 0}
+        return await run_db(lambda: hydrate_plan(mealplans_col.find_one({"_id": plan_id}, projection)))
+
+    async def history(self, user_id: str, limit: int, before: Optional[tuple] = None, date_from: Optional[str] = None,
+                      date_to: Optional[str] = None, recipe_fields: Optional[List[str]] = None) -> List[MealPlanDoc]:
+        """Newest-first page of plans across hot and archived storage (see app.services.archive)."""
+        return await run_db(load_plan_history, user_id, date_from, date_to, limit, before, recipe_fields)
+
+    async def insert(self, doc: MealPlanDoc) -> ObjectId:
+        def _insert():
+            inserted_id = mealplans_col.insert_one(dehydrate_plan(doc)).inserted_id
+            index_plan(inserted_id, doc)
+            return inserted_id
+        return await run_db(_insert)
+
+    async def update(self, query: Dict[str, Any], fields: Dict[str, Any]) -> int:
+        """$set fields on one plan and bump updated_at (part of the /mealplan/today ETag)."""
+        fields = {**fields, "updated_at": datetime.utcnow().isoformat()}
+        result = await run_db(mealplans_col.update_one, query, {"$set": fields})
+        return result.matched_count
+
+
+users = UserRepository()
+ingredients = IngredientRepository()
+mealplans = MealPlanRepository()
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False)
@@ -1,8 +1,16 @@
 import os
 import logging
 from pymongo import MongoClient
-from pymongo import ASCENDING
-from app.config import MONGODB_URI
+from pymongo.collation import Collation
+from app.config import (
+    MONGODB_URI,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_READ_PREFERENCE,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -14,40 +22,73 @@ if _is_vercel and not _env_has_mongo:
     # Use a non-connecting local fallback to allow app import/startup
     _uri = "mongodb://127.0.0.1:27017/?connect=false"
 
+_client_options = {
+    "maxPoolSize": MONGO_MAX_POOL_SIZE,
+    "minPoolSize": MONGO_MIN_POOL_SIZE,
+    "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+    "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+    "readPreference": MONGO_READ_PREFERENCE,
+}
+
 try:
-    client = MongoClient(_uri, serverSelectionTimeoutMS=1000)
+    client = MongoClient(_uri, **_client_options)
 except Exception as e:
     # Last-resort fallback: ensure client object exists even if URI is malformed
     logger.warning(f"MongoClient init failed for URI '{_uri}': {e}. Using safe local fallback.")
-    client = MongoClient("mongodb://127.0.0.1:27017/?connect=false", serverSelectionTimeoutMS=1000)
+    client = MongoClient("mongodb://127.0.0.1:27017/?connect=false", serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
 
 db = client.recipe_planner  # Explicitly specify database name
 
 users_col = db['users']
 ingredients_col = db['ingredients']
+# Compact layout: one document per user ({_id: user_id, items: [...], rev}), see services/inventory.py
+inventories_col = db['inventories']
 mealplans_col = db['meal_plans']
+# Content-addressed recipe bodies referenced from meal_plans by hash (_id)
+recipes_col = db['recipes']
+# Cold storage: one gzip-compressed bundle of plans per user per month
+mealplan_archives_col = db['meal_plan_archives']
+# MinHash/LSH band keys of stored plans' ingredient sets ({_id: meal plan _id}), see services/plan_similarity.py
+plan_signatures_col = db['plan_signatures']
+# Stored responses for Idempotency-Key replays (TTL index on expires_at)
+idempotency_col = db['idempotency_keys']
+# Background /agentic/run jobs and their per-stage status (TTL index on expires_at)
+agentic_jobs_col = db['agentic_jobs']
+
+# Case-insensitive comparison for emails (strength 2 ignores case, not diacritics).
+# Queries must pass the same collation to be served by idx_users_email_ci.
+EMAIL_COLLATION = Collation(locale="en", strength=2)
+
+
+def normalize_email(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def find_user_by_email(email: str, projection: dict = None):
+    """Index-backed, case-insensitive user lookup by email."""
+    return users_col.find_one({"email": normalize_email(email)}, projection, collation=EMAIL_COLLATION)
+
+
+def update_user_by_email(email: str, update: dict):
+    """Apply an update document to the user matching email (case-insensitive)."""
+    return users_col.update_one({"email": normalize_email(email)}, update, collation=EMAIL_COLLATION)
 
 
 def init_indexes():
-    """Create indexes to improve query performance. Safe to call multiple times."""
-    try:
-        # Verify connectivity quickly; skip index creation if unreachable
-        try:
-            client.server_info()
-        except Exception:
-            return
-        # Users: fast lookup by email (case normalized to lowercase at signup)
-        users_col.create_index([("email", ASCENDING)], name="idx_users_email")
-    except Exception:
-        pass
-    try:
-        # Ingredients: speed up per-user queries and updates by name
-        ingredients_col.create_index([("user_id", ASCENDING), ("name", ASCENDING)], name="idx_ingredients_user_name")
-    except Exception:
-        pass
+    """Create the registry's missing indexes (app.indexes). Safe to call multiple times.
+
+    Changed definitions are only reported: dropping and rebuilding an index is
+    left to scripts/manage_indexes.py, so app workers never do it at startup.
+    """
+    # Verify connectivity quickly; skip index creation if unreachable
     try:
-        # Meal plans: support scheduler lookups and daily idempotency
-        mealplans_col.create_index([("user_id", ASCENDING), ("date", ASCENDING)], name="idx_mealplans_user_date")
-        mealplans_col.create_index([("created_at", ASCENDING)], name="idx_mealplans_created_at")
-    except Exception:
-        pass
+        client.server_info()
+    except Exception as e:
+        logger.warning(f"MongoDB unreachable; skipping index initialization: {e}")
+        return []
+    from app.indexes import apply_indexes
+    actions = apply_indexes(db, rebuild=False)
+    for action in actions:
+        logger.info(f"Index {action}")
+    return actions
@@ -0,0 +1,44 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+
+from app.auth import decode_access_token
+from app.config import USER_CACHE_MAXSIZE, USER_CACHE_TTL_SECONDS
+from app.data_access import users
+from app.database import normalize_email
+from app.services.cache import TTLCache
+
+# Profiles never carry password material; login always reads users directly.
+_PROFILE_PROJECTION = {"password": 0, "password_hash": 0, "hashed_password": 0, "pass": 0}
+
+_profile_cache = TTLCache(maxsize=USER_CACHE_MAXSIZE if USER_CACHE_TTL_SECONDS > 0 else 0, ttl=USER_CACHE_TTL_SECONDS)
+
+
+async def load_user_profile(email: str) -> Optional[dict]:
+    """Return the user document for email, served from the TTL cache when fresh."""
+    key = normalize_email(email)
+    cached = _profile_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+    user_doc = await users.get(key, _PROFILE_PROJECTION)
+    if user_doc:
+        _profile_cache.set(key, user_doc)
+        return dict(user_doc)
+    return None
+
+
+def invalidate_user_profile(email: str) -> None:
+    """Drop the cached profile; call after any write to the users document."""
+    _profile_cache.pop(normalize_email(email))
+
+
+async def get_user_profile(current_user: str = Depends(decode_access_token)) -> Optional[dict]:
+    """Per-request user context. FastAPI resolves it once per request, so handlers
+    and sub-dependencies share the same lookup."""
+    return await load_user_profile(current_user)
+
+
+async def require_user_profile(user_doc: Optional[dict] = Depends(get_user_profile)) -> dict:
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_doc
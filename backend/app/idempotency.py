@@ -0,0 +1,224 @@
+"""
+Idempotency-Key support for POST endpoints that generate plans or send WhatsApp.
+
+A client that retries with the same Idempotency-Key header gets the stored
+response of the first attempt instead of a new generation or message:
+
+- the first request claims the key in `idempotency_keys` (status "pending",
+  leased until `pending_until`), runs, and stores its status code and body for
+  IDEMPOTENCY_TTL_SECONDS;
+- a concurrent duplicate waits for that result (in-process via an event,
+  across instances by polling the record) and replays it;
+- a duplicate that finds the lease expired (the original's worker died) takes
+  the key over with a conditional update and runs the request itself;
+- reusing a key with a different request (method, query string or body) is
+  rejected with 422.
+
+Keys are scoped per user and path. 5xx and 429 responses and exceptions
+release the key so the client can retry for real.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable
+
+from bson import Binary
+from pymongo.errors import DuplicateKeyError
+
+from app.auth import token_subject
+from app.config import IDEMPOTENCY_LEASE_SECONDS, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_WAIT_SECONDS
+from app.data_access import run_db
+from app.database import idempotency_col
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_PATHS = ("/agentic/run", "/mealplan/save-now", "/whatsapp/send")
+HEADER = b"idempotency-key"
+_POLL_SECONDS = 0.25
+_MAX_KEY_LENGTH = 255
+
+
+def _record_id(subject: str, path: str, key: str) -> str:
+    return hashlib.sha256(f"{subject}|{path}|{key}".encode("utf-8")).hexdigest()
+
+
+def _fingerprint(scope, body: bytes) -> str:
+    """Method, query string and body: ?mode=job and ?mode=provisional are different requests."""
+    digest = hashlib.sha256()
+    digest.update(scope["method"].encode("latin-1") + b"\n")
+    digest.update(bytes(scope.get("query_string") or b"") + b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def _json_response(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await _send_stored(send, {"status": status, "content_type": "application/json", "body": body}, replayed=False)
+
+
+async def _send_stored(send, record: dict, replayed: bool = True):
+    headers = [(b"content-type", (record.get("content_type") or "application/json").encode("latin-1"))]
+    if replayed:
+        headers.append((b"idempotent-replayed", b"true"))
+    body = bytes(record.get("body") or b"")
+    headers.append((b"content-length", str(len(body)).encode("ascii")))
+    await send({"type": "http.response.start", "status": record.get("status", 200), "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware; only POSTs to `paths` carrying an Idempotency-Key are affected."""
+
+    def __init__(self, app, paths: Iterable[str] = IDEMPOTENT_PATHS):
+        self.app = app
+        self.paths = {p.rstrip("/") for p in paths}
+        self._inflight: Dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"].rstrip("/") not in self.paths:
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        key = headers.get(HEADER, b"").decode("latin-1").strip()
+        if not key:
+            return await self.app(scope, receive, send)
+        if len(key) > _MAX_KEY_LENGTH:
+            return await _json_response(send, 400, "Idempotency-Key is too long")
+        auth = headers.get(b"authorization", b"").decode("latin-1")
+        subject = token_subject(auth[7:] if auth.lower().startswith("bearer ") else None)
+        if not subject:
+            # Let the route answer 401 as usual
+            return await self.app(scope, receive, send)
+
+        # Buffer the body so it can be fingerprinted and then replayed to the app
+        chunks = []
+        more = True
+        while more:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more = message.get("more_body", False)
+        body = b"".join(chunks)
+        fingerprint = _fingerprint(scope, body)
+
+        async def replay_receive():
+            nonlocal body
+            data, body = body, b""
+            return {"type": "http.request", "body": data, "more_body": False}
+
+        record_id = _record_id(subject, scope["path"].rstrip("/"), key)
+        owner = uuid.uuid4().hex
+        now = datetime.utcnow()
+        try:
+            await run_db(idempotency_col.insert_one, {
+                "_id": record_id,
+                "status": "pending",
+                "owner": owner,
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "pending_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            })
+        except DuplicateKeyError:
+            if not await self._replay(record_id, fingerprint, send, owner):
+                return
+        return await self._run_and_store(scope, replay_receive, send, record_id, owner)
+
+    async def _replay(self, record_id: str, fingerprint: str, send, owner: str) -> bool:
+        """Answer a duplicate from the stored record. Returns True instead when the
+        original's lease expired and this request took the key over as `owner`."""
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = await run_db(idempotency_col.find_one, {"_id": record_id})
+            if record is None:
+                await _json_response(send, 409, "Original request with this Idempotency-Key failed; retry with a new key")
+                return False
+            if record.get("fingerprint") != fingerprint:
+                await _json_response(send, 422, "Idempotency-Key was already used with a different request")
+                return False
+            if record.get("status") == "completed":
+                await _send_stored(send, record.get("response") or {})
+                return False
+            if await self._take_over(record, owner):
+                return True
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                await _json_response(send, 409, "A request with this Idempotency-Key is still in progress")
+                return False
+            event = self._inflight.get(record_id)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                else:
+                    await asyncio.sleep(min(_POLL_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _take_over(self, record: dict, owner: str) -> bool:
+        """Claim a pending record whose lease has expired; only one contender wins."""
+        now = datetime.utcnow()
+        if record.get("pending_until") is None or record["pending_until"] > now:
+            return False
+        result = await run_db(idempotency_col.update_one, {
+            "_id": record["_id"],
+            "status": "pending",
+            "owner": record.get("owner"),
+            "pending_until": record["pending_until"],
+        }, {"$set": {"owner": owner, "pending_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}})
+        if result.modified_count:
+            logger.info(f"Took over idempotency key {record['_id']} after its lease expired")
+        return bool(result.modified_count)
+
+    async def _run_and_store(self, scope, receive, send, record_id: str, owner: str):
+        event = self._inflight[record_id] = asyncio.Event()
+        captured = {"status": 500, "content_type": "application/json", "chunks": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                for name, value in message.get("headers") or []:
+                    if name.lower() == b"content-type":
+                        captured["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                captured["chunks"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            try:
+                await self.app(scope, receive, capture_send)
+            except Exception:
+                await self._release(record_id, owner)
+                raise
+            if captured["status"] >= 500 or captured["status"] == 429:
+                await self._release(record_id, owner)
+            else:
+                await self._store(record_id, owner, captured)
+        finally:
+            # Wake in-process duplicates only once the outcome is recorded
+            self._inflight.pop(record_id, None)
+            event.set()
+
+    # Writes are conditional on `owner`: a request whose lease was taken over must
+    # not overwrite or delete the new owner's record
+
+    async def _store(self, record_id: str, owner: str, captured: dict):
+        try:
+            await run_db(idempotency_col.update_one, {"_id": record_id, "owner": owner}, {"$set": {
+                "status": "completed",
+                "completed_at": datetime.utcnow(),
+                "response": {
+                    "status": captured["status"],
+                    "content_type": captured["content_type"],
+                    "body": Binary(b"".join(captured["chunks"])),
+                },
+            }})
+        except Exception as e:
+            logger.warning(f"Could not store idempotent response: {e}")
+            await self._release(record_id, owner)
+
+    async def _release(self, record_id: str, owner: str):
+        try:
+            await run_db(idempotency_col.delete_one, {"_id": record_id, "owner": owner})
+        except Exception as e:
+            logger.warning(f"Could not release idempotency key: {e}")
@@ -0,0 +1,220 @@
+"""
+Declarative index registry.
+
+INDEXES lists every index the app relies on; apply_indexes() reconciles a
+database against it (create missing, rebuild changed definitions, optionally
+drop unmanaged ones). App startup only creates missing indexes; rebuilds run
+from the CLI. QUERY_SHAPES lists every query shape the app and its
+tooling issue; verify_query_shapes() runs explain() on each and reports any
+whose winning plan contains a COLLSCAN.
+
+CLI: python scripts/manage_indexes.py [--dry-run] [--prune] [--verify]
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from app.database import EMAIL_COLLATION
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    name: str
+    keys: List[Tuple[str, int]]
+    options: Dict[str, Any] = {}
+
+
+class QueryShape(NamedTuple):
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: Optional[List[Tuple[str, int]]] = None
+    collation: Any = None
+
+
+INDEXES: List[IndexSpec] = [
+    # Users
+    IndexSpec("users", "idx_users_email", [("email", ASCENDING)]),
+    IndexSpec("users", "idx_users_email_ci", [("email", ASCENDING)], {"collation": EMAIL_COLLATION}),
+    # Scheduler polls {delivery_enabled: True} every 10s; only opted-in users are indexed
+    IndexSpec("users", "idx_users_delivery_enabled", [("delivery_enabled", ASCENDING)],
+              {"partialFilterExpression": {"delivery_enabled": True}}),
+    # Ingredients
+    IndexSpec("ingredients", "idx_ingredients_user_name_key", [("user_id", ASCENDING), ("name_key", ASCENDING)]),
+    # Meal plans: daily lookups, scheduler's latest-of-day sort, and history keyset pagination
+    IndexSpec("meal_plans", "idx_mealplans_user_date",
+              [("user_id", ASCENDING), ("date", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+    IndexSpec("meal_plans", "idx_mealplans_created_at", [("created_at", ASCENDING)]),
+    IndexSpec("meal_plans", "idx_mealplans_user_fingerprint",
+              [("user_id", ASCENDING), ("inventory_fingerprint", ASCENDING), ("created_at", DESCENDING)]),
+    IndexSpec("meal_plans", "idx_mealplans_whatsapp_sent_at", [("whatsapp_sent_at", ASCENDING)], {"sparse": True}),
+    # Stale provisional-upgrade sweep; only pending upgrades are indexed
+    IndexSpec("meal_plans", "idx_mealplans_upgrade_pending", [("upgrade_status", ASCENDING), ("created_at", ASCENDING)],
+              {"partialFilterExpression": {"upgrade_status": "pending"}}),
+    # LSH candidate lookup: {bands: {$in: [...]}} (multikey)
+    IndexSpec("plan_signatures", "idx_plan_signatures_bands", [("bands", ASCENDING)]),
+    # Archived plan bundles
+    IndexSpec("meal_plan_archives", "idx_archives_user_month", [("user_id", ASCENDING), ("month", ASCENDING)]),
+    # Idempotency-Key records expire on their own
+    IndexSpec("idempotency_keys", "idx_idempotency_expires_at", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    IndexSpec("agentic_jobs", "idx_agentic_jobs_expires_at", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    # Stale-job sweep: {status: {$in: [queued, running]}, updated_at: {$lt: ...}}
+    IndexSpec("agentic_jobs", "idx_agentic_jobs_status_updated", [("status", ASCENDING), ("updated_at", ASCENDING)]),
+]
+
+_SAMPLE_USER = "shape-check@example.com"
+_SAMPLE_DATE = "2024-01-01"
+
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("users.by_email", "users", {"email": _SAMPLE_USER}, collation=EMAIL_COLLATION),
+    QueryShape("users.delivery_enabled", "users", {"delivery_enabled": True}),
+    QueryShape("ingredients.by_user", "ingredients", {"user_id": _SAMPLE_USER}),
+    QueryShape("ingredients.by_user_name", "ingredients",
+               {"user_id": _SAMPLE_USER, "$or": [{"name_key": "rice"}, {"name_key": {"$exists": False}, "name": {"$in": ["rice"]}}]}),
+    QueryShape("inventories.by_user", "inventories", {"_id": _SAMPLE_USER}),
+    QueryShape("meal_plans.by_id", "meal_plans", {"_id": ObjectId()}),
+    QueryShape("meal_plans.by_user_date", "meal_plans", {"user_id": _SAMPLE_USER, "date": _SAMPLE_DATE}),
+    QueryShape("meal_plans.scheduler_latest", "meal_plans", {"user_id": _SAMPLE_USER, "date": _SAMPLE_DATE},
+               sort=[("created_at", DESCENDING)]),
+    QueryShape("meal_plans.history", "meal_plans",
+               {"user_id": _SAMPLE_USER, "date": {"$gte": "2023-01-01", "$lte": _SAMPLE_DATE}},
+               sort=[("date", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("meal_plans.history_page", "meal_plans",
+               {"user_id": _SAMPLE_USER, "$or": [{"date": {"$lt": _SAMPLE_DATE}},
+                                                 {"date": _SAMPLE_DATE, "created_at": {"$lt": datetime(2024, 1, 1).isoformat()}},
+                                                 {"date": _SAMPLE_DATE, "created_at": datetime(2024, 1, 1).isoformat(),
+                                                  "_id": {"$lt": ObjectId()}}]},
+               sort=[("date", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("meal_plans.by_user_fingerprint", "meal_plans",
+               {"user_id": _SAMPLE_USER, "inventory_fingerprint": "0" * 64, "provisional": {"$ne": True}},
+               sort=[("created_at", DESCENDING)]),
+    QueryShape("meal_plans.archive_candidates", "meal_plans", {"date": {"$lt": _SAMPLE_DATE}},
+               sort=[("user_id", ASCENDING), ("date", ASCENDING)]),
+    QueryShape("meal_plans.stale_upgrades", "meal_plans",
+               {"upgrade_status": "pending", "created_at": {"$lt": datetime(2024, 1, 1).isoformat()}}),
+    QueryShape("meal_plans.sent_since", "meal_plans", {"whatsapp_sent_at": {"$gte": datetime(2024, 1, 1).isoformat()}}),
+    QueryShape("plan_signatures.by_bands", "plan_signatures",
+               {"bands": {"$in": ["0:0000000000000000"]}, "ingredients": {"$not": {"$elemMatch": {"$nin": ["egg", "rice"]}}}}),
+    QueryShape("idempotency_keys.by_id", "idempotency_keys", {"_id": "0" * 64}),
+    QueryShape("agentic_jobs.by_id_user", "agentic_jobs", {"_id": ObjectId(), "user_id": _SAMPLE_USER}),
+    QueryShape("agentic_jobs.stale", "agentic_jobs",
+               {"status": {"$in": ["queued", "running"]}, "updated_at": {"$lt": datetime(2024, 1, 1).isoformat()}}),
+    QueryShape("recipes.by_hash", "recipes", {"_id": {"$in": ["0" * 64]}}),
+    QueryShape("meal_plan_archives.by_user_months", "meal_plan_archives",
+               {"user_id": _SAMPLE_USER, "month": {"$gte": "2023-01", "$lte": "2024-01"}}, sort=[("month", DESCENDING)]),
+]
+
+
+def _default_db():
+    from app.database import db
+    return db
+
+
+def _same_definition(spec: IndexSpec, info: dict) -> bool:
+    if [(k, int(v)) for k, v in info.get("key", [])] != [(k, int(v)) for k, v in spec.keys]:
+        return False
+    for opt in ("sparse", "unique", "partialFilterExpression"):
+        if bool(spec.options.get(opt)) != bool(info.get(opt)):
+            return False
+    if spec.options.get("expireAfterSeconds") != info.get("expireAfterSeconds"):
+        return False
+    want = spec.options.get("collation")
+    have = info.get("collation")
+    if bool(want) != bool(have):
+        return False
+    if want and have:
+        want_doc = want.document if hasattr(want, "document") else dict(want)
+        if any(have.get(k) != v for k, v in want_doc.items()):
+            return False
+    return True
+
+
+def apply_indexes(database=None, prune: bool = False, dry_run: bool = False, rebuild: bool = True) -> List[str]:
+    """Reconcile the database with INDEXES. Returns the actions taken (or planned).
+
+    rebuild=False leaves indexes whose definition changed in place (reported as
+    "outdated") instead of dropping and recreating them.
+    """
+    database = database if database is not None else _default_db()
+    actions: List[str] = []
+    by_collection: Dict[str, List[IndexSpec]] = {}
+    for spec in INDEXES:
+        by_collection.setdefault(spec.collection, []).append(spec)
+
+    for coll_name, specs in by_collection.items():
+        coll = database[coll_name]
+        try:
+            existing = coll.index_information()
+        except Exception as e:
+            logger.warning(f"Could not read indexes for {coll_name}: {e}")
+            existing = {}
+        for spec in specs:
+            info = existing.get(spec.name)
+            if info and _same_definition(spec, info):
+                continue
+            if info and not rebuild:
+                actions.append(f"outdated {coll_name}.{spec.name}")
+                logger.warning(f"Index {coll_name}.{spec.name} differs from the registry; "
+                               f"rebuild it with scripts/manage_indexes.py")
+                continue
+            try:
+                if info:
+                    actions.append(f"rebuild {coll_name}.{spec.name}")
+                    if not dry_run:
+                        coll.drop_index(spec.name)
+                else:
+                    actions.append(f"create {coll_name}.{spec.name}")
+                if not dry_run:
+                    coll.create_index(spec.keys, name=spec.name, **spec.options)
+            except Exception as e:
+                actions.append(f"failed {coll_name}.{spec.name}: {e}")
+                logger.warning(f"Index {coll_name}.{spec.name} not applied: {e}")
+        if prune:
+            managed = {s.name for s in specs} | {"_id_"}
+            for name in existing:
+                if name not in managed:
+                    actions.append(f"drop {coll_name}.{name}")
+                    if not dry_run:
+                        try:
+                            coll.drop_index(name)
+                        except Exception as e:
+                            logger.warning(f"Could not drop {coll_name}.{name}: {e}")
+    return actions
+
+
+def _stages(plan) -> List[str]:
+    found = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            found.append(plan["stage"])
+        for value in plan.values():
+            found.extend(_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            found.extend(_stages(item))
+    return found
+
+
+def explain_shape(shape: QueryShape, database=None) -> List[str]:
+    """Stages of the winning plan for one query shape."""
+    database = database if database is not None else _default_db()
+    cursor = database[shape.collection].find(shape.filter, collation=shape.collation)
+    if shape.sort:
+        cursor = cursor.sort(shape.sort)
+    return _stages(cursor.explain().get("queryPlanner", {}).get("winningPlan", {}))
+
+
+def verify_query_shapes(database=None) -> List[Tuple[str, List[str]]]:
+    """Return (shape name, winning plan stages) for every shape that does a COLLSCAN."""
+    database = database if database is not None else _default_db()
+    failures = []
+    for shape in QUERY_SHAPES:
+        stages = explain_shape(shape, database)
+        if "COLLSCAN" in stages:
+            failures.append((shape.name, stages))
+    return failures
@@ -6,7 +6,13 @@ import logging
 from app.routes import auth_routes, ingredient_routes, mealplan_routes, whatsapp_routes
 from app.services.scheduler import start_scheduler
 from app.database import init_indexes
+from app.auth import shutdown_hash_executor
+from app.data_access import shutdown_executor as shutdown_db_executor
 from app.routes import agentic_routes
+from app.services.agentic_jobs import fail_stale_jobs
+from app.services.plan_upgrade import fail_stale_upgrades
+from app.idempotency import IdempotencyMiddleware
+from app.services import metrics
 
 # Configure structured logging
 logging.basicConfig(
@@ -17,6 +23,9 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Registered before CORS so replayed responses still get CORS headers
+app.add_middleware(IdempotencyMiddleware)
+
 # CORS to allow frontend dev servers
 app.add_middleware(
     CORSMiddleware,
@@ -44,14 +53,21 @@ app.include_router(agentic_routes.router)     # new orchestration endpoints
 @app.on_event("startup")
 def _startup():
     try:
-        # Always skip DB index initialization on Vercel to avoid cold-start failures
-        if os.getenv("VERCEL") == "1":
+        # Skip DB index initialization on Vercel to avoid cold-start failures;
+        # apply indexes at deploy time with scripts/manage_indexes.py instead
+        if os.getenv("VERCEL") == "1" and os.getenv("ENSURE_INDEXES_ON_STARTUP", "").lower() not in ("1", "true", "yes"):
             logger.info("Skipping MongoDB index initialization on Vercel serverless environment")
         else:
             init_indexes()
             logger.info("MongoDB indexes ensured")
     except Exception as e:
         logger.warning(f"Index initialization failed: {e}")
+    try:
+        # Background work of a previous process will never finish
+        fail_stale_jobs()
+        fail_stale_upgrades()
+    except Exception as e:
+        logger.warning(f"Background work sweep failed: {e}")
     try:
         # Disable scheduler on Vercel by default or when explicitly requested
         disable = os.getenv("DISABLE_SCHEDULER", "").lower() in ("1", "true", "yes")
@@ -64,10 +80,19 @@ def _startup():
         # Avoid crashing app if scheduler fails
         logger.warning(f"Failed to start scheduler: {e}")
 
+@app.on_event("shutdown")
+def _shutdown():
+    shutdown_hash_executor()
+    shutdown_db_executor()
+
 @app.get("/health")
 def _health():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def _metrics():
+    return Response(content=metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Browsers request /favicon.ico automatically; return 204 to avoid noisy errors
 @app.get("/favicon.ico")
 def _favicon():
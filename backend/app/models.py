@@ -44,6 +44,19 @@ class Ingredient(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+class IngredientIn(BaseModel):
+    name: str
+    quantity: float = Field(ge=0)
+    unit: str
+
+class IngredientOut(BaseModel):
+    """Read model for ingredient lists (schema only; rows are serialized directly)."""
+    id: str = Field(alias="_id")
+    name: str
+    quantity: float
+    unit: str
+    created_at: Optional[datetime] = None
+
 class MealPlan(BaseModel):
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
     title: str
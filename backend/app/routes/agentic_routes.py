@@ -1,26 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 import re
+import time
 import pytz
 
-from app.auth import decode_access_token
-from app.database import ingredients_col, mealplans_col, users_col
-try:
-    from app.services.gemini_service import generate_meal_plan
-except ImportError:
-    from app.services.ai_service import generate_meal_plan
+from app.auth import decode_access_token, token_subject
+from app.config import AGENTIC_STREAM_TOKEN_SECONDS
+from app.models import IngredientIn
+from app.data_access import ingredients, mealplans, users
+from app.dependencies import get_user_profile, invalidate_user_profile
+from app.services.agentic_jobs import (
+    StageRecorder,
+    create_job,
+    create_stream_token,
+    get_job,
+    launch,
+    stream_job_events,
+    stream_token_user,
+)
+from app.services.plan_generation import generate_plan
+from app.services.rate_limit import Overloaded, overloaded_exception
+from app.services.stage_graph import SKIPPED, Stage, run_stage_graph
+from app.services.plan_reuse import inventory_fingerprint, should_reuse
 from app.services.whatsapp_service import send_mealplan_whatsapp
 
 router = APIRouter(prefix="/agentic", tags=["agentic"])  # New orchestration endpoints
 
 
-class IngredientIn(BaseModel):
-    name: str
-    quantity: float = Field(ge=0)
-    unit: str
-
 class AgenticRunRequest(BaseModel):
     ingredients: Optional[List[IngredientIn]] = None
     send_now: Optional[bool] = False
@@ -33,57 +43,72 @@ class AgenticRunRequest(BaseModel):
 
 
 @router.post("/run")
-def run_agentic_flow(payload: AgenticRunRequest, current_user: str = Depends(decode_access_token)):
-    # 1) Upsert provided ingredients
-    if payload.ingredients:
-        for ing in payload.ingredients:
-            ingredients_col.update_one(
-                {"user_id": current_user, "name": ing.name},
-                {"$set": {"name": ing.name, "quantity": float(ing.quantity), "unit": ing.unit, "user_id": current_user}},
-                upsert=True
-            )
-
-    # 2) Fetch ingredients to use for planning
-    ingredients = list(ingredients_col.find({"user_id": current_user}, {"_id": 0, "user_id": 0}))
-    if not ingredients:
-        raise HTTPException(status_code=400, detail="Add ingredients first")
-
-    # 3) Generate meal plan via Gemini (with built-in fallbacks)
-    plan = generate_meal_plan(ingredients)
-    if not isinstance(plan, dict) or not plan:
-        raise HTTPException(status_code=500, detail="Failed to generate meal plan")
-
-    # 4) Resolve timezone for date stamping
-    user_doc = users_col.find_one({"email": {"$regex": f"^{re.escape(current_user)}$", "$options": "i"}})
-    tz_name = (user_doc or {}).get("timezone", payload.timezone or "UTC")
-    try:
-        tz = pytz.timezone(tz_name)
-    except Exception:
-        tz = pytz.timezone("UTC")
-    now_local = datetime.now(pytz.utc).astimezone(tz)
-    today_str = now_local.date().isoformat()
-
-    # 5) Save plan (idempotent for the day)
-    existing = mealplans_col.find_one({"user_id": current_user, "date": today_str}, {"_id": 0})
-    inserted_id = None
-    if existing:
-        saved_doc = existing
+async def run_agentic_flow(
+    payload: AgenticRunRequest,
+    mode: str = Query("sync", pattern="^(sync|job)$"),
+    current_user: str = Depends(decode_access_token),
+    user_doc: dict = Depends(get_user_profile),
+):
+    # mode=job: answer 202 right away and run the pipeline in the background
+    if mode == "job":
+        job_id = await create_job(current_user, "agentic_run", payload.dict())
+        launch(job_id, lambda stages: _agentic_pipeline(payload, current_user, user_doc, stages))
+        return JSONResponse(status_code=202, content={
+            "job_id": str(job_id),
+            "status": "queued",
+            "status_url": f"/agentic/jobs/{job_id}",
+            **_stream_links(job_id, current_user),
+        })
+    return await _agentic_pipeline(payload, current_user, user_doc, StageRecorder())
+
+
+@router.get("/jobs/{job_id}")
+async def get_agentic_job(job_id: str, current_user: str = Depends(decode_access_token)):
+    job = await get_job(job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _stream_links(job_id, user_id: str) -> dict:
+    token = create_stream_token(job_id, user_id)
+    return {
+        "events_url": f"/agentic/jobs/{job_id}/events?stream_token={token}",
+        "stream_token": token,
+        "stream_token_expires_in": AGENTIC_STREAM_TOKEN_SECONDS,
+    }
+
+
+@router.post("/jobs/{job_id}/stream-token")
+async def renew_stream_token(job_id: str, current_user: str = Depends(decode_access_token)):
+    """A fresh events_url, e.g. to reconnect after the one from the 202 response expired."""
+    if not await get_job(job_id, current_user):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _stream_links(job_id, current_user)
+
+
+def _stream_user(job_id: str, request: Request, stream_token: Optional[str] = None) -> str:
+    # EventSource cannot send headers, so it passes the job-scoped ?stream_token= from events_url
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        user_id = token_subject(auth[7:])
     else:
-        doc = {
-            "user_id": current_user,
-            "date": today_str,
-            "created_at": datetime.utcnow().isoformat(),
-            "origin": "agentic_api",
-            **plan,
-        }
-        try:
-            res = mealplans_col.insert_one(doc)
-            inserted_id = res.inserted_id
-            saved_doc = mealplans_col.find_one({"user_id": current_user, "date": today_str}, {"_id": 0})
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"DB insert failed: {e}")
+        user_id = stream_token_user(stream_token, job_id)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    return user_id
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_agentic_job(job_id: str, current_user: str = Depends(_stream_user)):
+    if not await get_job(job_id, current_user):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(stream_job_events(job_id, current_user), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    # 6) Optionally update delivery preferences on profile
+
+def _validate_schedule(payload: AgenticRunRequest) -> dict:
+    """Delivery preference changes requested in the payload (400 on invalid input)."""
     schedule_updates = {}
     if payload.delivery_time is not None:
         t = (payload.delivery_time or '').strip()
@@ -112,87 +137,179 @@ def run_agentic_flow(payload: AgenticRunRequest, current_user: str = Depends(dec
         except Exception:
             raise HTTPException(status_code=400, detail="timezone must be valid IANA tz")
         schedule_updates["timezone"] = tz_in
-    if schedule_updates:
-        users_col.update_one(
-            {"email": {"$regex": f"^{re.escape(current_user)}$", "$options": "i"}},
-            {"$set": schedule_updates}
-        )
-
-    # 7) Decide meal to send and auto-send if current time matches schedule
-    send_result = None
-    msg_id = None
+    return schedule_updates
+
+
+def _resolve_meal_key(payload: AgenticRunRequest, schedule_updates: dict, user_doc: Optional[dict]) -> str:
     meal_key = (payload.meal or "").lower()
-    if meal_key not in ["breakfast", "lunch", "dinner"]:
-        # Fall back to mapped meal by delivery_time, else breakfast
-        effective_time = schedule_updates.get("delivery_time") or (payload.delivery_time or (user_doc or {}).get("delivery_time"))
-        if effective_time:
+    if meal_key in ["breakfast", "lunch", "dinner"]:
+        return meal_key
+    # Fall back to mapped meal by delivery_time, else breakfast
+    effective_time = schedule_updates.get("delivery_time") or (payload.delivery_time or (user_doc or {}).get("delivery_time"))
+    if effective_time:
+        try:
+            hour = int(effective_time.split(":")[0])
+            return "breakfast" if hour < 11 else ("lunch" if hour < 16 else "dinner")
+        except Exception:
+            pass
+    return "breakfast"
+
+
+def _is_delivery_due(schedule_updates: dict, user_doc: Optional[dict], now_local: datetime) -> bool:
+    """Whether the (possibly just updated) schedule says to send right now."""
+    try:
+        delivery_enabled = schedule_updates.get("delivery_enabled", bool((user_doc or {}).get("delivery_enabled")))
+        delivery_time = schedule_updates.get("delivery_time", (user_doc or {}).get("delivery_time"))
+        delivery_date = schedule_updates.get("delivery_date", (user_doc or {}).get("delivery_date"))
+        if not (delivery_enabled and delivery_time):
+            return False
+        hour, minute = map(int, delivery_time.split(":"))
+        # Respect start date if set
+        if delivery_date:
             try:
-                hour = int(effective_time.split(":")[0])
-                meal_key = "breakfast" if hour < 11 else ("lunch" if hour < 16 else "dinner")
+                start_date = datetime.strptime(str(delivery_date), "%Y-%m-%d").date()
+                if now_local.date() < start_date:
+                    return False
             except Exception:
-                meal_key = "breakfast"
-        else:
-            meal_key = "breakfast"
-
-    # Compute auto send (if send_now not explicitly requested)
-    auto_triggered = False
-    send_now_flag = bool(payload.send_now)
-    if not send_now_flag:
+                pass
+        # Tolerate ±1 minute to prevent race with minute boundary
+        now_total = now_local.hour * 60 + now_local.minute
+        return abs(now_total - (hour * 60 + minute)) <= 1
+    except Exception:
+        return False
+
+
+def _whatsapp_phone(payload: AgenticRunRequest, user_doc: Optional[dict]) -> str:
+    # Require WhatsApp verification and phone set
+    if not bool((user_doc or {}).get("whatsappVerified")):
+        raise HTTPException(status_code=403, detail="Please verify WhatsApp first.")
+    phone = (payload.to_override or (user_doc or {}).get("phone") or '').strip()
+    if not phone:
+        raise HTTPException(status_code=400, detail="No phone found on profile. Set your WhatsApp number.")
+    if not re.match(r"^(whatsapp:)?\+\d{7,15}$", phone):
+        raise HTTPException(status_code=400, detail="Phone must include country code, e.g., '+91XXXXXXXXXX' or 'whatsapp:+91XXXXXXXXXX'.")
+    return phone
+
+
+async def _agentic_pipeline(payload: AgenticRunRequest, current_user: str, user_doc: Optional[dict], stages: StageRecorder) -> dict:
+    """Run the agentic flow as a stage graph:
+
+        validate ──── existing ──┐              ┌── whatsapp
+        ingredients ─────────────┴── plan ─────┴── schedule
+
+    validate only does local checks (including the WhatsApp preconditions), so
+    bad input fails before any LLM call; ingredient upserts overlap with the
+    plan lookup. The schedule is only saved once the plan succeeded, alongside
+    the WhatsApp send.
+    """
+    started = time.perf_counter()
+
+    async def validate(_):
+        tz_name = (user_doc or {}).get("timezone", payload.timezone or "UTC")
         try:
-            delivery_enabled = schedule_updates.get("delivery_enabled", bool((user_doc or {}).get("delivery_enabled")))
-            delivery_time = schedule_updates.get("delivery_time", (user_doc or {}).get("delivery_time"))
-            delivery_date = schedule_updates.get("delivery_date", (user_doc or {}).get("delivery_date"))
-            if delivery_enabled and delivery_time:
-                hour, minute = map(int, delivery_time.split(":"))
-                # Respect start date if set
-                allow_date = True
-                if delivery_date:
-                    try:
-                        start_date = datetime.strptime(str(delivery_date), "%Y-%m-%d").date()
-                        allow_date = now_local.date() >= start_date
-                    except Exception:
-                        allow_date = True
-                # Tolerate ±1 minute to prevent race with minute boundary
-                if allow_date:
-                    now_total = now_local.hour * 60 + now_local.minute
-                    target_total = hour * 60 + minute
-                    if abs(now_total - target_total) <= 1:
-                        send_now_flag = True
-                        auto_triggered = True
+            tz = pytz.timezone(tz_name)
         except Exception:
-            pass
+            tz = pytz.timezone("UTC")
+        now_local = datetime.now(pytz.utc).astimezone(tz)
+        schedule_updates = _validate_schedule(payload)
+        auto_triggered = not payload.send_now and _is_delivery_due(schedule_updates, user_doc, now_local)
+        send_now = bool(payload.send_now) or auto_triggered
+        return {
+            "today": now_local.date().isoformat(),
+            "schedule_updates": schedule_updates,
+            "meal_key": _resolve_meal_key(payload, schedule_updates, user_doc),
+            "send_now": send_now,
+            "auto_triggered": auto_triggered,
+            "phone": _whatsapp_phone(payload, user_doc) if send_now else None,
+        }
+
+    async def load_ingredients(_):
+        if payload.ingredients:
+            await ingredients.bulk_upsert(current_user, [
+                {"name": ing.name, "quantity": float(ing.quantity), "unit": ing.unit} for ing in payload.ingredients
+            ])
+        items = await ingredients.list_for_user(current_user)
+        if not items:
+            raise HTTPException(status_code=400, detail="Add ingredients first")
+        return items
+
+    async def lookup_existing(results):
+        return await mealplans.get_for_date(current_user, results["validate"]["today"])
+
+    async def save_schedule(results):
+        schedule_updates = results["validate"]["schedule_updates"]
+        if not schedule_updates:
+            return SKIPPED
+        await users.update(current_user, schedule_updates)
+        invalidate_user_profile(current_user)
+        return schedule_updates
 
-    if send_now_flag:
-        # Require WhatsApp verification and phone set
-        if not bool((user_doc or {}).get("whatsappVerified")):
-            raise HTTPException(status_code=403, detail="Please verify WhatsApp first.")
-        phone = (payload.to_override or (user_doc or {}).get("phone") or '').strip()
-        if not phone:
-            raise HTTPException(status_code=400, detail="No phone found on profile. Set your WhatsApp number.")
-        if not re.match(r"^(whatsapp:)?\+\d{7,15}$", phone):
-            raise HTTPException(status_code=400, detail="Phone must include country code, e.g., '+91XXXXXXXXXX' or 'whatsapp:+91XXXXXXXXXX'.")
-        filtered_plan = {meal_key: plan.get(meal_key, {})}
+    async def make_plan(results):
+        items, existing = results["ingredients"], results["existing"]
+        # Reuse today's plan when the policy allows, otherwise generate via Gemini (with built-in fallbacks)
+        if should_reuse(existing, items, for_delivery=results["validate"]["send_now"]):
+            return {"doc": existing, "inserted_id": None}
         try:
-            sid, status, send_result = send_mealplan_whatsapp(phone, filtered_plan, (user_doc or {}).get("name", "User"))
-            msg_id = sid
-            if sid:
-                # Mark WhatsApp sent for today's plan regardless of insert path
-                try:
-                    mealplans_col.update_one({"user_id": current_user, "date": today_str}, {"$set": {"whatsapp_sent_at": datetime.utcnow().isoformat()}})
-                except Exception:
-                    pass
+            plan = await run_in_threadpool(generate_plan, current_user, items, rate_limit_scope="agentic_run")
+        except Overloaded as e:
+            raise overloaded_exception(e)
+        if not isinstance(plan, dict) or not plan:
+            raise HTTPException(status_code=500, detail="Failed to generate meal plan")
+        doc = {
+            "user_id": current_user,
+            "date": results["validate"]["today"],
+            "created_at": datetime.utcnow().isoformat(),
+            "origin": "agentic_api",
+            "inventory_fingerprint": inventory_fingerprint(items),
+            **plan,
+        }
+        try:
+            inserted_id = await mealplans.insert(doc)
+            return {"doc": await mealplans.get(inserted_id), "inserted_id": inserted_id}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"DB insert failed: {e}")
+
+    async def send_whatsapp(results):
+        ctx, saved = results["validate"], results["plan"]
+        if not ctx["send_now"]:
+            return SKIPPED
+        meal_key = ctx["meal_key"]
+        filtered_plan = {meal_key: (saved["doc"] or {}).get(meal_key, {})}
+        try:
+            sid, status, send_result = await run_in_threadpool(send_mealplan_whatsapp, ctx["phone"], filtered_plan, (user_doc or {}).get("name", "User"))
         except Exception as e:
             raise HTTPException(status_code=502, detail=f"WhatsApp send failed: {e}")
+        if sid:
+            # Mark WhatsApp sent for today's plan regardless of insert path
+            try:
+                inserted_id = saved["inserted_id"]
+                query = {"_id": inserted_id} if inserted_id else {"user_id": current_user, "date": ctx["today"]}
+                await mealplans.update(query, {"whatsapp_sent_at": datetime.utcnow().isoformat()})
+            except Exception:
+                pass
+        return {"message_id": sid, "meta": send_result}
+
+    results, timings = await run_stage_graph({
+        "validate": Stage(validate),
+        "ingredients": Stage(load_ingredients),
+        "existing": Stage(lookup_existing, ("validate",)),
+        "plan": Stage(make_plan, ("validate", "ingredients", "existing")),
+        "schedule": Stage(save_schedule, ("validate", "plan")),
+        "whatsapp": Stage(send_whatsapp, ("validate", "plan")),
+    }, stages)
 
+    ctx, saved, sent = results["validate"], results["plan"], results["whatsapp"] or {}
+    inserted_id = saved["inserted_id"]
     return {
         "ok": True,
-        "meal_key": meal_key,
+        "meal_key": ctx["meal_key"],
         "db_id": str(inserted_id) if inserted_id else None,
-        "db_saved": bool(inserted_id or existing),
-        "scheduled_updates": schedule_updates,
-        "whatsapp_sent": bool(msg_id),
-        "whatsapp_message_id": msg_id,
-        "whatsapp_meta": send_result,
-        "auto_sent": auto_triggered,
-        "meal_plan": saved_doc,
-    }
\ No newline at end of file
+        "db_saved": bool(saved["doc"]),
+        "scheduled_updates": ctx["schedule_updates"],
+        "whatsapp_sent": bool(sent.get("message_id")),
+        "whatsapp_message_id": sent.get("message_id"),
+        "whatsapp_meta": sent.get("meta"),
+        "auto_sent": ctx["auto_triggered"],
+        "meal_plan": saved["doc"],
+        "timings_ms": {**timings, "total": round((time.perf_counter() - started) * 1000, 1)},
+    }
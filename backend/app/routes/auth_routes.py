@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends, Response
 import re
 from pydantic import BaseModel, EmailStr, Field
-from app.database import db
-from app.auth import get_password_hash, verify_password, create_access_token, decode_access_token
+from app.data_access import users
+from app.auth import get_password_hash_async, verify_password_async, create_access_token, decode_access_token
+from app.dependencies import require_user_profile, invalidate_user_profile
 from typing import Optional, Annotated
 from datetime import datetime
 import pytz
@@ -33,13 +34,11 @@ class UpdateDeliverySettings(BaseModel):
 async def signup(user: SignupUser):
     email_norm = user.email.strip().lower()
     # case-insensitive lookup to prevent duplicates
-    existing_user = db.users.find_one({
-        "email": {"$regex": f"^{re.escape(email_norm)}$", "$options": "i"}
-    })
+    existing_user = await users.get(email_norm)
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
-    hashed_pw = get_password_hash(user.password)
-    db.users.insert_one({
+    hashed_pw = await get_password_hash_async(user.password)
+    await users.insert({
         "name": user.name,
         "email": email_norm,
         "phone": user.phone,
@@ -61,9 +60,7 @@ def signup_options():
 @router.post("/login")
 async def login(user: LoginUser):
     email_norm = user.email.strip().lower()
-    existing_user = db.users.find_one({
-        "email": {"$regex": f"^{re.escape(email_norm)}$", "$options": "i"}
-    })
+    existing_user = await users.get(email_norm)
     # Validate password with legacy fallback for plaintext records
     if not existing_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -77,17 +74,15 @@ async def login(user: LoginUser):
     valid = False
     try:
         if stored_pw:
-            valid = verify_password(user.password, stored_pw)
+            valid = await verify_password_async(user.password, stored_pw)
     except Exception:
         valid = False
     # Fallback: support legacy plaintext password once and upgrade to hashed
     if not valid and stored_pw and user.password == stored_pw:
         valid = True
         try:
-            new_hash = get_password_hash(user.password)
-            db.users.update_one({
-                "email": {"$regex": f"^{re.escape(email_norm)}$", "$options": "i"}
-            }, {"$set": {"password": new_hash, "password_hash": None, "hashed_password": None, "pass": None}})
+            new_hash = await get_password_hash_async(user.password)
+            await users.update(email_norm, {"password": new_hash, "password_hash": None, "hashed_password": None, "pass": None})
         except Exception:
             pass
     if not valid:
@@ -97,9 +92,8 @@ async def login(user: LoginUser):
         phone_val = (user.phone or '').strip()
         if not re.match(r"^(whatsapp:)?\+?\d{7,15}$", phone_val):
             raise HTTPException(status_code=400, detail="Phone must be E.164 like '+<countrycode><number>' or 'whatsapp:+<number>'.")
-        db.users.update_one({
-            "email": {"$regex": f"^{re.escape(email_norm)}$", "$options": "i"}
-        }, {"$set": {"phone": phone_val}})
+        await users.update(email_norm, {"phone": phone_val})
+        invalidate_user_profile(email_norm)
     token = create_access_token({"sub": email_norm})
     return {"access_token": token, "token_type": "bearer"}
 
@@ -113,14 +107,9 @@ def login_options():
     return Response(status_code=204)
 
 @router.get("/me")
-async def me(current_user: str = Depends(decode_access_token)):
-    # current_user is the email stored as "sub"
-    # case-insensitive match to handle legacy mixed-case emails
-    user_doc = db.users.find_one({
-        "email": {"$regex": f"^{re.escape(current_user)}$", "$options": "i"}
-    }, {"_id": 0, "password": 0})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="User not found")
+async def me(user_doc: dict = Depends(require_user_profile)):
+    # Profile is resolved from the JWT "sub" (email) by the shared user context
+    user_doc.pop("_id", None)
     return user_doc
 
 class WhatsAppVerifyPayload(BaseModel):
@@ -130,10 +119,9 @@ class WhatsAppVerifyPayload(BaseModel):
 async def whatsapp_verify(payload: WhatsAppVerifyPayload, current_user: str = Depends(decode_access_token)):
     # Default behavior: set whatsappVerified to True when user confirms
     flag = bool(payload.verified) if payload.verified is not None else True
-    result = db.users.update_one({
-        "email": {"$regex": f"^{re.escape(current_user)}$", "$options": "i"}
-    }, {"$set": {"whatsappVerified": flag, "whatsappVerifiedAt": datetime.utcnow()}})
-    if result.matched_count == 0:
+    matched = await users.update(current_user, {"whatsappVerified": flag, "whatsappVerifiedAt": datetime.utcnow()})
+    invalidate_user_profile(current_user)
+    if matched == 0:
         raise HTTPException(status_code=404, detail="User not found")
     # Return updated minimal status
     return {"ok": True, "whatsappVerified": flag}
@@ -145,10 +133,9 @@ async def update_phone(payload: UpdatePhone, current_user: str = Depends(decode_
     # Accept E.164 or whatsapp:+ prefix; store as provided to preserve intent
     if not re.match(r"^(whatsapp:)?\+?\d{7,15}$", phone):
         raise HTTPException(status_code=400, detail="Phone must be E.164 like '+<countrycode><number>' or 'whatsapp:+<number>'.")
-    result = db.users.update_one({
-        "email": {"$regex": f"^{re.escape(current_user)}$", "$options": "i"}
-    }, {"$set": {"phone": phone}})
-    if result.matched_count == 0:
+    matched = await users.update(current_user, {"phone": phone})
+    invalidate_user_profile(current_user)
+    if matched == 0:
         raise HTTPException(status_code=404, detail="User not found")
     return {"ok": True, "phone": phone}
 
@@ -194,11 +181,10 @@ async def update_delivery_settings(payload: UpdateDeliverySettings, current_user
     if not updates:
         raise HTTPException(status_code=400, detail="No valid fields to update")
 
-    result = db.users.update_one({
-        "email": {"$regex": f"^{re.escape(current_user)}$", "$options": "i"}
-    }, {"$set": updates})
+    matched = await users.update(current_user, updates)
+    invalidate_user_profile(current_user)
 
-    if result.matched_count == 0:
+    if matched == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
     return {"ok": True, **updates}
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import ValidationError
 from typing import List
-from app.models import Ingredient
-from app.database import ingredients_col
+import csv
+import io
+import json
+from app.models import Ingredient, IngredientIn, IngredientOut
+from app.data_access import ingredients
+from app.services.ingredient_canon import canonical_name
+from app.responses import FastJSONResponse
 from bson import ObjectId
 from app.auth import decode_access_token
 
@@ -13,30 +19,109 @@ def get_user_id(user_id: str = Depends(decode_access_token)):
     return user_id
 
 @router.post("/")
-def add_ingredient(ingredient: Ingredient, user_id: str = Depends(decode_access_token)):
+async def add_ingredient(ingredient: Ingredient, user_id: str = Depends(decode_access_token)):
     data = ingredient.dict()
     data["user_id"] = user_id
-    ingredients_col.insert_one(data)
+    await ingredients.insert(data)
     return {"message": "Ingredient added"}
 
-@router.get("/", response_model=List[Ingredient])
-def list_ingredients(user_id: str = Depends(decode_access_token)):
-    items = list(ingredients_col.find({"user_id": user_id}, {"_id": 0}))
-    return items
+# Stored fields returned by GET /ingredients; _id is the stable item id
+INGREDIENT_LIST_PROJECTION = {"_id": 1, "name": 1, "quantity": 1, "unit": 1, "created_at": 1}
+
+
+@router.get("/", response_model=List[IngredientOut])
+async def list_ingredients(user_id: str = Depends(decode_access_token)):
+    # Rows are already shaped by the projection; skip per-item model construction
+    items = await ingredients.list_for_user(user_id, INGREDIENT_LIST_PROJECTION)
+    return FastJSONResponse(items)
 
 @router.put("/{ingredient_name}")
-def update_ingredient(ingredient_name: str, ingredient: Ingredient, user_id: str = Depends(decode_access_token)):
-    result = ingredients_col.update_one(
-        {"user_id": user_id, "name": ingredient_name},
-        {"$set": ingredient.dict()}
-    )
-    if result.matched_count == 0:
+async def update_ingredient(ingredient_name: str, ingredient: Ingredient, user_id: str = Depends(decode_access_token)):
+    matched = await ingredients.update(user_id, ingredient_name, ingredient.dict())
+    if matched == 0:
         raise HTTPException(status_code=404, detail="Ingredient not found")
     return {"message": "Ingredient updated"}
 
 @router.delete("/{ingredient_name}")
-def delete_ingredient(ingredient_name: str, user_id: str = Depends(decode_access_token)):
-    result = ingredients_col.delete_one({"user_id": user_id, "name": ingredient_name})
-    if result.deleted_count == 0:
+async def delete_ingredient(ingredient_name: str, user_id: str = Depends(decode_access_token)):
+    deleted = await ingredients.delete(user_id, ingredient_name)
+    if deleted == 0:
         raise HTTPException(status_code=404, detail="Ingredient not found")
     return {"message": "Ingredient deleted"}
+
+# Upper bound per bulk request; larger pantries can be sent in chunks
+BULK_MAX_ITEMS = 1000
+
+
+def _parse_bulk_rows(content_type: str, raw: bytes):
+    """Return (rows, ordered) from a JSON or CSV bulk body."""
+    if "csv" in content_type:
+        text = raw.decode("utf-8-sig")
+        reader = csv.DictReader(io.StringIO(text))
+        rows = [{(k or "").strip().lower(): (v or "").strip() for k, v in row.items()} for row in reader]
+        return rows, False
+    try:
+        body = json.loads(raw or b"null")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON or text/csv")
+    if isinstance(body, list):
+        return body, False
+    if isinstance(body, dict) and isinstance(body.get("items"), list):
+        return body["items"], bool(body.get("ordered", False))
+    raise HTTPException(status_code=400, detail="Expected a JSON list of ingredients or {\"items\": [...]}")
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err.get('loc', ()))}: {err.get('msg')}" for err in e.errors())
+
+
+@router.post("/bulk")
+async def bulk_upsert_ingredients(request: Request, user_id: str = Depends(decode_access_token)):
+    """Add or update many ingredients in one request.
+
+    Accepts a JSON list, {"items": [...], "ordered": bool}, or a text/csv body
+    with a name,quantity,unit header. Items are validated in one pass and
+    written with a single bulk_write; the response reports each item in input
+    order. Repeated names (compared canonically, so "Eggs" repeats "egg") keep
+    the last occurrence.
+    """
+    rows, ordered = _parse_bulk_rows(request.headers.get("content-type", ""), await request.body())
+    if len(rows) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+
+    results = [None] * len(rows)
+    latest = {}
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[i] = {"index": i, "status": "invalid", "error": "item must be an object"}
+            continue
+        try:
+            item = IngredientIn(**row)
+        except ValidationError as e:
+            results[i] = {"index": i, "name": row.get("name"), "status": "invalid", "error": _validation_message(e)}
+            continue
+        name = item.name.strip()
+        if not name:
+            results[i] = {"index": i, "name": item.name, "status": "invalid", "error": "name: must not be empty"}
+            continue
+        key = canonical_name(name)
+        if key in latest:
+            prev = latest[key][0]
+            results[prev] = {"index": prev, "name": latest[key][1]["name"], "status": "duplicate",
+                             "error": f"superseded by item {i}"}
+        latest[key] = (i, {"name": name, "quantity": float(item.quantity), "unit": item.unit.strip()})
+
+    pending = sorted(latest.values(), key=lambda entry: entry[0])
+    written = await ingredients.bulk_upsert(user_id, [doc for _, doc in pending], ordered=ordered)
+    for (i, _), outcome in zip(pending, written):
+        results[i] = {"index": i, **outcome}
+
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {
+        "ok": counts.get("created", 0) + counts.get("updated", 0) == len(results),
+        "total": len(results),
+        "counts": counts,
+        "results": results,
+    }
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-try:
-    from app.services.gemini_service import generate_meal_plan
-except ImportError:
-    from app.services.ai_service import generate_meal_plan
-from app.database import ingredients_col, mealplans_col, users_col
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from app.services.plan_generation import generate_plan, local_plan
+from app.services.rate_limit import Overloaded, check_rate_limit, overloaded_exception
+from app.data_access import ingredients, mealplans
 from app.auth import decode_access_token
-from datetime import datetime
+from app.dependencies import get_user_profile
+from app.responses import FastJSONResponse
+from app.services.plan_reuse import inventory_fingerprint, should_reuse
+from app.services.plan_upgrade import save_provisional
+from datetime import datetime, date
+from typing import Optional
+import base64
+import hashlib
+import json
 import pytz
 
 router = APIRouter(prefix="/mealplan", tags=["mealplan"])
@@ -15,53 +22,160 @@ def get_user_id(user_id: str = Depends(decode_access_token)):
         raise HTTPException(status_code=401, detail="Invalid token")
     return user_id
 
+def _user_today(user: Optional[dict]) -> str:
+    """Today's date (YYYY-MM-DD) in the user's timezone, falling back to UTC."""
+    tz_name = (user or {}).get("timezone", "UTC")
+    try:
+        tz = pytz.timezone(tz_name)
+    except Exception:
+        tz = pytz.timezone("UTC")
+    return datetime.now(pytz.utc).astimezone(tz).date().isoformat()
+
+
+def _plan_etag(version: dict) -> str:
+    stamp = max(str(version.get(k) or "") for k in ("created_at", "updated_at", "whatsapp_sent_at"))
+    digest = hashlib.sha1(f"{version.get('_id')}:{stamp}".encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison (RFC 9110): ignore a W/ prefix
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+
+@router.get("/today")
+async def today_mealplan(request: Request, user_id: str = Depends(decode_access_token), user: dict = Depends(get_user_profile)):
+    """Stored plan for the user's local date; never generates. Supports If-None-Match."""
+    today_str = _user_today(user)
+    version = await mealplans.latest_version(user_id, today_str)
+    if not version:
+        raise HTTPException(status_code=404, detail="No meal plan for today")
+    etag = _plan_etag(version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    plan = await mealplans.get(version["_id"])
+    if not plan:
+        raise HTTPException(status_code=404, detail="No meal plan for today")
+    plan.pop("user_id", None)
+    return FastJSONResponse({"date": today_str, "meal_plan": plan}, headers=headers)
+
+
 @router.get("/preview")
-def preview_mealplan(user_id: str = Depends(decode_access_token)):
-    ingredients = list(ingredients_col.find({"user_id": user_id}, {"_id": 0, "user_id": 0}))
-    if not ingredients:
+async def preview_mealplan(user_id: str = Depends(decode_access_token), user: dict = Depends(get_user_profile)):
+    items = await ingredients.list_for_user(user_id)
+    if not items:
         return {"message": "Add ingredients first"}
-    
-    plan = generate_meal_plan(ingredients)
+
+    try:
+        plan = await run_in_threadpool(generate_plan, user_id, items, rate_limit_scope="preview")
+    except Overloaded:
+        # Shed load: show today's stored plan, else an ingredient-only local plan
+        stored = await mealplans.get_for_date(user_id, _user_today(user))
+        if stored:
+            return {"meal_plan": stored, "degraded": "stored"}
+        return {"meal_plan": await run_in_threadpool(local_plan, items), "degraded": "local"}
     return {"meal_plan": plan}
 
 @router.post("/save-now")
-def save_mealplan_now(user_id: str = Depends(decode_access_token)):
+async def save_mealplan_now(
+    mode: str = Query("wait", pattern="^(wait|provisional)$"),
+    user_id: str = Depends(decode_access_token),
+    user: dict = Depends(get_user_profile),
+):
     # Fetch ingredients
-    ingredients = list(ingredients_col.find({"user_id": user_id}, {"_id": 0, "user_id": 0}))
-    if not ingredients:
+    items = await ingredients.list_for_user(user_id)
+    if not items:
         raise HTTPException(status_code=400, detail="Add ingredients first")
 
+    # Reuse today's plan when the policy allows, before spending a generation
+    today_str = _user_today(user)
+    existing = await mealplans.get_for_date(user_id, today_str)
+    if should_reuse(existing, items):
+        return {"ok": True, "message": "Meal plan already exists for today", "meal_plan": existing}
+
     # Generate plan
-    plan = generate_meal_plan(ingredients)
+    if mode == "provisional":
+        # The upgrade generates in the background, so charge the request here
+        check_rate_limit(user_id, "save_now")
+        # Answer now with a cached/local plan; the LLM upgrade lands on the same document
+        plan_id = await save_provisional(user_id, today_str, items, "manual_api")
+        saved = await mealplans.get(plan_id)
+        return {"ok": True, "message": "Saved provisional plan; poll /mealplan/today for the upgrade",
+                "provisional": True, "meal_plan": saved}
+    try:
+        plan = await run_in_threadpool(generate_plan, user_id, items, rate_limit_scope="save_now")
+    except Overloaded as e:
+        raise overloaded_exception(e)
     if not isinstance(plan, dict) or not plan:
         raise HTTPException(status_code=500, detail="Failed to generate meal plan")
 
-    # Resolve user's timezone for date stamping
-    user = users_col.find_one({"email": user_id})
-    tz_name = (user or {}).get("timezone", "UTC")
-    try:
-        tz = pytz.timezone(tz_name)
-    except Exception:
-        tz = pytz.timezone("UTC")
-    now_local = datetime.now(pytz.utc).astimezone(tz)
-    today_str = now_local.date().isoformat()
-
-    # Idempotency: avoid duplicate for today
-    existing = mealplans_col.find_one({"user_id": user_id, "date": today_str}, {"_id": 0})
-    if existing:
-        return {"ok": True, "message": "Meal plan already exists for today", "meal_plan": existing}
-
     # Save
     doc = {
         "user_id": user_id,
         "date": today_str,
         "created_at": datetime.utcnow().isoformat(),
         "origin": "manual_api",
+        "inventory_fingerprint": inventory_fingerprint(items),
         **plan,
     }
     try:
-        mealplans_col.insert_one(doc)
+        inserted_id = await mealplans.insert(doc)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB insert failed: {e}")
-    saved = mealplans_col.find_one({"user_id": user_id, "date": today_str}, {"_id": 0})
+    saved = await mealplans.get(inserted_id)
     return {"ok": True, "message": "Saved", "meal_plan": saved}
+
+HISTORY_MAX_LIMIT = 100
+
+
+def _encode_cursor(plan: dict) -> str:
+    plan_id = plan.get("id") or plan.get("_id") or ""
+    raw = json.dumps([plan.get("date") or "", plan.get("created_at") or "", str(plan_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        plan_date, created_at, plan_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(plan_date), str(created_at), str(plan_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _check_date(value: Optional[str], name: str) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM-DD")
+
+
+@router.get("/history")
+async def mealplan_history(
+    user_id: str = Depends(decode_access_token),
+    limit: int = Query(20, ge=1, le=HISTORY_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated recipe fields to keep per meal, e.g. recipe_name"),
+):
+    """Newest-first plan history, paginated by (date, created_at). Pass next_cursor back as cursor."""
+    before = _decode_cursor(cursor) if cursor else None
+    recipe_fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    plans = await mealplans.history(
+        user_id, limit, before=before,
+        date_from=_check_date(date_from, "date_from"), date_to=_check_date(date_to, "date_to"),
+        recipe_fields=recipe_fields,
+    )
+    for plan in plans:
+        plan.pop("user_id", None)
+        if "_id" in plan:
+            plan["id"] = str(plan.pop("_id"))
+    next_cursor = _encode_cursor(plans[-1]) if len(plans) == limit else None
+    return FastJSONResponse({"items": plans, "next_cursor": next_cursor})
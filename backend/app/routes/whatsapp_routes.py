@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from app.services.whatsapp_service import process_whatsapp_reply
 from pydantic import BaseModel
 from typing import Optional
 from app.auth import decode_access_token
-from app.database import users_col, ingredients_col, mealplans_col
+from app.data_access import ingredients, mealplans
+from app.dependencies import require_user_profile
+from app.services.plan_reuse import inventory_fingerprint, should_reuse
 
 from datetime import datetime
 from app.services.whatsapp_service import send_mealplan_whatsapp, send_template_whatsapp
@@ -11,11 +14,9 @@ from app.config import WHATSAPP_VERIFY_TOKEN
 import re
 import pytz
 
-# Import meal plan generator (Gemini preferred, fallback to OpenAI)
-try:
-    from app.services.gemini_service import generate_meal_plan
-except ImportError:
-    from app.services.ai_service import generate_meal_plan
+# Meal plan generator (Gemini preferred, fallback to OpenAI), coalesced per user and inventory
+from app.services.plan_generation import generate_plan
+from app.services.rate_limit import Overloaded, overloaded_exception
 
 router = APIRouter(prefix="/whatsapp", tags=["whatsapp"])
 
@@ -91,26 +92,17 @@ def _meal_from_time(selected_time: str) -> str:
 
 
 @router.post("/send")
-def send_mealplan(selected: SendRequest, current_user: str = Depends(decode_access_token)):
-    # current_user is email from JWT "sub"
-    user_doc = users_col.find_one({"email": {"$regex": f"^{re.escape(current_user)}$", "$options": "i"}})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="User not found")
-
+async def send_mealplan(selected: SendRequest, current_user: str = Depends(decode_access_token), user_doc: dict = Depends(require_user_profile)):
+    # current_user is email from JWT "sub"; user_doc is the cached profile for it
     # Require WhatsApp verification before sending
     if not bool(user_doc.get("whatsappVerified")):
         raise HTTPException(status_code=403, detail="Please verify WhatsApp by sending the join message first.")
 
     # Fetch user's ingredients (stored by email ID in this project)
-    ingredients = list(ingredients_col.find({"user_id": current_user}, {"_id": 0, "user_id": 0}))
-    if not ingredients:
+    items = await ingredients.list_for_user(current_user)
+    if not items:
         raise HTTPException(status_code=400, detail="Add ingredients first")
 
-    # Generate full plan and decide which meal to send
-    plan = generate_meal_plan(ingredients) or {}
-    if not plan:
-        raise HTTPException(status_code=500, detail="Failed to generate meal plan")
-
     meal_key = (selected.meal or (selected.selected_time and _meal_from_time(selected.selected_time)) or "breakfast").lower()
     if meal_key not in ["breakfast", "lunch", "dinner"]:
         meal_key = "breakfast"
@@ -124,23 +116,36 @@ def send_mealplan(selected: SendRequest, current_user: str = Depends(decode_acce
     now_local = datetime.now(pytz.utc).astimezone(tz)
     today_str = now_local.date().isoformat()
 
-    # Save plan record (capture insert status for accurate response)
+    # Reuse today's plan when the policy allows; otherwise generate and save a new one
     insert_ok = False
     inserted_id = None
     db_error_msg = None
-    try:
-        result = mealplans_col.insert_one({
-            "user_id": current_user,
-            "date": today_str,
-            "created_at": datetime.utcnow().isoformat(),
-            "origin": "whatsapp_send",
-            **plan
-        })
-        insert_ok = True
-        inserted_id = result.inserted_id
-    except Exception as e:
-        db_error_msg = str(e)
-        print(f"Mealplan insert failed: {e}")
+    existing = await mealplans.get_for_date(current_user, today_str, {"user_id": 0})
+    reused = should_reuse(existing, items, for_delivery=True)
+    if reused:
+        plan = existing
+    else:
+        try:
+            plan = await run_in_threadpool(generate_plan, current_user, items, rate_limit_scope="whatsapp_send") or {}
+        except Overloaded as e:
+            raise overloaded_exception(e)
+        if not plan:
+            raise HTTPException(status_code=500, detail="Failed to generate meal plan")
+
+        # Save plan record (capture insert status for accurate response)
+        try:
+            inserted_id = await mealplans.insert({
+                "user_id": current_user,
+                "date": today_str,
+                "created_at": datetime.utcnow().isoformat(),
+                "origin": "whatsapp_send",
+                "inventory_fingerprint": inventory_fingerprint(items),
+                **plan
+            })
+            insert_ok = True
+        except Exception as e:
+            db_error_msg = str(e)
+            print(f"Mealplan insert failed: {e}")
 
     # Validate phone format
     phone = (selected.to_override or user_doc.get("phone") or "").strip()
@@ -161,27 +166,29 @@ def send_mealplan(selected: SendRequest, current_user: str = Depends(decode_acce
 
         use_template = bool(selected.use_template) or auto_use_template
         if use_template:
-            sid, status, meta_raw = send_template_whatsapp(phone, selected.template_name or "hello_world", selected.template_lang or "en_US")
+            sid, status, meta_raw = await run_in_threadpool(send_template_whatsapp, phone, selected.template_name or "hello_world", selected.template_lang or "en_US")
         else:
-            sid, status, meta_raw = send_mealplan_whatsapp(phone, filtered_plan, user_doc.get("name", "User"))
+            sid, status, meta_raw = await run_in_threadpool(send_mealplan_whatsapp, phone, filtered_plan, user_doc.get("name", "User"))
     except Exception as e:
         msg = str(e)
         raise HTTPException(status_code=502, detail=f"WhatsApp send failed: {msg}")
 
     # On successful send, mark the plan document as sent
-    if sid and insert_ok and inserted_id:
+    plan_id = inserted_id or (existing.get("_id") if reused else None)
+    if sid and plan_id:
         try:
-            mealplans_col.update_one({"_id": inserted_id}, {"$set": {"whatsapp_sent_at": datetime.utcnow().isoformat()}})
+            await mealplans.update({"_id": plan_id}, {"whatsapp_sent_at": datetime.utcnow().isoformat()})
         except Exception:
             pass
 
     # Consider success only when Meta/Twilio returns a message id; also report DB status
     is_success = bool(sid)
     return {
-        "ok": is_success and insert_ok,
+        "ok": is_success and (insert_ok or reused),
         "db_inserted": insert_ok,
+        "db_reused": reused,
         "db_error": db_error_msg,
-        "db_id": str(inserted_id) if inserted_id else None,
+        "db_id": str(plan_id) if plan_id else None,
         "meal": meal_key,
         "to_number": phone,
         "status": status,
@@ -195,5 +202,5 @@ def send_mealplan(selected: SendRequest, current_user: str = Depends(decode_acce
 async def test_scheduler(current_user: dict = Depends(decode_access_token)):
     """Test endpoint to manually trigger scheduler for current user"""
     from app.services.scheduler import job_send_mealplans
-    job_send_mealplans()
+    await run_in_threadpool(job_send_mealplans)
     return {"message": "Scheduler triggered manually"}
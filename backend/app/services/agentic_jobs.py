@@ -0,0 +1,246 @@
+"""
+Background jobs for /agentic/run?mode=job.
+
+The pipeline reports stage transitions through a StageRecorder. The plain
+recorder does nothing (synchronous requests); JobStageRecorder writes each
+transition to the job's document in `agentic_jobs`, which backs both the
+status endpoint and the SSE stream. Jobs run as tasks on the app's event
+loop, at most AGENTIC_JOB_CONCURRENCY at a time per process.
+
+A job dies with its process. While it is queued or running, its process
+touches `updated_at` every minute; fail_stale_jobs() (at startup and from the
+scheduler) marks queued/running jobs that stopped updating as failed. The SSE
+URL carries a short-lived token scoped to one job instead of the access token.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from app.auth import create_scoped_token, decode_scoped_token
+from app.config import (
+    AGENTIC_JOB_CONCURRENCY,
+    AGENTIC_JOB_STALE_MINUTES,
+    AGENTIC_JOB_TTL_HOURS,
+    AGENTIC_STREAM_TOKEN_SECONDS,
+)
+from app.data_access import run_db
+from app.database import agentic_jobs_col
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+ACTIVE_STATUSES = ("queued", "running")
+STREAM_TOKEN_SCOPE = "agentic_job_events"
+_POLL_SECONDS = 1.0
+_HEARTBEAT_SECONDS = 60.0
+
+_tasks: Set[asyncio.Task] = set()
+_wakeups: Dict[str, Set[asyncio.Event]] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _notify(job_id: ObjectId) -> None:
+    for event in _wakeups.get(str(job_id), ()):
+        event.set()
+
+
+class StageRecorder:
+    """Stage hooks for the agentic pipeline (see stage_graph); no-ops outside job mode."""
+
+    async def start(self, name: str) -> None:
+        pass
+
+    async def succeed(self, name: str) -> None:
+        pass
+
+    async def skip(self, name: str) -> None:
+        pass
+
+    async def fail(self, name: str, detail: str) -> None:
+        pass
+
+
+class JobStageRecorder(StageRecorder):
+    def __init__(self, job_id: ObjectId):
+        self.job_id = job_id
+        self._started: Dict[str, float] = {}
+
+    async def update(self, fields: dict) -> None:
+        await run_db(agentic_jobs_col.update_one, {"_id": self.job_id}, {"$set": {**fields, "updated_at": _now()}})
+        _notify(self.job_id)
+
+    async def _close(self, name: str, status: str, detail: Optional[str] = None) -> None:
+        started = self._started.pop(name, None)
+        fields = {f"stages.{name}.status": status, f"stages.{name}.finished_at": _now()}
+        if started is not None:
+            fields[f"stages.{name}.duration_ms"] = round((asyncio.get_running_loop().time() - started) * 1000, 1)
+        if detail:
+            fields[f"stages.{name}.detail"] = detail
+        await self.update(fields)
+
+    async def start(self, name: str) -> None:
+        self._started[name] = asyncio.get_running_loop().time()
+        await self.update({f"stages.{name}": {"status": "running", "started_at": _now()}})
+
+    async def succeed(self, name: str) -> None:
+        await self._close(name, "succeeded")
+
+    async def skip(self, name: str) -> None:
+        await self._close(name, "skipped")
+
+    async def fail(self, name: str, detail: str) -> None:
+        await self._close(name, "failed", detail)
+
+    async def cancel_running(self) -> None:
+        for name in list(self._started):
+            await self._close(name, "cancelled")
+
+
+async def create_job(user_id: str, kind: str, request: dict) -> ObjectId:
+    now = datetime.utcnow()
+    doc = {
+        "user_id": user_id,
+        "kind": kind,
+        "status": "queued",
+        "stages": {},
+        "request": jsonable_encoder(request),
+        "created_at": now.isoformat(),
+        "updated_at": now.isoformat(),
+        "expires_at": now + timedelta(hours=AGENTIC_JOB_TTL_HOURS),
+    }
+    result = await run_db(agentic_jobs_col.insert_one, doc)
+    return result.inserted_id
+
+
+def launch(job_id: ObjectId, pipeline: Callable[[StageRecorder], Awaitable[dict]]) -> None:
+    """Run pipeline(recorder) in the background and record its outcome on the job."""
+    task = asyncio.get_running_loop().create_task(_run(job_id, pipeline))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _run(job_id: ObjectId, pipeline: Callable[[StageRecorder], Awaitable[dict]]) -> None:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, AGENTIC_JOB_CONCURRENCY))
+    recorder = JobStageRecorder(job_id)
+    heartbeat = asyncio.get_running_loop().create_task(_heartbeat(job_id))
+    try:
+        async with _semaphore:
+            await _run_pipeline(job_id, pipeline, recorder)
+    finally:
+        heartbeat.cancel()
+
+
+async def _heartbeat(job_id: ObjectId) -> None:
+    """Keep a queued or running job from looking stale to fail_stale_jobs()."""
+    while True:
+        await asyncio.sleep(_HEARTBEAT_SECONDS)
+        try:
+            await run_db(agentic_jobs_col.update_one, {"_id": job_id, "status": {"$in": list(ACTIVE_STATUSES)}},
+                         {"$set": {"updated_at": _now()}})
+        except Exception as e:
+            logger.warning(f"Agentic job {job_id} heartbeat failed: {e}")
+
+
+async def _run_pipeline(job_id: ObjectId, pipeline: Callable[[StageRecorder], Awaitable[dict]],
+                        recorder: JobStageRecorder) -> None:
+    await recorder.update({"status": "running", "started_at": _now()})
+    try:
+        result = await pipeline(recorder)
+        await recorder.update({"status": "succeeded", "finished_at": _now(), "result": jsonable_encoder(result)})
+    except HTTPException as e:
+        await recorder.cancel_running()
+        await recorder.update({"status": "failed", "finished_at": _now(),
+                               "error": {"status_code": e.status_code, "detail": e.detail}})
+    except Exception as e:
+        logger.exception(f"Agentic job {job_id} failed")
+        await recorder.cancel_running()
+        await recorder.update({"status": "failed", "finished_at": _now(),
+                               "error": {"status_code": 500, "detail": str(e)}})
+
+
+def fail_stale_jobs(stale_minutes: int = AGENTIC_JOB_STALE_MINUTES) -> int:
+    """Mark queued/running jobs without an update for stale_minutes as failed; returns the count.
+    Their process stopped (restart, crash) so nothing will finish them."""
+    now = datetime.utcnow()
+    cutoff = (now - timedelta(minutes=stale_minutes)).isoformat()
+    result = agentic_jobs_col.update_many(
+        {"status": {"$in": list(ACTIVE_STATUSES)}, "updated_at": {"$lt": cutoff}},
+        {"$set": {
+            "status": "failed",
+            "finished_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "error": {"status_code": 503, "detail": "Job was interrupted by a server restart; run it again"},
+        }},
+    )
+    if result.modified_count:
+        logger.warning(f"Marked {result.modified_count} interrupted agentic job(s) as failed")
+    return result.modified_count
+
+
+def create_stream_token(job_id, user_id: str) -> str:
+    """Token for the job's SSE URL: only valid for that job's events, for AGENTIC_STREAM_TOKEN_SECONDS."""
+    return create_scoped_token(user_id, STREAM_TOKEN_SCOPE, timedelta(seconds=AGENTIC_STREAM_TOKEN_SECONDS),
+                               job=str(job_id))
+
+
+def stream_token_user(token: Optional[str], job_id: str) -> Optional[str]:
+    claims = decode_scoped_token(token, STREAM_TOKEN_SCOPE)
+    return claims["sub"] if claims and claims.get("job") == str(job_id) else None
+
+
+async def get_job(job_id: str, user_id: str) -> Optional[dict]:
+    if not ObjectId.is_valid(job_id):
+        return None
+    job = await run_db(agentic_jobs_col.find_one, {"_id": ObjectId(job_id), "user_id": user_id}, {"expires_at": 0})
+    if job:
+        job["id"] = str(job.pop("_id"))
+    return job
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), separators=(',', ':'))}\n\n"
+
+
+async def stream_job_events(job_id: str, user_id: str) -> AsyncIterator[str]:
+    """SSE frames: one `stage` event per stage transition, then a final `done` event."""
+    key = str(job_id)
+    event = asyncio.Event()
+    _wakeups.setdefault(key, set()).add(event)
+    sent: Dict[str, str] = {}
+    try:
+        while True:
+            event.clear()
+            job = await get_job(job_id, user_id)
+            if job is None:
+                yield _sse("error", {"detail": "Job not found"})
+                return
+            for name, stage in (job.get("stages") or {}).items():
+                if sent.get(name) != stage.get("status"):
+                    sent[name] = stage.get("status")
+                    yield _sse("stage", {"name": name, **stage})
+            if job.get("status") in TERMINAL_STATUSES:
+                yield _sse("done", {k: job.get(k) for k in ("id", "status", "result", "error")})
+                return
+            try:
+                # Local transitions wake us immediately; other instances are picked up by polling
+                await asyncio.wait_for(event.wait(), timeout=_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        listeners = _wakeups.get(key)
+        if listeners is not None:
+            listeners.discard(event)
+            if not listeners:
+                _wakeups.pop(key, None)
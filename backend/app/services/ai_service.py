@@ -1,5 +1,9 @@
 import openai
 from app.config import OPENAI_API_KEY
+from app.services.ingredient_canon import canonical_name, normalize_recipe_ingredients
+from app.services.provider_quota import estimate_tokens, openai_budget, parse_retry_after
+from app.services.recipe_corpus import corpus_meal_plan
+from app.services.step_sanitizer import sanitize_steps
 import os
 
 openai.api_key = OPENAI_API_KEY
@@ -12,86 +16,21 @@ OPENAI_FREQUENCY_PENALTY = float(os.getenv("OPENAI_FREQUENCY_PENALTY", "0.2"))
 
 # --- Helpers to ensure realistic recipes even if model output is imperfect ---
 
-def _normalize_ingredients(ingredients):
-    normalized = []
-    for ing in (ingredients or []):
-        name = str(ing.get('name', '')).strip()
-        qty = ing.get('quantity')
-        unit = ing.get('unit')
-        if isinstance(unit, str) and unit.lower() == 'dozen' and isinstance(qty, (int, float)):
-            qty = float(qty) * 12
-            unit = 'pieces'
-        normalized.append({'name': name or 'Unknown', 'quantity': qty, 'unit': unit})
-    return normalized
-
-
-def _sanitize_steps(steps, ingredients):
-    if not steps:
-        return []
-    lower_names = [(ing.get('name') or '').lower() for ing in (ingredients or [])]
-    packaged = set(['biscuits', 'cornflakes', 'bread', 'maggi', 'papad', 'tomato ketchup', 'peanut butter'])
-    dals = set(['chana dal', 'toor dal', 'moong dal', 'masoor dal', 'rajma'])
-    equipment_terms = ['cutting board', 'knife', 'mixing bowl', 'pot', 'pan', 'spatula', 'strainer', 'colander']
-
-    def fix_line(line):
-        s = str(line).strip()
-        ls = s.lower()
-        # Remove equipment-list/setup lines
-        eq_count = sum(1 for term in equipment_terms if term in ls)
-        if ls.startswith('set out') or 'prepare your workspace' in ls or eq_count >= 3:
-            return ''
-        # Specific corrections
-        if 'wash and chop cornflakes' in ls:
-            return 'Use cornflakes as a crunchy topping; do not chop.'
-        if 'wash and chop bread' in ls:
-            return 'Toast bread slices until golden; cut into pieces.'
-        if 'wash and chop chana dal' in ls:
-            return 'Rinse chana dal; boil until tender; season to taste.'
-        # Generic corrections
-        for name in lower_names:
-            if name in packaged and ('wash' in ls and ('chop' in ls or 'dice' in ls) and name in ls):
-                if name == 'biscuits':
-                    return 'Crush biscuits into coarse crumbs.'
-                if name == 'cornflakes':
-                    return 'Use cornflakes as a crunchy topping; do not chop.'
-                if name == 'bread':
-                    return 'Toast bread slices until golden; cut into triangles.'
-                if name == 'maggi':
-                    return 'Cook Maggi noodles as per packet instructions.'
-                if name == 'papad':
-                    return 'Roast or fry papad until crisp.'
-            if name in dals and ('chop' in ls and name in ls):
-                return f'Rinse {name}; boil until tender and season.'
-            if name in ['banana', 'bananas'] and 'chop' in ls and name in ls:
-                return 'Peel and slice bananas.'
-        return s
-
-    cleaned = []
-    for line in steps:
-        fixed = fix_line(line)
-        if fixed:
-            cleaned.append(fixed)
-    # Deduplicate while preserving order; cap to 10 steps
-    seen = set()
-    unique = []
-    for s in cleaned:
-        if s not in seen:
-            seen.add(s)
-            unique.append(s)
-    return unique[:10]
-
-
 def _sanitize_recipe(recipe: dict) -> dict:
     r = dict(recipe or {})
     ingredients = r.get('ingredients_used') or r.get('ingredients') or []
-    r['ingredients_used'] = _normalize_ingredients(ingredients)
-    r['steps'] = _sanitize_steps(r.get('steps') or [], r['ingredients_used'])
+    r['ingredients_used'] = normalize_recipe_ingredients(ingredients)
+    r['steps'] = sanitize_steps(r.get('steps') or [], r['ingredients_used'])
     return r
 
 
 def _fallback_plan(ingredients: list) -> dict:
+    # Prefer a curated recipe from the local corpus when the pantry covers every meal
+    corpus_plan = corpus_meal_plan(ingredients)
+    if corpus_plan:
+        return corpus_plan
     # Simple rule-based plan using only the user's actual ingredients
-    names = {str(i.get('name','')).lower(): i for i in (ingredients or [])}
+    names = {canonical_name(i.get('name')): i for i in (ingredients or [])}
     all_names = list(names.keys())
     has = lambda k: any(k == n for n in names.keys())
 
@@ -102,8 +41,8 @@ def _fallback_plan(ingredients: list) -> dict:
     def present(list_of_names):
         return [q(n) for n in list_of_names if has(n)]
 
-    fruits_list = ['apple','apples','banana','bananas','orange','oranges','mango','mangos','grape','grapes','pear','pears']
-    dal_list = ['chana dal','toor dal','moong dal','masoor dal','rajma']
+    fruits_list = ['apple','banana','orange','mango','grape','pear']
+    dal_list = ['chana dal','toor dal','moong dal','masoor dal','rajma','lentils']
     fruits_present = [n for n in all_names if n in fruits_list]
     bread_present = [n for n in all_names if n in ['bread']]
     dal_present = [n for n in all_names if n in dal_list]
@@ -268,10 +207,11 @@ def _fallback_plan(ingredients: list) -> dict:
     }
 
 
-def generate_meal_plan(ingredients: list):
+def generate_meal_plan(ingredients: list, fallback: bool = True):
     """
     Generate a structured meal plan using OpenAI GPT-4 Turbo with constraints.
-    If the model output is missing/invalid or the API fails, use a rule-based fallback.
+    If the model output is missing/invalid or the API fails, use a rule-based fallback
+    (or, with fallback=False, raise the error).
     ingredients: list of dicts [{"name": "", "quantity": 0, "unit": ""}, ...]
     Returns a dict with breakfast, lunch, dinner
     """
@@ -308,15 +248,24 @@ def generate_meal_plan(ingredients: list):
     """
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=OPENAI_TEMPERATURE,
-            top_p=OPENAI_TOP_P,
-            presence_penalty=OPENAI_PRESENCE_PENALTY,
-            frequency_penalty=OPENAI_FREQUENCY_PENALTY,
-            max_tokens=900
-        )
+        # Reserve provider quota first; QuotaExhausted lands in the fallback below
+        reservation = openai_budget.acquire(estimate_tokens(prompt, 900)) if OPENAI_API_KEY else None
+        try:
+            response = openai.ChatCompletion.create(
+                model="gpt-4-turbo",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=OPENAI_TEMPERATURE,
+                top_p=OPENAI_TOP_P,
+                presence_penalty=OPENAI_PRESENCE_PENALTY,
+                frequency_penalty=OPENAI_FREQUENCY_PENALTY,
+                max_tokens=900
+            )
+        except openai.error.RateLimitError as e:
+            headers = getattr(e, "headers", None) or {}
+            openai_budget.throttled(parse_retry_after(headers.get("retry-after")))
+            raise
+        if reservation is not None:
+            openai_budget.settle(reservation, (response.get('usage') or {}).get('total_tokens'))
         plan_text = response['choices'][0]['message']['content']
         import json
         plan_json = json.loads(plan_text)
@@ -326,5 +275,7 @@ def generate_meal_plan(ingredients: list):
                 plan_json[key] = _sanitize_recipe(plan_json[key])
         return plan_json
     except Exception as e:
+        if not fallback:
+            raise
         print("AI service error, using fallback:", e)
         return _fallback_plan(ingredients)
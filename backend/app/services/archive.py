@@ -0,0 +1,197 @@
+"""
+Tiered storage for meal plans.
+
+Plans older than MEALPLAN_ARCHIVE_AFTER_DAYS are moved out of the hot
+`meal_plans` collection into `meal_plan_archives`: one document per user per
+month holding the plans as gzip-compressed extended JSON. The hot collection
+(and its indexes) then only covers recent days.
+
+`load_plan_history` is the read path for history queries; it merges hot and
+archived plans so callers don't need to know where a plan lives.
+"""
+import gzip
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bson import Binary, ObjectId, json_util
+from pymongo import ASCENDING, DESCENDING
+
+from app.config import MEALPLAN_ARCHIVE_AFTER_DAYS
+from app.database import mealplan_archives_col, mealplans_col, plan_signatures_col
+from app.services.recipe_store import MEAL_KEYS, hydrate_plans
+
+logger = logging.getLogger(__name__)
+
+
+def _bundle_id(user_id: str, month: str) -> str:
+    return f"{user_id}|{month}"
+
+
+def _compress(plans: List[dict]) -> Binary:
+    return Binary(gzip.compress(json_util.dumps(plans).encode("utf-8")))
+
+
+def _decompress(data) -> List[dict]:
+    if not data:
+        return []
+    return json_util.loads(gzip.decompress(bytes(data)).decode("utf-8"))
+
+
+def archive_cutoff(max_age_days: Optional[int] = None) -> str:
+    days = MEALPLAN_ARCHIVE_AFTER_DAYS if max_age_days is None else max_age_days
+    return (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+
+
+def _write_bundle(user_id: str, month: str, plans: List[dict]) -> None:
+    bundle_id = _bundle_id(user_id, month)
+    existing = mealplan_archives_col.find_one({"_id": bundle_id}, {"data": 1})
+    merged: Dict[str, dict] = {}
+    for plan in _decompress((existing or {}).get("data")) + plans:
+        merged[str(plan.get("_id"))] = plan
+    ordered = sorted(merged.values(), key=lambda p: (p.get("date") or "", p.get("created_at") or ""))
+    mealplan_archives_col.update_one(
+        {"_id": bundle_id},
+        {"$set": {
+            "user_id": user_id,
+            "month": month,
+            "count": len(ordered),
+            "first_date": ordered[0].get("date"),
+            "last_date": ordered[-1].get("date"),
+            "data": _compress(ordered),
+            "updated_at": datetime.utcnow().isoformat(),
+        }},
+        upsert=True,
+    )
+
+
+def archive_old_plans(max_age_days: Optional[int] = None, dry_run: bool = False) -> dict:
+    """Move plans dated before the cutoff into per-user monthly bundles.
+
+    The bundle is written before the source plans are deleted, so an interrupted
+    run leaves duplicates (resolved by _id on the next run) rather than gaps.
+    """
+    cutoff = archive_cutoff(max_age_days)
+    cursor = mealplans_col.find({"date": {"$lt": cutoff}}).sort([("user_id", ASCENDING), ("date", ASCENDING)])
+    stats = {"cutoff": cutoff, "plans": 0, "bundles": 0}
+    group_key = None
+    group: List[dict] = []
+
+    def flush():
+        if not group:
+            return
+        user_id, month = group_key
+        if not dry_run:
+            _write_bundle(user_id, month, group)
+            ids = [p["_id"] for p in group]
+            mealplans_col.delete_many({"_id": {"$in": ids}})
+            # Archived plans are no longer candidates for similar-plan reuse
+            plan_signatures_col.delete_many({"_id": {"$in": ids}})
+        stats["plans"] += len(group)
+        stats["bundles"] += 1
+
+    for plan in cursor:
+        key = (plan.get("user_id") or "", (plan.get("date") or "")[:7])
+        if key != group_key:
+            flush()
+            group_key, group = key, []
+        group.append(plan)
+    flush()
+    logger.info(f"Archived {stats['plans']} meal plan(s) into {stats['bundles']} bundle(s) (cutoff {cutoff}, dry_run={dry_run})")
+    return stats
+
+
+def _archived_plans(user_id: str, date_from: Optional[str], date_to: Optional[str]) -> Iterable[dict]:
+    query = {"user_id": user_id}
+    month_range = {}
+    if date_from:
+        month_range["$gte"] = date_from[:7]
+    if date_to:
+        month_range["$lte"] = date_to[:7]
+    if month_range:
+        query["month"] = month_range
+    for bundle in mealplan_archives_col.find(query, {"data": 1}).sort("month", DESCENDING):
+        for plan in _decompress(bundle.get("data")):
+            d = plan.get("date") or ""
+            if (date_from and d < date_from) or (date_to and d > date_to):
+                continue
+            yield plan
+
+
+# Plan metadata kept when only some recipe fields are requested
+_PLAN_META_FIELDS = ("_id", "user_id", "date", "created_at", "origin", "whatsapp_sent_at")
+
+
+def _sort_key(plan: dict) -> Tuple[str, str, str]:
+    # _id breaks ties between plans saved with the same date and created_at
+    # (an ObjectId's hex string sorts like the ObjectId itself)
+    return (plan.get("date") or "", plan.get("created_at") or "", str(plan.get("_id") or ""))
+
+
+def _cursor_id(value: str):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+def _history_projection(recipe_fields: Optional[Sequence[str]]) -> Optional[dict]:
+    if not recipe_fields:
+        return None
+    projection = {f: 1 for f in _PLAN_META_FIELDS}
+    projection["recipe_refs"] = 1
+    # Legacy plans embed recipes; only fetch the requested sub-fields
+    projection.update({f"{meal}.{f}": 1 for meal in MEAL_KEYS for f in recipe_fields})
+    return projection
+
+
+def _trim_recipes(plan: dict, recipe_fields: Optional[Sequence[str]]) -> dict:
+    if recipe_fields:
+        for meal in MEAL_KEYS:
+            if isinstance(plan.get(meal), dict):
+                plan[meal] = {f: plan[meal][f] for f in recipe_fields if f in plan[meal]}
+    return plan
+
+
+def load_plan_history(user_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      limit: Optional[int] = None, before: Optional[Tuple[str, str, str]] = None,
+                      recipe_fields: Optional[Sequence[str]] = None) -> List[dict]:
+    """Plans for user_id within [date_from, date_to] (YYYY-MM-DD, inclusive), newest first,
+    read from the hot collection and, for dates past the archive cutoff, from cold bundles.
+
+    before: keyset cursor; only plans sorting strictly before this (date, created_at, _id)
+    triple, where _id is the plan id as a string.
+    recipe_fields: keep only these keys of each meal's recipe (e.g. ["recipe_name"]).
+    """
+    query = {"user_id": user_id}
+    date_range = {}
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lte"] = date_to
+    if date_range:
+        query["date"] = date_range
+    if before:
+        before_date, before_created, before_id = before
+        query["$or"] = [
+            {"date": {"$lt": before_date}},
+            {"date": before_date, "created_at": {"$lt": before_created}},
+            {"date": before_date, "created_at": before_created, "_id": {"$lt": _cursor_id(before_id)}},
+        ]
+    cursor = mealplans_col.find(query, _history_projection(recipe_fields)).sort(
+        [("date", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+    if limit:
+        cursor = cursor.limit(limit)
+    plans = list(cursor)
+    seen = {str(p.get("_id")) for p in plans}
+
+    # Only consult cold storage when the range reaches past the cutoff
+    need_cold = (limit is None or len(plans) < limit) and (not date_from or date_from < archive_cutoff())
+    if need_cold:
+        cold_to = min(filter(None, [date_to, before[0] if before else None]), default=None)
+        for plan in _archived_plans(user_id, date_from, cold_to):
+            if str(plan.get("_id")) in seen or (before and _sort_key(plan) >= tuple(before)):
+                continue
+            plan["archived"] = True
+            plans.append(plan)
+        plans.sort(key=_sort_key, reverse=True)
+        if limit:
+            plans = plans[:limit]
+    return [_trim_recipes(p, recipe_fields) for p in hydrate_plans(plans)]
@@ -1,5 +1,24 @@
+"""
+Beginner mode: replace recipe steps with granular, template-driven flows.
+
+Templates are data (see TemplateCatalog); matching a recipe is one dict lookup
+per ingredient, and rendered step lists are memoized, so the cost per plan does
+not grow with the catalog.
+
+A recipe's steps are only replaced when a single template covers every one of
+its ingredients (pantry staples aside). Recipes that span several templates,
+use an ingredient no template knows, or come from the local recipe corpus
+keep their own steps.
+"""
+import json
 import os
-from typing import Dict, List
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.config import BEGINNER_STEPS_CACHE_SIZE, BEGINNER_TEMPLATES_PATH
+from app.services.ingredient_canon import PANTRY_STAPLES, canonical_name
+from app.services.recipe_corpus import CORPUS_SOURCE
 
 BEGINNER_MODE = os.getenv("BEGINNER_MODE", "true").lower() == "true"
 
@@ -9,15 +28,6 @@ TOOLS_LINE = (
 )
 
 
-def _find_ing(ingredients: List[Dict], names: List[str]):
-    names_l = {n.lower() for n in names}
-    for ing in ingredients or []:
-        name = (ing.get("name") or "").lower().strip()
-        if name in names_l:
-            return ing
-    return None
-
-
 def _format_qty(ing: Dict, default_qty: str = "") -> str:
     if not ing:
         return default_qty
@@ -37,80 +47,7 @@ def _format_qty(ing: Dict, default_qty: str = "") -> str:
     return f"{q_str} {u}".strip()
 
 
-def _build_dal_steps(ingredients: List[Dict]) -> List[str]:
-    dal = _find_ing(ingredients, ["chana dal", "dal", "lentils"])
-    if not dal:
-        return []
-    dal_qty = _format_qty(dal, "200 g")
-    steps = [
-        TOOLS_LINE,
-        f"Measure {dal_qty} chana dal using a measuring cup.",
-        "Pick out any stones or debris.",
-        "Rinse dal in a sieve under running water for 60 seconds.",
-        "Optional: soak dal in 3 cups water for 30–60 minutes; drain.",
-        "Add dal to a pot with 3 cups fresh water.",
-        "Set heat to high; bring to a steady boil (5–7 minutes). Skim foam.",
-        "Reduce heat to low–medium; partially cover with lid.",
-        "Simmer 25–35 minutes; stir every 5–7 minutes.",
-        "Add ½ teaspoon salt and ¼ teaspoon turmeric (optional). Stir.",
-        "Check doneness: press a dal grain; it should be soft, not chalky.",
-        "If firm, add ½ cup water and cook 5–10 minutes more.",
-        "Adjust consistency with 2–3 tablespoons hot water; taste and season.",
-    ]
-    return steps
-
-
-def _build_bread_steps(ingredients: List[Dict]) -> List[str]:
-    bread = _find_ing(ingredients, ["bread", "bread slices"])
-    if not bread:
-        return []
-    slices = _format_qty(bread, "4 slices")
-    return [
-        "Preheat a pan to medium or use a toaster.",
-        f"Toast {slices} until golden (1–2 minutes per side).",
-        "Optional: add a teaspoon butter or oil for flavor.",
-        "Rest toast 30 seconds; cut into triangles with a knife.",
-    ]
-
-
-def _build_apple_steps(ingredients: List[Dict]) -> List[str]:
-    apples = _find_ing(ingredients, ["apple", "apples"])
-    if not apples:
-        return []
-    qty = _format_qty(apples, "2 pieces")
-    return [
-        f"Wash {qty} apples under running water.",
-        "Core apples with a knife; discard seeds.",
-        "Slice into thin wedges on a cutting board.",
-        "Optional: drizzle a few drops of lemon juice to prevent browning.",
-    ]
-
-
-def _build_banana_steps(ingredients: List[Dict]) -> List[str]:
-    bananas = _find_ing(ingredients, ["banana", "bananas"])
-    if not bananas:
-        return []
-    qty = _format_qty(bananas, "2 pieces")
-    return [
-        f"Peel {qty} bananas.",
-        "Slice into bite-size rounds; set aside in a bowl.",
-    ]
-
-
-def _build_cornflakes_steps(ingredients: List[Dict]) -> List[str]:
-    cornflakes = _find_ing(ingredients, ["cornflakes"])
-    if not cornflakes:
-        return []
-    qty = _format_qty(cornflakes, "200 g")
-    return [
-        "Place a clean serving bowl on the counter.",
-        f"Add {qty} cornflakes to the bowl.",
-        "Top with prepared fruit (apple wedges, banana slices).",
-        "Optional: drizzle 1 teaspoon honey; serve immediately.",
-    ]
-
-
-def _pad_to_range(steps: List[str], min_len: int = 12, max_len: int = 16) -> List[str]:
+def _pad_to_range(steps: List[str], min_len: int = 12, max_len: Optional[int] = 16) -> List[str]:
     extras = [
         "Taste and adjust salt and pepper.",
         "Garnish with chopped herbs if available.",
@@ -119,45 +56,106 @@ def _pad_to_range(steps: List[str], min_len: int = 12, max_len: int = 16) -> Lis
     ]
     i = 0
     while len(steps) < min_len and i < len(extras):
-        steps.append(extras[i])
+        if extras[i] not in steps:
+            steps.append(extras[i])
         i += 1
     # Cap
-    return steps[:max_len]
+    return steps if max_len is None else steps[:max_len]
+
+
+class TemplateCatalog:
+    """Beginner step templates keyed by canonical ingredient name.
+
+    Loaded from a JSON file (BEGINNER_TEMPLATES_PATH, default app/data/beginner_templates.json):
+
+        {"version": 1, "templates": [{"id", "priority", "ingredients": ["chana dal", ...],
+                                       "tools"?: true, "default_quantity": "200 g",
+                                       "steps": ["Measure {quantity} {name} ...", ...]}]}
+
+    render() joins the flows of the given templates in priority order (main
+    cooking first, then sides, fruit and assembly), with the tools line once;
+    the first matching ingredient fills {name} and {quantity}.
+    """
+
+    def __init__(self, templates: List[Dict], version=""):
+        self.version = str(version)
+        # Stable sort: equal priorities keep their file order
+        self.templates = sorted(templates, key=lambda t: t.get("priority", 100))
+        self._by_name: Dict[str, int] = {}
+        for idx, template in enumerate(self.templates):
+            for name in template.get("ingredients") or []:
+                self._by_name.setdefault(canonical_name(name), idx)
+
+    @classmethod
+    def from_file(cls, path: str) -> "TemplateCatalog":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("templates") or [], data.get("version", ""))
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def picks(self, ingredients: List[Dict]) -> Tuple[Tuple[int, str, str], ...]:
+        """(template index, canonical name, formatted quantity) per matched template, in order."""
+        chosen: Dict[int, Tuple[str, str]] = {}
+        for ing in ingredients or []:
+            name = canonical_name(ing.get("name"))
+            idx = self._by_name.get(name)
+            if idx is not None and idx not in chosen:
+                chosen[idx] = (name, _format_qty(ing, self.templates[idx].get("default_quantity", "")))
+        return tuple((idx, *chosen[idx]) for idx in sorted(chosen))
+
+    def covers(self, ingredients: List[Dict]) -> bool:
+        """Whether every non-staple ingredient maps to some template."""
+        for ing in ingredients or []:
+            name = canonical_name(ing.get("name"))
+            if name and name not in PANTRY_STAPLES and name not in self._by_name:
+                return False
+        return True
+
+    def render(self, picks: Tuple[Tuple[int, str, str], ...]) -> List[str]:
+        steps: List[str] = []
+        if any(self.templates[idx].get("tools") for idx, _, _ in picks):
+            steps.append(TOOLS_LINE)
+        for idx, name, quantity in picks:
+            template = self.templates[idx]
+            steps.extend(step.format(name=name, quantity=quantity) for step in template.get("steps") or [])
+        return _pad_to_range(steps)
+
+
+_catalog: Optional[TemplateCatalog] = None
+_lock = threading.Lock()
+
+
+def get_catalog() -> TemplateCatalog:
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                path = BEGINNER_TEMPLATES_PATH or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "beginner_templates.json")
+                _catalog = TemplateCatalog.from_file(path)
+    return _catalog
+
+
+@lru_cache(maxsize=BEGINNER_STEPS_CACHE_SIZE)
+def _rendered_steps(version: str, picks: Tuple[Tuple[int, str, str], ...]) -> Tuple[str, ...]:
+    # Keyed on the catalog version and the matched ingredients with their quantities
+    return tuple(get_catalog().render(picks))
 
 
 def _build_beginner_steps(recipe: Dict) -> List[str]:
-    ing = recipe.get("ingredients_used") or []
-    steps: List[str] = []
-
-    # Prioritize main-cook flows first (dal), then sides and assembly
-    dal_steps = _build_dal_steps(ing)
-    if dal_steps:
-        steps.extend(dal_steps)
-
-    bread_steps = _build_bread_steps(ing)
-    if bread_steps:
-        steps.extend(bread_steps)
-
-    apple_steps = _build_apple_steps(ing)
-    if apple_steps:
-        steps.extend(apple_steps)
-
-    banana_steps = _build_banana_steps(ing)
-    if banana_steps:
-        steps.extend(banana_steps)
-
-    cornflakes_steps = _build_cornflakes_steps(ing)
-    if cornflakes_steps:
-        steps.extend(cornflakes_steps)
-
-    if not steps:
-        # If nothing matched, keep original but prepend tools and basic clarifications
-        original = recipe.get("steps") or []
-        steps = [TOOLS_LINE]
-        steps.extend(original)
-
-    steps = _pad_to_range(steps)
-    return steps
+    if recipe.get("source") == CORPUS_SOURCE:
+        return list(recipe.get("steps") or [])
+    catalog = get_catalog()
+    ingredients = recipe.get("ingredients_used") or []
+    picks = catalog.picks(ingredients)
+    if len(picks) == 1 and catalog.covers(ingredients):
+        return list(_rendered_steps(catalog.version, picks))
+    # Otherwise keep the recipe's own steps (all of them) with the tools line and
+    # basic clarifications; a template flow would drop the other ingredients
+    steps = [TOOLS_LINE]
+    steps.extend(step for step in recipe.get("steps") or [] if step != TOOLS_LINE)
+    return _pad_to_range(steps, max_len=None)
 
 
 def apply_beginner_mode(plan: Dict) -> Dict:
@@ -5,6 +5,10 @@ from urllib.parse import quote_plus
 from dotenv import load_dotenv
 from app.services.ai_service import generate_meal_plan as openai_generate_meal_plan
 from app.services.beginner_mode import apply_beginner_mode, BEGINNER_MODE
+from app.services.ingredient_canon import canonical_name
+from app.services.recipe_corpus import corpus_meal_plan
+from app.services.step_sanitizer import looks_generic
+from app.services.provider_quota import QuotaExhausted, estimate_tokens, gemini_budget, parse_retry_after
 
 # Load environment to pick up latest .env values without full server restart
 load_dotenv()
@@ -16,6 +20,8 @@ DEFAULT_ENDPOINT_VERSION = os.getenv("GEMINI_API_VERSION", "v1beta")
 GEMINI_TEMPERATURE = float(os.getenv("GEMINI_TEMPERATURE", "0.9"))
 GEMINI_TOP_P = float(os.getenv("GEMINI_TOP_P", "0.95"))
 GEMINI_TOP_K = int(os.getenv("GEMINI_TOP_K", "40"))
+# Output cap assumed when reserving token quota for a Gemini request
+GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "2048"))
 
 def parse_voice_intent(text: str):
     """
@@ -69,10 +75,10 @@ def _basic_meal_plan(ingredients: list):
         }
 
     def _title_from(used_names: set, meal_label: str) -> str:
-        has_rice = any(n in used_names for n in ["rice"])
-        has_chicken = any(n in used_names for n in ["chicken"])
-        has_eggs = any(n in used_names for n in ["egg", "eggs"])
-        has_tomato = any(n in used_names for n in ["tomato", "tomatoes"])
+        has_rice = "rice" in used_names
+        has_chicken = "chicken" in used_names
+        has_eggs = "egg" in used_names
+        has_tomato = "tomato" in used_names
         if has_chicken and has_rice:
             return f"Hearty Chicken & Rice {meal_label.capitalize()} Bowl"
         if has_eggs and has_tomato:
@@ -81,29 +87,30 @@ def _basic_meal_plan(ingredients: list):
 
     def _prep_step(ing: dict) -> str:
         name = (ing.get("name") or "").lower().strip()
+        key = canonical_name(name)
         qty = ing.get("quantity") or ""
         unit = ing.get("unit") or ""
         q = f"{qty} {unit}".strip()
-        if name in ["rice"]:
+        if key == "rice":
             return f"Rinse {q} rice in a strainer for 60 seconds, then set aside."
-        if name in ["chicken"]:
+        if key == "chicken":
             return f"Cut {q} chicken into bite-sized pieces on a cutting board."
-        if name in ["egg", "eggs"]:
+        if key == "egg":
             return f"Crack {qty} egg(s) into a bowl and whisk vigorously for 30 seconds."
-        if name in ["tomato", "tomatoes"]:
+        if key == "tomato":
             return f"Wash {q} tomatoes and dice into 1 cm pieces using a knife."
-        if name in ["chilli", "chili", "chilies", "chiles"]:
+        if key == "green chili":
             return f"Slice {q} chili thinly; remove seeds if sensitive to heat."
         return f"Wash and chop {q} {name} on a cutting board."
 
     def _meal(meal_label: str):
         used_raw = ingredients[:min(6, len(ingredients))]
         used = [_sanitize(x) for x in used_raw]
-        names_lower = { (u.get("name") or "").lower().strip() for u in used }
-        has_rice = "rice" in names_lower
-        has_chicken = "chicken" in names_lower
-        has_eggs = "eggs" in names_lower or "egg" in names_lower
-        has_tomato = "tomato" in names_lower or "tomatoes" in names_lower
+        names = {canonical_name(u.get("name")) for u in used}
+        has_rice = "rice" in names
+        has_chicken = "chicken" in names
+        has_eggs = "egg" in names
+        has_tomato = "tomato" in names
 
         steps = []
         # 1. Gather utensils
@@ -129,7 +136,7 @@ def _basic_meal_plan(ingredients: list):
             combine_bits.append("eggs")
         if has_tomato:
             combine_bits.append("diced tomatoes")
-        if "chilli" in names_lower or "chili" in names_lower:
+        if "green chili" in names:
             combine_bits.append("sliced chili")
         if combine_bits:
             steps.append(f"In a large bowl, combine {' ,'.join(combine_bits)}. Toss gently with a spatula.")
@@ -140,7 +147,7 @@ def _basic_meal_plan(ingredients: list):
         while len(steps) < 10:
             steps.append("Clean workspace and organize leftovers in airtight containers for later use.")
 
-        title = _title_from(names_lower, meal_label)
+        title = _title_from(names, meal_label)
         yt_query = quote_plus(f"{title} easy recipe")
         return {
             "recipe_name": title,
@@ -158,59 +165,42 @@ def _basic_meal_plan(ingredients: list):
         "dinner": _meal("dinner")
     }
 
+def _local_meal_plan(ingredients: list):
+    """Network-free plan: the local recipe corpus when the pantry covers every meal, else the basic generator."""
+    return corpus_meal_plan(ingredients) or _ensure_step_quality(_basic_meal_plan(ingredients), ingredients)
+
 def _post_gemini(payload, model: str):
+    """POST generateContent, trying API versions in turn. Each attempt reserves
+    quota from gemini_budget and a 404 (version not served) gives it back;
+    QuotaExhausted (including a provider 429) is raised as-is so callers stop
+    trying other models against the same quota."""
     versions = [DEFAULT_ENDPOINT_VERSION, "v1beta2", "v1"]
+    estimate = estimate_tokens(json.dumps(payload), GEMINI_MAX_OUTPUT_TOKENS)
     last_error = None
     for ver in versions:
         endpoint = f"https://generativelanguage.googleapis.com/{ver}/models/{model}:generateContent"
+        reservation = gemini_budget.acquire(estimate)
         try:
             resp = requests.post(endpoint, params={"key": GEMINI_API_KEY}, json=payload, timeout=30)
+            if resp.status_code == 429:
+                gemini_budget.throttled(parse_retry_after(resp.headers.get("Retry-After")))
+                raise QuotaExhausted(f"Gemini returned 429 for {model}")
             if resp.status_code == 404:
+                gemini_budget.release(reservation)
                 last_error = Exception(f"404 Not Found for {endpoint}")
                 continue
             resp.raise_for_status()
-            return resp.json()
+            data = resp.json()
+            gemini_budget.settle(reservation, (data.get("usageMetadata") or {}).get("totalTokenCount"))
+            return data
+        except QuotaExhausted:
+            raise
         except Exception as e:
             last_error = e
             continue
     if last_error:
         raise last_error
 
-ACTION_VERBS = {
-    "peel","wash","rinse","cut","chop","dice","slice","boil","simmer","sauté","saute",
-    "mix","whisk","scramble","heat","preheat","drain","strain","season","serve","garnish",
-    "toast","stir","fold","marinate","pour","press","cover","rest","reduce","sear"
-}
-
-def _step_has_action_verb(s: str) -> bool:
-    try:
-        first = (s or "").strip().lower().split()[0].strip(".,:;()[]{}")
-        return first in ACTION_VERBS
-    except Exception:
-        return False
-
-def _mentions_unit_or_time(s: str) -> bool:
-    t = (s or "").lower()
-    units = ["kg","g","cup","cups","tablespoon","tbsp","teaspoon","tsp","ml","l"]
-    times = ["minute","minutes","mins","second","seconds","sec"]
-    return any(u in t for u in units) or any(tm in t for tm in times)
-
-def _mentions_utensil(s: str) -> bool:
-    t = (s or "").lower()
-    return any(u in t for u in ["bowl","knife","pot","pan","spatula","strainer","oven","tray","skillet","cutting board"]) 
-
-def _looks_generic(steps: list) -> bool:
-    if not steps or len(steps) < 8:
-        return True
-    generic = 0
-    signal = 0
-    for s in steps:
-        if not _step_has_action_verb(s):
-            generic += 1
-        if _mentions_unit_or_time(s) or _mentions_utensil(s):
-            signal += 1
-    return generic > len(steps) // 3 or signal < len(steps) // 3
-
 def _refine_steps_with_gemini(plan: dict) -> dict:
     try:
         original_json = json.dumps(plan, ensure_ascii=False)
@@ -251,22 +241,17 @@ def _refine_steps_with_gemini(plan: dict) -> dict:
 
 def _ensure_step_quality(plan: dict, ingredients: list) -> dict:
     try:
-        needs_refine = False
-        for key in ["breakfast","lunch","dinner"]:
-            if key in plan and isinstance(plan[key], dict):
-                steps = plan[key].get("steps") or []
-                if _looks_generic(steps):
-                    needs_refine = True
-        if needs_refine and GEMINI_API_KEY:
+        keys = [key for key in ["breakfast","lunch","dinner"] if key in plan and isinstance(plan[key], dict)]
+        generic = {key: looks_generic(plan[key].get("steps") or []) for key in keys}
+        if any(generic.values()) and GEMINI_API_KEY:
+            before = {key: plan[key].get("steps") for key in keys}
             plan = _refine_steps_with_gemini(plan)
+            # Only recipes whose steps were replaced need checking again
+            for key in keys:
+                if plan[key].get("steps") is not before[key]:
+                    generic[key] = looks_generic(plan[key].get("steps") or [])
         # Final guard: if still generic, borrow detailed steps from local basic generator
-        final_needs = False
-        for key in ["breakfast","lunch","dinner"]:
-            if key in plan and isinstance(plan[key], dict):
-                steps = plan[key].get("steps") or []
-                if _looks_generic(steps):
-                    final_needs = True
-        if final_needs:
+        if any(generic.values()):
             local = _basic_meal_plan(ingredients)
             for key in ["breakfast","lunch","dinner"]:
                 if key in plan and key in local:
@@ -275,11 +260,13 @@ def _ensure_step_quality(plan: dict, ingredients: list) -> dict:
     except Exception:
         return plan
 
-def generate_meal_plan(ingredients: list):
+def generate_meal_plan(ingredients: list, fallback: bool = True):
     """
     Generate a structured meal plan using Gemini.
     ingredients: list of dicts [{"name": "", "quantity": 0, "unit": ""}, ...]
     Returns a dict with breakfast, lunch, dinner
+    With fallback=False a Gemini failure is raised instead of falling back to
+    OpenAI or the local plan (OpenAI is still used when Gemini is not configured).
     """
     ingredient_list = "\n".join([f"{i['name']}: {i['quantity']} {i['unit']}" for i in ingredients])
 
@@ -342,11 +329,14 @@ def generate_meal_plan(ingredients: list):
 
     if not GEMINI_API_KEY:
         print("Gemini not configured. Falling back to dynamic OpenAI generation.")
+        if not fallback:
+            result = openai_generate_meal_plan(ingredients, fallback=False)
+            return apply_beginner_mode(result) if BEGINNER_MODE else result
         try:
             result = openai_generate_meal_plan(ingredients)
             return apply_beginner_mode(result) if BEGINNER_MODE else result
         except Exception:
-            result = _ensure_step_quality(_basic_meal_plan(ingredients), ingredients)
+            result = _local_meal_plan(ingredients)
             return apply_beginner_mode(result) if BEGINNER_MODE else result
 
     try:
@@ -370,6 +360,10 @@ def generate_meal_plan(ingredients: list):
                 data = _post_gemini(payload, m)
                 if data:
                     break
+            except QuotaExhausted as e:
+                print("Gemini quota unavailable:", e)
+                data = None
+                break
             except Exception as e:
                 # try next model/version
                 data = None
@@ -394,12 +388,14 @@ def generate_meal_plan(ingredients: list):
             plan_text = None
 
         if not plan_text:
+            if not fallback:
+                raise Exception("Gemini response had no text")
             print("Gemini response had no text. Falling back to dynamic OpenAI generation.")
             try:
                 result = openai_generate_meal_plan(ingredients)
                 return apply_beginner_mode(result) if BEGINNER_MODE else result
             except Exception:
-                result = _ensure_step_quality(_basic_meal_plan(ingredients), ingredients)
+                result = _local_meal_plan(ingredients)
                 return apply_beginner_mode(result) if BEGINNER_MODE else result
 
         plan_text_stripped = plan_text.strip()
@@ -415,10 +411,12 @@ def generate_meal_plan(ingredients: list):
             plan_json = apply_beginner_mode(plan_json)
         return plan_json
     except Exception as e:
+        if not fallback:
+            raise
         print("Gemini generation error:", e)
         try:
             result = openai_generate_meal_plan(ingredients)
             return apply_beginner_mode(result) if BEGINNER_MODE else result
         except Exception:
-            result = _ensure_step_quality(_basic_meal_plan(ingredients), ingredients)
+            result = _local_meal_plan(ingredients)
             return apply_beginner_mode(result) if BEGINNER_MODE else result
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Canonical ingredient names and units.
+
+One table-driven canonicalizer shared by ingredient writes, plan generators,
+fingerprints and indexes, so "Eggs", "egg" and "  EGGS " are the same key
+everywhere. Stored pantry items keep the name the user typed and carry the key
+in a separate `name_key` field:
+
+- canonical_name(): lowercase, collapse whitespace, map synonyms (curd ->
+  yogurt, aloo -> potato, ...) and singularize the last word (tomatoes ->
+  tomato) unless it is a mass noun (oats, peas).
+- canonical_unit(): spelling variants to one unit plus a count factor
+  (grams -> g, dozen -> 12 x pcs).
+- pantry_set(): canonical name -> in-stock pantry item, shared by plan
+  similarity and the local recipe corpus (PANTRY_STAPLES are ignored by both).
+- base_quantity(): quantity in the base unit of its dimension (g, ml, pcs)
+  for comparisons across kg/g or l/ml.
+
+All lookups are dict hits; canonical_name() is memoized.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Alias -> canonical name (keys are already lowercased/singularized where it matters)
+_SYNONYMS: Dict[str, str] = {
+    "eggs": "egg", "anda": "egg",
+    "curd": "yogurt", "dahi": "yogurt", "yoghurt": "yogurt",
+    "aloo": "potato", "batata": "potato",
+    "pyaz": "onion", "kanda": "onion",
+    "tamatar": "tomato",
+    "atta": "wheat flour", "whole wheat flour": "wheat flour",
+    "suji": "semolina", "sooji": "semolina", "rava": "semolina",
+    "gram flour": "besan", "chickpea flour": "besan",
+    "chickpea": "chickpeas", "kabuli chana": "chickpeas", "chole": "chickpeas", "garbanzo bean": "chickpeas",
+    "bell pepper": "capsicum", "shimla mirch": "capsicum",
+    "chilli": "green chili", "chili": "green chili", "chile": "green chili", "green chilli": "green chili",
+    "hari mirch": "green chili",
+    "palak": "spinach",
+    "matar": "peas", "green peas": "peas", "pea": "peas",
+    "gajar": "carrot",
+    "lasun": "garlic", "lehsun": "garlic",
+    "adrak": "ginger",
+    "chawal": "rice", "basmati rice": "rice", "basmati": "rice",
+    "doodh": "milk",
+    "paneer cheese": "paneer", "cottage cheese": "paneer",
+    "bread slice": "bread", "slice of bread": "bread",
+    "flattened rice": "poha", "beaten rice": "poha",
+    "oat": "oats", "rolled oats": "oats",
+    "cornflake": "cornflakes", "corn flakes": "cornflakes",
+    "biscuit": "biscuits", "cookie": "biscuits",
+    "lentil": "lentils", "dal": "lentils",
+    "chana daal": "chana dal", "toor daal": "toor dal", "arhar dal": "toor dal",
+    "moong daal": "moong dal", "masoor daal": "masoor dal",
+}
+
+# Words that stay as written (mass nouns or singular words ending in s)
+_INVARIANT = frozenset({
+    "oats", "peas", "cornflakes", "chickpeas", "lentils", "biscuits", "noodles", "greens", "sprouts",
+    "hummus", "couscous", "asparagus", "molasses", "grits", "swiss",
+})
+
+_IRREGULAR: Dict[str, str] = {
+    "leaves": "leaf", "loaves": "loaf", "knives": "knife", "halves": "half",
+    "potatoes": "potato", "tomatoes": "tomato", "mangoes": "mango", "chillies": "chilli",
+    "chilies": "chili", "chiles": "chile", "berries": "berry", "cherries": "cherry",
+}
+
+# Allowed without being in the pantry (see the generation prompts); ignored when
+# matching plans and corpus recipes against a pantry
+PANTRY_STAPLES = frozenset({
+    "salt", "pepper", "black pepper", "oil", "cooking oil", "vegetable oil", "olive oil", "water",
+    "sugar", "turmeric", "cumin", "chili powder", "red chili powder", "garam masala", "spice",
+})
+
+# Unit spelling -> (canonical unit, factor applied to the quantity)
+_UNITS: Dict[str, Tuple[str, float]] = {
+    "": ("", 1),
+    "g": ("g", 1), "gm": ("g", 1), "gms": ("g", 1), "gram": ("g", 1), "grams": ("g", 1), "gr": ("g", 1),
+    "kg": ("kg", 1), "kgs": ("kg", 1), "kilo": ("kg", 1), "kilos": ("kg", 1), "kilogram": ("kg", 1), "kilograms": ("kg", 1),
+    "mg": ("mg", 1),
+    "ml": ("ml", 1), "mls": ("ml", 1), "millilitre": ("ml", 1), "milliliter": ("ml", 1),
+    "millilitres": ("ml", 1), "milliliters": ("ml", 1),
+    "l": ("l", 1), "ltr": ("l", 1), "ltrs": ("l", 1), "litre": ("l", 1), "liter": ("l", 1),
+    "litres": ("l", 1), "liters": ("l", 1),
+    "pc": ("pcs", 1), "pcs": ("pcs", 1), "piece": ("pcs", 1), "pieces": ("pcs", 1),
+    "no": ("pcs", 1), "nos": ("pcs", 1), "unit": ("pcs", 1), "units": ("pcs", 1), "whole": ("pcs", 1),
+    "dozen": ("pcs", 12), "dozens": ("pcs", 12), "doz": ("pcs", 12),
+    "slice": ("slices", 1), "slices": ("slices", 1),
+    "tsp": ("tsp", 1), "teaspoon": ("tsp", 1), "teaspoons": ("tsp", 1),
+    "tbsp": ("tbsp", 1), "tablespoon": ("tbsp", 1), "tablespoons": ("tbsp", 1),
+    "cup": ("cup", 1), "cups": ("cup", 1),
+    "clove": ("cloves", 1), "cloves": ("cloves", 1),
+    "packet": ("packets", 1), "packets": ("packets", 1), "pack": ("packets", 1), "packs": ("packets", 1),
+}
+
+# Canonical unit -> (base unit of its dimension, factor)
+_BASE_UNITS: Dict[str, Tuple[str, float]] = {
+    "mg": ("g", 0.001), "g": ("g", 1), "kg": ("g", 1000),
+    "ml": ("ml", 1), "l": ("ml", 1000), "tsp": ("ml", 5), "tbsp": ("ml", 15), "cup": ("ml", 240),
+    "pcs": ("pcs", 1), "": ("pcs", 1),
+}
+
+_SPACES = re.compile(r"\s+")
+
+
+def _singular(word: str) -> str:
+    if word in _INVARIANT:
+        return word
+    if word in _IRREGULAR:
+        return _IRREGULAR[word]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=8192)
+def canonical_name(name: str) -> str:
+    key = _SPACES.sub(" ", str(name or "").strip().lower())
+    if not key:
+        return ""
+    if key in _SYNONYMS:
+        return _SYNONYMS[key]
+    head, _, last = key.rpartition(" ")
+    singular = f"{head} {_singular(last)}" if head else _singular(last)
+    return _SYNONYMS.get(singular, singular)
+
+
+def canonical_unit(unit: Optional[str]) -> Tuple[str, float]:
+    key = _SPACES.sub(" ", str(unit or "").strip().lower()).rstrip(".")
+    return _UNITS.get(key, (key, 1))
+
+
+def _scaled(quantity, factor: float):
+    if factor == 1 or isinstance(quantity, bool) or not isinstance(quantity, (int, float)):
+        return quantity
+    return float(quantity) * factor
+
+
+def canonicalize_ingredient(item: dict) -> dict:
+    """Copy of a pantry item (or partial update) with `name_key` (the canonical name)
+    and a canonical unit; the name stays as typed, trimmed, and the quantity is scaled
+    with the unit (1 dozen -> 12 pcs). Absent keys stay absent."""
+    out = dict(item)
+    if "name" in item:
+        out["name"] = str(item["name"] or "").strip()
+        out["name_key"] = canonical_name(item["name"])
+    if "unit" in item:
+        out["unit"], factor = canonical_unit(item["unit"])
+        if "quantity" in item:
+            out["quantity"] = _scaled(item["quantity"], factor)
+    return out
+
+
+def name_aliases(name: str) -> List[str]:
+    """Stored spellings a lookup by name should match on rows saved before `name_key`
+    existed: as written, and canonical (rows whose name was rewritten on write)."""
+    raw = str(name or "").strip()
+    return sorted({raw, canonical_name(raw)} - {""})
+
+
+def normalize_recipe_ingredients(ingredients: Iterable[dict]) -> List[dict]:
+    """ingredients_used of a generated recipe: names kept as written, units canonical."""
+    normalized = []
+    for ing in ingredients or []:
+        unit, factor = canonical_unit(ing.get("unit")) if ing.get("unit") is not None else (None, 1)
+        normalized.append({
+            "name": str(ing.get("name", "")).strip() or "Unknown",
+            "quantity": _scaled(ing.get("quantity"), factor),
+            "unit": unit,
+        })
+    return normalized
+
+
+def _quantity_number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def pantry_set(items: Iterable[dict]) -> Dict[str, dict]:
+    """Canonical name -> pantry item, for items that are actually in stock."""
+    out = {}
+    for item in items or []:
+        key = canonical_name(item.get("name"))
+        quantity = item.get("quantity")
+        if key and (quantity is None or _quantity_number(quantity) is None or _quantity_number(quantity) > 0):
+            out[key] = item
+    return out
+
+
+def base_quantity(quantity, unit: Optional[str]) -> Tuple[Optional[float], str]:
+    """(quantity in g/ml/pcs, base unit); unknown units are their own base."""
+    canonical, factor = canonical_unit(unit)
+    base, base_factor = _BASE_UNITS.get(canonical, (canonical, 1))
+    try:
+        return float(quantity) * factor * base_factor, base
+    except (TypeError, ValueError):
+        return None, base
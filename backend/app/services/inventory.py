@@ -0,0 +1,293 @@
+"""
+Ingredient storage with two interchangeable layouts.
+
+documents  one `ingredients` document per item (original layout)
+inventory  one `inventories` document per user: {_id: user_id, items: [...], rev: n}
+dual       migration period: writes land in both layouts; reads prefer the
+           inventory document and fall back to per-item documents for users
+           that have not been materialized yet
+
+Select with INGREDIENT_LAYOUT. In the inventory layout a pantry read is a single
+point lookup by _id, and `rev` increases on every write so callers can use it
+as a cheap cache-invalidation key.
+
+Items keep the name the user typed; writes add `name_key`, the canonical name
+(app.services.ingredient_canon), and canonical units, so "Eggs, 1 dozen" is
+stored as {name: "Eggs", name_key: "egg", quantity: 12, unit: "pcs"}. Lookups
+by name match on name_key, and on the exact spelling for rows stored before it
+existed; canonicalize_user() (scripts/migrate_canonical_ingredients.py)
+backfills such rows.
+
+Embedded items keep every field of the written document except user_id (and
+the model's "id", which becomes _id), so both layouts store the same fields.
+created_at is a datetime in both layouts, as the Ingredient model sets it.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.config import INGREDIENT_LAYOUT
+from app.database import ingredients_col, inventories_col
+from app.services.ingredient_canon import canonical_name, canonicalize_ingredient, name_aliases
+
+# Document fields that are not stored on embedded items
+_NOT_ITEM_FIELDS = ("user_id", "id")
+_CAS_RETRIES = 5
+
+
+def _uses_documents() -> bool:
+    return INGREDIENT_LAYOUT in ("documents", "dual")
+
+
+def _uses_inventory() -> bool:
+    return INGREDIENT_LAYOUT in ("inventory", "dual")
+
+
+def _to_item(doc: Dict[str, Any]) -> Dict[str, Any]:
+    item = {k: v for k, v in doc.items() if k not in _NOT_ITEM_FIELDS}
+    item.setdefault("_id", doc.get("id") or ObjectId())
+    return item
+
+
+def _item_key(item: Dict[str, Any]) -> str:
+    return item.get("name_key") or canonical_name(item.get("name"))
+
+
+def _name_filter(user_id: str, name: str) -> Dict[str, Any]:
+    """Per-item documents for `name`: by name_key, or by spelling on rows written before it."""
+    return {"user_id": user_id, "$or": [
+        {"name_key": canonical_name(name)},
+        {"name_key": {"$exists": False}, "name": {"$in": name_aliases(name)}},
+    ]}
+
+
+def _item_updates(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in fields.items() if k not in _NOT_ITEM_FIELDS and k != "_id"}
+
+
+def _project(item: Dict[str, Any], user_id: str, projection: Optional[dict]) -> Dict[str, Any]:
+    """Apply a Mongo-style inclusion or exclusion projection to an embedded item."""
+    out = {**item, "user_id": user_id}
+    projection = projection or {}
+    if any(v for k, v in projection.items() if k != "_id"):
+        keep = {k for k, v in projection.items() if v} | ({"_id"} if projection.get("_id", 1) else set())
+        return {k: v for k, v in out.items() if k in keep}
+    for key, include in projection.items():
+        if not include:
+            out.pop(key, None)
+    return out
+
+
+def _materialize(user_id: str) -> Optional[dict]:
+    """Create the inventory document from per-item documents (dual layout)."""
+    items = [_to_item(d) for d in ingredients_col.find({"user_id": user_id})]
+    doc = {"_id": user_id, "items": items, "rev": 1, "updated_at": datetime.utcnow().isoformat()}
+    try:
+        inventories_col.insert_one(doc)
+    except DuplicateKeyError:
+        return inventories_col.find_one({"_id": user_id})
+    return doc
+
+
+def get_inventory(user_id: str) -> Optional[dict]:
+    return inventories_col.find_one({"_id": user_id})
+
+
+def get_revision(user_id: str) -> int:
+    """Current inventory revision (0 when the user has no inventory document)."""
+    doc = inventories_col.find_one({"_id": user_id}, {"rev": 1})
+    return int((doc or {}).get("rev") or 0)
+
+
+def list_ingredients(user_id: str, projection: Optional[dict] = None) -> List[Dict[str, Any]]:
+    if projection is None:
+        projection = {"_id": 0, "user_id": 0}
+    if _uses_inventory():
+        doc = get_inventory(user_id)
+        if doc is not None or INGREDIENT_LAYOUT == "inventory":
+            return [_project(item, user_id, projection) for item in (doc or {}).get("items", [])]
+    return list(ingredients_col.find({"user_id": user_id}, projection))
+
+
+def _mutate_inventory(user_id: str, mutate) -> Any:
+    """Apply mutate(items) -> result to the user's items with compare-and-swap on rev."""
+    for _ in range(_CAS_RETRIES):
+        doc = get_inventory(user_id)
+        if doc is None:
+            if INGREDIENT_LAYOUT == "dual":
+                # Per-item documents already hold this write; copying them materializes it
+                _materialize(user_id)
+                return None
+            items = []
+            result = mutate(items)
+            try:
+                inventories_col.insert_one({"_id": user_id, "items": items, "rev": 1, "updated_at": datetime.utcnow().isoformat()})
+                return result
+            except DuplicateKeyError:
+                continue
+        items = list(doc.get("items", []))
+        result = mutate(items)
+        res = inventories_col.update_one(
+            {"_id": user_id, "rev": doc.get("rev", 0)},
+            {"$set": {"items": items, "updated_at": datetime.utcnow().isoformat()}, "$inc": {"rev": 1}},
+        )
+        if res.matched_count:
+            return result
+    raise RuntimeError(f"Inventory update for {user_id} kept conflicting; try again")
+
+
+def insert_ingredient(user_id: str, doc: Dict[str, Any]) -> ObjectId:
+    doc = canonicalize_ingredient(doc)
+    inserted_id = None
+    if _uses_documents():
+        inserted_id = ingredients_col.insert_one({**doc, "user_id": user_id}).inserted_id
+    if _uses_inventory():
+        item = _to_item({**doc, "_id": inserted_id} if inserted_id else doc)
+        _mutate_inventory(user_id, lambda items: items.append(item))
+        inserted_id = inserted_id or item["_id"]
+    return inserted_id
+
+
+def update_ingredient(user_id: str, name: str, fields: Dict[str, Any]) -> int:
+    fields = canonicalize_ingredient(fields)
+    key = canonical_name(name)
+    matched = 0
+    if _uses_documents():
+        matched = ingredients_col.update_one(_name_filter(user_id, name), {"$set": fields}).matched_count
+    if _uses_inventory():
+        def mutate(items):
+            for item in items:
+                if _item_key(item) == key:
+                    item.update(_item_updates(fields))
+                    return 1
+            return 0
+        found = _mutate_inventory(user_id, mutate)
+        matched = matched or int(found or 0)
+    return matched
+
+
+def delete_ingredient(user_id: str, name: str) -> int:
+    key = canonical_name(name)
+    deleted = 0
+    if _uses_documents():
+        deleted = ingredients_col.delete_one(_name_filter(user_id, name)).deleted_count
+    if _uses_inventory():
+        def mutate(items):
+            for i, item in enumerate(items):
+                if _item_key(item) == key:
+                    del items[i]
+                    return 1
+            return 0
+        removed = _mutate_inventory(user_id, mutate)
+        deleted = deleted or int(removed or 0)
+    return deleted
+
+
+def bulk_upsert(user_id: str, items: List[Dict[str, Any]], ordered: bool = False) -> List[Dict[str, Any]]:
+    """Upsert items keyed by canonical name (name_key). Returns one {"name", "status", "error"?}
+    per item, in input order and under the name as given, where status is
+    created | updated | failed | skipped.
+
+    `ordered` applies to the per-item documents: after a failed write the rest are
+    skipped. The inventory layout replaces the user's document in one write, so all
+    items land or none do (a conflict raises) and `ordered` has no effect there."""
+    if not items:
+        return []
+    items = [canonicalize_ingredient(item) for item in items]
+    now = datetime.utcnow()
+    results = None
+    if _uses_documents():
+        results = _bulk_upsert_documents(user_id, items, ordered, now)
+    if _uses_inventory():
+        def mutate(current):
+            by_key = {_item_key(item): item for item in current}
+            outcome = []
+            for new in items:
+                existing = by_key.get(new["name_key"])
+                if existing is not None:
+                    existing.update(_item_updates(new))
+                    outcome.append({"name": new["name"], "status": "updated"})
+                else:
+                    item = _to_item({"created_at": now, **new})
+                    current.append(item)
+                    by_key[item["name_key"]] = item
+                    outcome.append({"name": new["name"], "status": "created"})
+            return outcome
+        inventory_results = _mutate_inventory(user_id, mutate)
+        results = results or inventory_results
+    return results or [{"name": item["name"], "status": "updated"} for item in items]
+
+
+def _bulk_upsert_documents(user_id: str, items: List[Dict[str, Any]], ordered: bool,
+                           now: datetime) -> List[Dict[str, Any]]:
+    ops = []
+    for item in items:
+        update = {"$set": {**item, "user_id": user_id}}
+        if "created_at" not in item:
+            update["$setOnInsert"] = {"created_at": now}
+        ops.append(UpdateOne(_name_filter(user_id, item["name"]), update, upsert=True))
+    results = [{"name": item["name"], "status": "updated"} for item in items]
+    try:
+        upserted = ingredients_col.bulk_write(ops, ordered=ordered).upserted_ids or {}
+    except BulkWriteError as e:
+        details = e.details or {}
+        upserted = {u["index"]: u["_id"] for u in details.get("upserted", [])}
+        failed = {w["index"]: w.get("errmsg", "write failed") for w in details.get("writeErrors", [])}
+        first_failure = min(failed) if failed else None
+        for i, result in enumerate(results):
+            if i in failed:
+                result.update(status="failed", error=failed[i])
+            elif ordered and first_failure is not None and i > first_failure:
+                result["status"] = "skipped"
+    for i in upserted:
+        results[i]["status"] = "created"
+    return results
+
+
+def migrate_user(user_id: str) -> int:
+    """Rebuild the user's inventory document from per-item documents; returns item count."""
+    items = [_to_item(d) for d in ingredients_col.find({"user_id": user_id})]
+    inventories_col.update_one(
+        {"_id": user_id},
+        {"$set": {"items": items, "updated_at": datetime.utcnow().isoformat()}, "$inc": {"rev": 1}},
+        upsert=True,
+    )
+    return len(items)
+
+
+def canonicalize_user(user_id: str, dry_run: bool = False) -> int:
+    """Backfill name_key and canonical units on the user's stored items, merging items
+    that share a key (the newest wins). Returns the number of items changed or removed."""
+    changed = 0
+    if _uses_documents():
+        kept: Dict[str, Dict[str, Any]] = {}
+        for doc in ingredients_col.find({"user_id": user_id}).sort([("_id", 1)]):
+            fixed = canonicalize_ingredient(doc)
+            previous = kept.get(fixed["name_key"])
+            if previous is not None:
+                changed += 1
+                if not dry_run:
+                    ingredients_col.delete_one({"_id": previous["_id"]})
+            kept[fixed["name_key"]] = fixed
+            if fixed != doc:
+                changed += 1
+                if not dry_run:
+                    ingredients_col.replace_one({"_id": doc["_id"]}, fixed)
+    if _uses_inventory() and get_inventory(user_id) is not None:
+        def mutate(items):
+            merged, count = {}, 0
+            for item in items:
+                fixed = canonicalize_ingredient(item)
+                count += fixed != item or fixed["name_key"] in merged
+                merged[fixed["name_key"]] = fixed
+            items[:] = list(merged.values())
+            return count
+        if dry_run:
+            count = mutate(list(get_inventory(user_id).get("items", [])))
+        else:
+            count = _mutate_inventory(user_id, mutate)
+        changed = changed or int(count or 0)
+    return changed
@@ -0,0 +1,73 @@
+"""
+In-process metrics registry.
+
+Counters and gauges keyed by name plus optional labels, safe to update from
+request handlers, threadpool workers and the scheduler. GET /metrics renders
+them in the Prometheus text format; snapshot() returns a plain dict.
+"""
+import threading
+from typing import Dict, Tuple
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_help: Dict[str, str] = {}
+
+
+def _key(name: str, labels: Dict[str, str]):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name: str, text: str) -> None:
+    _help[name] = text
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge_add(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + value
+
+
+def gauge_set(name: str, value: float, **labels) -> None:
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def get(name: str, **labels) -> float:
+    key = _key(name, labels)
+    with _lock:
+        return _counters.get(key, _gauges.get(key, 0))
+
+
+def snapshot() -> Dict[str, float]:
+    with _lock:
+        items = list(_counters.items()) + list(_gauges.items())
+    return {_format(name, labels): value for (name, labels), value in sorted(items)}
+
+
+def _format(name: str, labels) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def render_prometheus() -> str:
+    with _lock:
+        groups = [("counter", dict(_counters)), ("gauge", dict(_gauges))]
+    lines = []
+    for kind, values in groups:
+        seen = set()
+        for (name, labels), value in sorted(values.items()):
+            if name not in seen:
+                seen.add(name)
+                if name in _help:
+                    lines.append(f"# HELP {name} {_help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{_format(name, labels)} {value:g}")
+    return "\n".join(lines) + "\n"
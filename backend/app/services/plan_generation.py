@@ -0,0 +1,96 @@
+"""
+Shared entry point for meal plan generation.
+
+Routes and the scheduler call generate_plan() instead of the provider module
+directly so concurrent generations for the same user and ingredients (double
+clicks, a manual send racing the scheduler) share one LLM call, every
+LLM call passes through the global GenerationGate, and provider requests are
+scheduled by provider_quota under the caller's priority class.
+"""
+from typing import List, Optional
+
+from app.config import GEMINI_API_KEY, LOCAL_CORPUS_FIRST, PLAN_SIMILARITY_REUSE
+from app.services.beginner_mode import BEGINNER_MODE, apply_beginner_mode
+
+try:
+    from app.services.gemini_service import generate_meal_plan
+    from app.services.gemini_service import _local_meal_plan
+except ImportError:
+    from app.services.ai_service import generate_meal_plan
+    from app.services.ai_service import _fallback_plan as _local_meal_plan
+from app.services.plan_reuse import inventory_fingerprint
+from app.services.plan_similarity import find_similar_plan
+from app.services.recipe_corpus import corpus_meal_plan
+from app.services.provider_quota import BATCH, INTERACTIVE, gemini_budget, openai_budget, priority_class
+from app.services.rate_limit import check_rate_limit, generation_gate
+from app.services.singleflight import SingleFlight
+
+_flight = SingleFlight("plan_generation")
+
+
+def _beginner(plan: dict) -> dict:
+    """Beginner steps for local plans, as generate_meal_plan does for its own
+    (corpus recipes in them keep their steps)."""
+    return apply_beginner_mode(plan) if BEGINNER_MODE else plan
+
+
+def _gated_generate(items: List[dict], shed: bool, priority: str, fallback: bool) -> dict:
+    generation_gate.acquire(shed=shed)
+    try:
+        with priority_class(priority):
+            return generate_meal_plan(items, fallback=fallback)
+    finally:
+        generation_gate.release()
+
+
+def _flight_generate(user_id: str, items: List[dict], shed: bool, priority: str, rate_limit_scope: Optional[str],
+                     fallback: bool) -> dict:
+    # Only the flight leader is charged: coalesced callers share its generation
+    if rate_limit_scope:
+        check_rate_limit(user_id, rate_limit_scope)
+    return _gated_generate(items, shed, priority, fallback)
+
+
+def generate_plan(user_id: str, items: List[dict], shed: bool = True, priority: str = INTERACTIVE,
+                  rate_limit_scope: Optional[str] = None, fallback: bool = True) -> dict:
+    """generate_meal_plan(items), coalesced per (user_id, ingredient fingerprint, priority, shed, fallback).
+
+    Raises rate_limit.Overloaded when shed=True and no generation slot frees up
+    in time; the scheduler passes shed=False and waits instead. priority is the
+    provider_quota class used for the underlying LLM requests; callers only
+    share a flight with the same class and shedding, so an interactive request
+    never waits behind a batch one. With
+    PLAN_SIMILARITY_REUSE, a close enough stored plan (plan_similarity) is
+    adapted and returned without any LLM call; with LOCAL_CORPUS_FIRST, so is
+    a plan from the local recipe corpus (its curated steps are kept even in
+    beginner mode). When rate_limit_scope is given, the user's generation
+    bucket (rate_limit.check_rate_limit) is charged once per LLM flight, not
+    per caller and not for reused or corpus plans. With fallback=False a
+    provider failure is raised instead of being answered with a fallback
+    provider or the local plan, for callers that already hold a local plan.
+    """
+    if PLAN_SIMILARITY_REUSE:
+        similar = find_similar_plan(items)
+        if similar:
+            return similar
+    if LOCAL_CORPUS_FIRST:
+        corpus_plan = corpus_meal_plan(items)
+        if corpus_plan:
+            return corpus_plan
+    key = (user_id, inventory_fingerprint(items), priority, shed, fallback)
+    return _flight.do(key, lambda: _flight_generate(user_id, items, shed, priority, rate_limit_scope, fallback))
+
+
+def local_plan(items: List[dict]) -> dict:
+    """Ingredient-only plan built without any LLM call (local corpus, else the basic generator)."""
+    return _beginner(_local_meal_plan(items))
+
+
+# Reservation size used to probe for idle capacity before batch work
+_TYPICAL_PLAN_TOKENS = 3000
+
+
+def batch_capacity_available() -> bool:
+    """Whether the primary provider could take a batch generation right now."""
+    budget = gemini_budget if GEMINI_API_KEY else openai_budget
+    return budget.has_capacity(_TYPICAL_PLAN_TOKENS, BATCH)
@@ -0,0 +1,50 @@
+"""
+Reuse policy for today's meal plan.
+
+Every write path (save-now, WhatsApp send, agentic run, scheduler) looks up
+today's newest plan *before* generating and calls should_reuse(). Plans are
+stamped with inventory_fingerprint() at generation time so the "if_unchanged"
+policy can tell whether the pantry moved since.
+"""
+import hashlib
+import json
+from typing import Iterable, Optional
+
+from app.config import PLAN_REUSE_POLICY
+from app.services.ingredient_canon import base_quantity, canonical_name
+
+REUSE_ALWAYS = "always"
+REUSE_IF_UNCHANGED = "if_unchanged"
+REUSE_NEVER = "never"
+REUSE_POLICIES = (REUSE_ALWAYS, REUSE_IF_UNCHANGED, REUSE_NEVER)
+
+
+def inventory_fingerprint(items: Iterable[dict]) -> str:
+    """Order-independent hash of canonical (name, quantity, unit) for a list of ingredients,
+    so "Eggs, 1 dozen" and "egg, 12 pcs" fingerprint the same."""
+    rows = sorted(
+        (canonical_name(i.get("name")), *base_quantity(i.get("quantity") or 0, i.get("unit")))
+        for i in items or []
+    )
+    return hashlib.sha256(json.dumps(rows, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def should_reuse(existing: Optional[dict], items: Iterable[dict], policy: Optional[str] = None,
+                 for_delivery: bool = False) -> bool:
+    """Whether `existing` (today's newest plan, or None) should be returned instead of generating.
+
+    for_delivery: the plan is about to be sent over WhatsApp, so a provisional
+    placeholder (plan_upgrade) is never reused whatever the policy.
+    """
+    if not existing:
+        return False
+    if for_delivery and existing.get("provisional"):
+        return False
+    policy = policy or PLAN_REUSE_POLICY
+    if policy not in REUSE_POLICIES:
+        raise ValueError(f"Unknown plan reuse policy {policy!r}")
+    if policy == REUSE_NEVER:
+        return False
+    if policy == REUSE_IF_UNCHANGED:
+        return existing.get("inventory_fingerprint") == inventory_fingerprint(items)
+    return True
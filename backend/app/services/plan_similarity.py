@@ -0,0 +1,218 @@
+"""
+Approximate plan reuse across users via MinHash/LSH.
+
+Every stored plan is indexed by the canonical set of ingredient names its
+recipes use (pantry staples excluded): a MinHash signature of BANDS x ROWS
+hash functions, split into BANDS band keys, one `plan_signatures` document per
+plan. Plans whose sets share a band key with a pantry are the LSH candidates;
+exact Jaccard similarity is then computed on the stored sets.
+
+find_similar_plan(items) returns an adapted copy of the best candidate when
+  - Jaccard(pantry, plan ingredients) >= PLAN_SIMILARITY_THRESHOLD, and
+  - every ingredient the plan uses is in the pantry,
+with names taken from the pantry and quantities capped at what is available.
+Copies carry `similar_to` and are not indexed themselves.
+
+index_plan() is called as plans are saved; rebuild_index() recomputes the
+whole index offline (scripts/rebuild_plan_signatures.py). Hit rate is exported
+as plan_similarity_lookups_total{outcome} and plan_similarity_hit_ratio.
+"""
+import copy
+import hashlib
+import logging
+import random
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from pymongo import ReplaceOne
+
+from app.config import PLAN_SIMILARITY_BANDS, PLAN_SIMILARITY_ROWS, PLAN_SIMILARITY_THRESHOLD
+from app.database import mealplans_col, plan_signatures_col
+from app.services import metrics
+from app.services.ingredient_canon import PANTRY_STAPLES, canonical_name, pantry_set
+from app.services.recipe_store import MEAL_KEYS, hydrate_plan
+
+logger = logging.getLogger(__name__)
+
+MIN_INGREDIENTS = 2
+MAX_CANDIDATES = 50
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+                 for _ in range(PLAN_SIMILARITY_BANDS * PLAN_SIMILARITY_ROWS)]
+
+_stats_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0}
+
+metrics.describe("plan_similarity_lookups_total", "Similar-plan lookups, by outcome (hit or miss)")
+metrics.describe("plan_similarity_hit_ratio", "Share of similar-plan lookups served without the LLM")
+
+
+def plan_ingredient_set(plan: dict) -> Set[str]:
+    names = set()
+    for key in MEAL_KEYS:
+        recipe = plan.get(key)
+        if isinstance(recipe, dict):
+            for ing in recipe.get("ingredients_used") or []:
+                if isinstance(ing, dict):
+                    names.add(canonical_name(ing.get("name")))
+    names.discard("")
+    return names - PANTRY_STAPLES
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(tokens: Iterable[str]) -> List[int]:
+    hashes = [_token_hash(t) for t in tokens]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    rows = PLAN_SIMILARITY_ROWS
+    return [
+        f"{i}:{hashlib.blake2b(repr(signature[i * rows:(i + 1) * rows]).encode('ascii'), digest_size=8).hexdigest()}"
+        for i in range(PLAN_SIMILARITY_BANDS)
+    ]
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _signature_doc(plan_id, doc: dict) -> Optional[dict]:
+    if doc.get("provisional") or doc.get("similar_to"):
+        return None
+    names = plan_ingredient_set(doc)
+    if len(names) < MIN_INGREDIENTS:
+        return None
+    return {
+        "_id": plan_id,
+        "user_id": doc.get("user_id"),
+        "ingredients": sorted(names),
+        "bands": band_keys(minhash(names)),
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def index_plan(plan_id, doc: dict) -> None:
+    """Add (or refresh) one saved plan in the index. Never raises: saving a plan must not fail on it."""
+    try:
+        signature = _signature_doc(plan_id, hydrate_plan(dict(doc)))
+        if signature is not None:
+            plan_signatures_col.replace_one({"_id": plan_id}, signature, upsert=True)
+    except Exception as e:
+        logger.warning(f"Could not index plan {plan_id} for similarity reuse: {e}")
+
+
+def rebuild_index(batch_size: int = 500, dry_run: bool = False) -> int:
+    """Recompute every signature from meal_plans. Returns the number of plans indexed."""
+    if not dry_run:
+        plan_signatures_col.delete_many({})
+    indexed, ops = 0, []
+    for doc in mealplans_col.find({"provisional": {"$ne": True}, "similar_to": {"$exists": False}}):
+        signature = _signature_doc(doc["_id"], hydrate_plan(doc))
+        if signature is None:
+            continue
+        indexed += 1
+        ops.append(ReplaceOne({"_id": signature["_id"]}, signature, upsert=True))
+        if len(ops) >= batch_size:
+            if not dry_run:
+                plan_signatures_col.bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        plan_signatures_col.bulk_write(ops, ordered=False)
+    return indexed
+
+
+def _adapt(plan: dict, pantry: Dict[str, dict]) -> dict:
+    """Copy the meals, using the pantry's names and capping quantities at what is available."""
+    adapted = {}
+    for key in MEAL_KEYS:
+        recipe = copy.deepcopy(plan.get(key))
+        if not isinstance(recipe, dict):
+            continue
+        for ing in recipe.get("ingredients_used") or []:
+            item = pantry.get(canonical_name(ing.get("name"))) if isinstance(ing, dict) else None
+            if item is None:
+                continue
+            ing["name"] = item.get("name")
+            have, need = _number(item.get("quantity")), _number(ing.get("quantity"))
+            same_unit = str(item.get("unit") or "").strip().lower() == str(ing.get("unit") or "").strip().lower()
+            if have is not None and need is not None and same_unit and need > have:
+                ing["quantity"] = have
+        adapted[key] = recipe
+    return adapted
+
+
+def _record(hit: bool) -> None:
+    with _stats_lock:
+        _stats["lookups"] += 1
+        _stats["hits"] += int(hit)
+        ratio = _stats["hits"] / _stats["lookups"]
+    metrics.inc("plan_similarity_lookups_total", outcome="hit" if hit else "miss")
+    metrics.gauge_set("plan_similarity_hit_ratio", round(ratio, 4))
+
+
+def find_candidates(names: Set[str], exclude_user: Optional[str] = None) -> List[tuple]:
+    """(similarity, signature doc) for usable LSH candidates, best first.
+
+    The subset rule is part of the query, so every band hit that comes back is
+    usable; hits are ranked by shared bands (then similarity) before the
+    MAX_CANDIDATES cut, never truncated in storage order.
+    """
+    bands = band_keys(minhash(names))
+    query = {
+        "bands": {"$in": bands},
+        # Only plans whose every ingredient the user has
+        "ingredients": {"$not": {"$elemMatch": {"$nin": sorted(names)}}},
+    }
+    if exclude_user is not None:
+        query["user_id"] = {"$ne": exclude_user}
+    wanted = set(bands)
+    ranked = []
+    for sig in plan_signatures_col.find(query, {"ingredients": 1, "user_id": 1, "bands": 1}):
+        plan_names = set(sig.get("ingredients") or [])
+        if not plan_names or not plan_names <= names:
+            continue
+        similarity = jaccard(names, plan_names)
+        if similarity >= PLAN_SIMILARITY_THRESHOLD:
+            shared = len(wanted.intersection(sig.pop("bands", None) or []))
+            ranked.append((shared, similarity, sig))
+    ranked.sort(key=lambda entry: (entry[0], entry[1]), reverse=True)
+    top = [(similarity, sig) for _, similarity, sig in ranked[:MAX_CANDIDATES]]
+    top.sort(key=lambda pair: pair[0], reverse=True)
+    return top
+
+
+def find_similar_plan(items: List[dict]) -> Optional[dict]:
+    """An adapted copy of the most similar stored plan, or None (then generate as usual)."""
+    pantry = pantry_set(items)
+    names = set(pantry) - PANTRY_STAPLES
+    if len(names) < MIN_INGREDIENTS:
+        return None
+    try:
+        for similarity, sig in find_candidates(names):
+            source = hydrate_plan(mealplans_col.find_one({"_id": sig["_id"]}, {"_id": 0}))
+            if not source:
+                # Archived or deleted since it was indexed
+                plan_signatures_col.delete_one({"_id": sig["_id"]})
+                continue
+            adapted = _adapt(source, pantry)
+            if len(adapted) == len(MEAL_KEYS):
+                _record(True)
+                return {**adapted, "similar_to": str(sig["_id"]), "similarity": round(similarity, 3)}
+    except Exception as e:
+        logger.warning(f"Similar-plan lookup failed: {e}")
+    _record(False)
+    return None
@@ -0,0 +1,105 @@
+"""
+Stale-while-revalidate plan serving (POST /mealplan/save-now?mode=provisional).
+
+save_provisional() stores the best plan available without waiting on an LLM:
+the user's newest real plan for the same inventory fingerprint, else the local
+ingredient-only plan. The document is marked `provisional` and an LLM
+generation starts in the background. When it finishes, the same document is
+upgraded in place (provisional=False, updated_at bumped), so clients pick it
+up from GET /mealplan/today, whose ETag changes with the upgrade.
+
+The upgrade asks for an LLM plan only (generate_plan(fallback=False)): a
+fallback provider or local plan is no upgrade. If the generation fails or is
+shed, the provisional plan stays and is marked upgrade_status="failed". An upgrade task dies with its process, so
+fail_stale_upgrades() (at startup and from the scheduler) marks upgrades still
+"pending" after PLAN_UPGRADE_STALE_MINUTES as failed too. Delivery and
+pre-generation never treat a provisional plan as today's plan.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Set
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import PLAN_UPGRADE_STALE_MINUTES
+from app.data_access import mealplans, run_db
+from app.database import mealplans_col
+from app.services import metrics
+from app.services.plan_generation import generate_plan, local_plan
+from app.services.plan_reuse import inventory_fingerprint
+from app.services.plan_similarity import index_plan
+from app.services.recipe_store import MEAL_KEYS, dehydrate_plan
+
+logger = logging.getLogger(__name__)
+
+_tasks: Set[asyncio.Task] = set()
+
+metrics.describe("plan_provisional_total", "Provisional plans served, by source (cached or local)")
+metrics.describe("plan_upgrades_total", "Background upgrades of provisional plans, by outcome")
+
+
+async def save_provisional(user_id: str, date: str, items: List[dict], origin: str) -> ObjectId:
+    """Store a provisional plan for date right away and start its background upgrade."""
+    fingerprint = inventory_fingerprint(items)
+    cached = await mealplans.latest_for_fingerprint(user_id, fingerprint)
+    if cached and all(isinstance(cached.get(k), dict) for k in MEAL_KEYS):
+        meals, source = {k: cached[k] for k in MEAL_KEYS}, "cached"
+    else:
+        meals, source = await run_in_threadpool(local_plan, items), "local"
+    doc = {
+        "user_id": user_id,
+        "date": date,
+        "created_at": datetime.utcnow().isoformat(),
+        "origin": origin,
+        "inventory_fingerprint": fingerprint,
+        "provisional": True,
+        "provisional_source": source,
+        "upgrade_status": "pending",
+        **meals,
+    }
+    plan_id = await mealplans.insert(doc)
+    metrics.inc("plan_provisional_total", source=source)
+    task = asyncio.get_running_loop().create_task(_upgrade(plan_id, user_id, items))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return plan_id
+
+
+async def _upgrade(plan_id: ObjectId, user_id: str, items: List[dict]) -> None:
+    query = {"_id": plan_id, "provisional": True}
+    try:
+        plan = await run_in_threadpool(generate_plan, user_id, items, fallback=False)
+        if not isinstance(plan, dict) or not plan:
+            raise ValueError("empty plan")
+        fields = await run_db(dehydrate_plan, {k: plan[k] for k in (*MEAL_KEYS, "similar_to", "similarity") if k in plan})
+        await mealplans.update(query, {
+            **fields,
+            "provisional": False,
+            "upgrade_status": "upgraded",
+            "upgraded_at": datetime.utcnow().isoformat(),
+        })
+        await run_db(index_plan, plan_id, {"user_id": user_id, **plan})
+        metrics.inc("plan_upgrades_total", outcome="upgraded")
+    except Exception as e:
+        logger.warning(f"Upgrade of provisional plan {plan_id} failed: {e}")
+        metrics.inc("plan_upgrades_total", outcome="failed")
+        try:
+            await mealplans.update(query, {"upgrade_status": "failed"})
+        except Exception:
+            logger.exception(f"Could not mark plan {plan_id} as failed")
+
+
+def fail_stale_upgrades(stale_minutes: int = PLAN_UPGRADE_STALE_MINUTES) -> int:
+    """Mark provisional plans whose upgrade has been pending for stale_minutes as failed;
+    returns the count."""
+    cutoff = (datetime.utcnow() - timedelta(minutes=stale_minutes)).isoformat()
+    result = mealplans_col.update_many(
+        {"upgrade_status": "pending", "created_at": {"$lt": cutoff}},
+        {"$set": {"upgrade_status": "failed"}},
+    )
+    if result.modified_count:
+        logger.warning(f"Marked {result.modified_count} interrupted plan upgrade(s) as failed")
+        metrics.inc("plan_upgrades_total", result.modified_count, outcome="interrupted")
+    return result.modified_count
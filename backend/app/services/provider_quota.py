@@ -0,0 +1,184 @@
+"""
+Outbound quota scheduling for LLM providers (Gemini, OpenAI).
+
+Every provider request reserves capacity from a ProviderBudget first: a
+sliding one-minute window of requests and tokens checked against the
+configured RPM/TPM. Two priority classes share each budget:
+
+- interactive (default): preview, save-now, WhatsApp send, agentic runs.
+  Admitted whenever the full budget allows; waits at most
+  PROVIDER_INTERACTIVE_WAIT_SECONDS, then QuotaExhausted lets the caller
+  fall back as it would on a provider error.
+- batch: scheduler pre-generation (scheduler.job_pregenerate_mealplans).
+  Admitted only while no interactive call is waiting and usage is below
+  (1 - PROVIDER_BATCH_HEADROOM) of the budget, so it fills idle capacity and
+  leaves room for users to pre-empt it.
+
+A provider 429 pauses the budget for its Retry-After instead of letting the
+remaining fallbacks hammer the same quota. The class is taken from a context
+variable set with priority_class(); plan_generation sets it per call.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import (
+    GEMINI_RPM,
+    GEMINI_TPM,
+    OPENAI_RPM,
+    OPENAI_TPM,
+    PROVIDER_BATCH_HEADROOM,
+    PROVIDER_BATCH_WAIT_SECONDS,
+    PROVIDER_INTERACTIVE_WAIT_SECONDS,
+)
+from app.services import metrics
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+_WINDOW_SECONDS = 60.0
+_DEFAULT_PAUSE_SECONDS = 30.0
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("provider_priority", default=INTERACTIVE)
+
+metrics.describe("provider_requests_total", "Outbound LLM requests admitted by the quota scheduler")
+metrics.describe("provider_quota_waiting", "Outbound LLM requests waiting for quota")
+metrics.describe("provider_quota_timeouts_total", "Outbound LLM requests that gave up waiting for quota")
+metrics.describe("provider_throttled_total", "429 responses received from an LLM provider")
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+@contextmanager
+def priority_class(name: str):
+    """Run provider calls made inside the block (same thread) with the given priority."""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def estimate_tokens(prompt: str, max_output_tokens: int) -> int:
+    """Rough reservation size: ~4 characters per prompt token plus the output cap."""
+    return len(prompt) // 4 + max_output_tokens
+
+
+class ProviderBudget:
+    def __init__(self, name: str, rpm: int, tpm: int, batch_headroom: float = PROVIDER_BATCH_HEADROOM,
+                 clock=time.monotonic):
+        self.name = name
+        self.rpm = max(1, rpm)
+        self.tpm = max(1, tpm)
+        self.batch_share = min(1.0, max(0.0, 1.0 - batch_headroom))
+        self._clock = clock
+        self._window: deque = deque()  # [admitted_at, tokens] per request in the last minute
+        self._blocked_until = 0.0
+        self._waiting = {INTERACTIVE: 0, BATCH: 0}
+        self._cond = threading.Condition()
+
+    def _prune(self, now: float) -> None:
+        while self._window and self._window[0][0] <= now - _WINDOW_SECONDS:
+            self._window.popleft()
+
+    def _admits(self, priority: str, tokens: int, now: float) -> bool:
+        if now < self._blocked_until:
+            return False
+        share = 1.0
+        if priority == BATCH:
+            if self._waiting[INTERACTIVE]:
+                return False
+            share = self.batch_share
+        if len(self._window) + 1 > max(1, int(self.rpm * share)):
+            return False
+        used = sum(entry[1] for entry in self._window)
+        # An oversized request still goes through once the window is empty
+        return not self._window or used + tokens <= self.tpm * share
+
+    def _next_change(self, now: float) -> float:
+        candidates = [self._blocked_until - now] if self._blocked_until > now else []
+        if self._window:
+            candidates.append(self._window[0][0] + _WINDOW_SECONDS - now)
+        return max(0.01, min(candidates)) if candidates else _WINDOW_SECONDS
+
+    def acquire(self, tokens: int, priority: Optional[str] = None, timeout: Optional[float] = None) -> list:
+        """Reserve one request of ~tokens; returns the reservation for settle().
+
+        Raises QuotaExhausted if capacity does not free up within the class timeout.
+        """
+        priority = priority or current_priority()
+        if timeout is None:
+            timeout = PROVIDER_BATCH_WAIT_SECONDS if priority == BATCH else PROVIDER_INTERACTIVE_WAIT_SECONDS
+        with self._cond:
+            deadline = self._clock() + timeout
+            self._waiting[priority] += 1
+            metrics.gauge_add("provider_quota_waiting", 1, provider=self.name, priority=priority)
+            try:
+                while True:
+                    now = self._clock()
+                    self._prune(now)
+                    if self._admits(priority, tokens, now):
+                        entry = [now, tokens]
+                        self._window.append(entry)
+                        metrics.inc("provider_requests_total", provider=self.name, priority=priority)
+                        return entry
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        metrics.inc("provider_quota_timeouts_total", provider=self.name, priority=priority)
+                        raise QuotaExhausted(f"{self.name} quota exhausted for {priority} requests")
+                    self._cond.wait(min(remaining, self._next_change(now)))
+            finally:
+                self._waiting[priority] -= 1
+                metrics.gauge_add("provider_quota_waiting", -1, provider=self.name, priority=priority)
+                # An interactive caller leaving may unblock batch waiters
+                self._cond.notify_all()
+
+    def has_capacity(self, tokens: int, priority: str = BATCH) -> bool:
+        """Whether a request of ~tokens would be admitted right now without waiting."""
+        with self._cond:
+            now = self._clock()
+            self._prune(now)
+            return self._admits(priority, tokens, now)
+
+    def settle(self, reservation: list, tokens: Optional[int]) -> None:
+        """Replace a reservation's estimate with the provider-reported usage."""
+        if tokens is None:
+            return
+        with self._cond:
+            reservation[1] = int(tokens)
+            self._cond.notify_all()
+
+    def release(self, reservation: list) -> None:
+        """Give back a reservation the provider did not serve (e.g. a 404 for the endpoint)."""
+        with self._cond:
+            try:
+                self._window.remove(reservation)
+            except ValueError:
+                return  # already outside the window
+            self._cond.notify_all()
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """Record a provider 429: admit nothing until Retry-After has passed."""
+        pause = retry_after if retry_after and retry_after > 0 else _DEFAULT_PAUSE_SECONDS
+        metrics.inc("provider_throttled_total", provider=self.name)
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, self._clock() + pause)
+
+
+def parse_retry_after(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+gemini_budget = ProviderBudget("gemini", GEMINI_RPM, GEMINI_TPM)
+openai_budget = ProviderBudget("openai", OPENAI_RPM, OPENAI_TPM)
@@ -0,0 +1,133 @@
+"""
+Inbound protection for LLM-backed endpoints.
+
+- TokenBucket: per-key request budget (refill rate plus burst capacity).
+  check_rate_limit() answers 429 with Retry-After once a user's bucket is
+  empty; plan_generation calls it for the leader of each generation flight.
+- GenerationGate: global cap on concurrent generations with a bounded wait
+  queue. When the queue is full, or a waiter times out, Overloaded is raised
+  so routes can shed load (429 or a cached/local plan).
+
+Both are thread-safe: generation runs on the request threadpool and in the
+scheduler thread.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.config import (
+    GENERATION_BURST,
+    GENERATION_MAX_CONCURRENT,
+    GENERATION_MAX_QUEUE,
+    GENERATION_QUEUE_TIMEOUT_SECONDS,
+    GENERATION_RATE_PER_MINUTE,
+)
+from app.services import metrics
+
+metrics.describe("ratelimit_rejected_total", "Requests rejected by a per-user token bucket")
+metrics.describe("generation_active", "LLM generations currently running")
+metrics.describe("generation_queue_depth", "Generations waiting for a free slot")
+metrics.describe("generation_shed_total", "Generations refused because the queue was full or the wait timed out")
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"Generation capacity exhausted ({reason})")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float, max_keys: int = 10000):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: Hashable, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Consume one token. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0.0
+        return False, (1 - tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class GenerationGate:
+    def __init__(self, max_concurrent: int, max_queue: int, timeout: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def _publish(self):
+        metrics.gauge_set("generation_active", self.active)
+        metrics.gauge_set("generation_queue_depth", self.waiting)
+
+    def acquire(self, shed: bool = True) -> None:
+        """Take a slot. With shed=False (scheduler) wait without queue or time limits."""
+        with self._cond:
+            if self.active < self.max_concurrent and not self.waiting:
+                self.active += 1
+                self._publish()
+                return
+            if shed and self.waiting >= self.max_queue:
+                metrics.inc("generation_shed_total", reason="queue_full")
+                raise Overloaded(self.timeout, "queue_full")
+            self.waiting += 1
+            self._publish()
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if shed and remaining <= 0:
+                        metrics.inc("generation_shed_total", reason="timeout")
+                        raise Overloaded(self.timeout, "timeout")
+                    self._cond.wait(remaining if shed else None)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+                self._publish()
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._publish()
+            # Wake every waiter: notify() could pick one that is about to time
+            # out and leave a shed=False waiter asleep with a free slot
+            self._cond.notify_all()
+
+
+generation_gate = GenerationGate(GENERATION_MAX_CONCURRENT, GENERATION_MAX_QUEUE, GENERATION_QUEUE_TIMEOUT_SECONDS)
+_generation_bucket = TokenBucket(GENERATION_RATE_PER_MINUTE / 60.0, GENERATION_BURST)
+
+
+def overloaded_exception(exc: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail="Meal plan generation is busy; try again shortly",
+                         headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))})
+
+
+def check_rate_limit(user_id: str, scope: str) -> None:
+    """Charge one generation to the user's token bucket; 429 with Retry-After when empty.
+    Call right before generating so cheap replies (a reused plan) cost nothing;
+    generate_plan(rate_limit_scope=...) does so once per coalesced flight."""
+    allowed, retry_after = _generation_bucket.take(user_id)
+    if not allowed:
+        metrics.inc("ratelimit_rejected_total", scope=scope)
+        raise HTTPException(status_code=429, detail="Too many meal plan requests; slow down",
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
@@ -0,0 +1,174 @@
+"""
+Local recipe corpus: instant, network-free meal plans.
+
+Recipes live in a JSON file (RECIPE_CORPUS_PATH, default app/data/recipe_corpus.json):
+
+    {"recipes": [{"id", "name", "meals": ["breakfast", ...],
+                  "ingredients": [{"name", "quantity", "unit", "optional"?}],
+                  "steps": ["Rinse {rice} ...", ...], "prep_time", "cook_time", "calories"}]}
+
+The file is loaded once into an inverted index (canonical ingredient name ->
+postings of recipe ids). A pantry is scored by walking only the postings of
+the ingredients it contains, so the cost grows with the matching recipes, not
+the corpus size. A recipe is makeable when the pantry covers all of its
+required ingredients; among those, recipes that use more of the pantry
+(optional ingredients included) rank higher. Step placeholders like {rice}
+are filled with the pantry's name and the quantity used.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Set
+from urllib.parse import quote_plus
+
+from app.config import RECIPE_CORPUS_PATH
+from app.services import metrics
+from app.services.ingredient_canon import PANTRY_STAPLES, canonical_name, pantry_set
+from app.services.recipe_store import MEAL_KEYS
+
+logger = logging.getLogger(__name__)
+
+_UNITLESS = {"", "pc", "pcs", "piece", "pieces"}
+
+# `source` of rendered recipes; beginner mode leaves their curated steps alone
+CORPUS_SOURCE = "local_corpus"
+
+metrics.describe("local_corpus_plans_total", "Local corpus plan requests, by outcome (hit or miss)")
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _amount(quantity, unit: str, name: str) -> str:
+    number = _number(quantity)
+    if number is None:
+        return name
+    shown = int(number) if number == int(number) else round(number, 2)
+    unit = str(unit or "").strip()
+    return f"{shown} {name}" if unit.lower() in _UNITLESS else f"{shown} {unit} {name}"
+
+
+class _Fill(dict):
+    def __missing__(self, key):
+        return key
+
+
+class RecipeCorpus:
+    def __init__(self, recipes: List[dict]):
+        self.recipes = recipes
+        self._required: List[int] = []
+        self._postings: Dict[str, List[tuple]] = {}
+        self._meal_ids: Dict[str, Set[int]] = {meal: set() for meal in MEAL_KEYS}
+        for idx, recipe in enumerate(recipes):
+            required = 0
+            for ing in recipe.get("ingredients") or []:
+                key = canonical_name(ing.get("name"))
+                if not key or key in PANTRY_STAPLES:
+                    continue
+                optional = bool(ing.get("optional"))
+                required += not optional
+                self._postings.setdefault(key, []).append((idx, optional))
+            self._required.append(required)
+            for meal in recipe.get("meals") or []:
+                if meal in self._meal_ids:
+                    self._meal_ids[meal].add(idx)
+
+    @classmethod
+    def from_file(cls, path: str) -> "RecipeCorpus":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f).get("recipes") or [])
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def score(self, names: Set[str]) -> Dict[int, float]:
+        """Makeable recipe id -> score for a set of canonical pantry names."""
+        hits: Dict[int, List[int]] = {}
+        for name in names:
+            for idx, optional in self._postings.get(name, ()):
+                counts = hits.setdefault(idx, [0, 0])
+                counts[1 if optional else 0] += 1
+        scores = {}
+        for idx, (required, optional) in hits.items():
+            if required == self._required[idx] and required:
+                total = required + optional
+                # Pantry items used, plus a fraction so fuller matches win ties
+                scores[idx] = total + total / (total + 1)
+        return scores
+
+    def best_meals(self, names: Set[str]) -> Dict[str, int]:
+        """Pick one recipe per meal, preferring distinct recipes across meals."""
+        scores = self.score(names)
+        chosen: Dict[str, int] = {}
+        for meal in MEAL_KEYS:
+            ranked = sorted((i for i in scores if i in self._meal_ids[meal]),
+                            key=lambda i: (-scores[i], self.recipes[i].get("id", "")))
+            fresh = [i for i in ranked if i not in chosen.values()]
+            if fresh or ranked:
+                chosen[meal] = (fresh or ranked)[0]
+        return chosen
+
+    def render(self, idx: int, pantry: Dict[str, dict]) -> dict:
+        recipe = self.recipes[idx]
+        used, fill = [], _Fill()
+        for ing in recipe.get("ingredients") or []:
+            key = canonical_name(ing.get("name"))
+            item = pantry.get(key)
+            if item is None:
+                continue
+            quantity, unit = ing.get("quantity"), ing.get("unit")
+            have = _number(item.get("quantity"))
+            same_unit = str(item.get("unit") or "").strip().lower() == str(unit or "").strip().lower()
+            if have is not None and same_unit and _number(quantity) is not None and _number(quantity) > have:
+                quantity = have
+            name = item.get("name") or ing.get("name")
+            used.append({"name": name, "quantity": quantity, "unit": unit})
+            fill[ing.get("name")] = _amount(quantity, unit, name)
+        return {
+            "recipe_name": recipe.get("name"),
+            "ingredients_used": used,
+            "steps": [step.format_map(fill) for step in recipe.get("steps") or []],
+            "prep_time": recipe.get("prep_time", ""),
+            "cook_time": recipe.get("cook_time", ""),
+            "calories": recipe.get("calories", ""),
+            "youtube_link": f"https://www.youtube.com/results?search_query={quote_plus(recipe.get('name', '') + ' recipe')}",
+            "source": CORPUS_SOURCE,
+        }
+
+    def meal_plan(self, items: List[dict]) -> Optional[dict]:
+        """A full breakfast/lunch/dinner plan the pantry can make, or None."""
+        pantry = pantry_set(items)
+        chosen = self.best_meals(set(pantry))
+        if len(chosen) < len(MEAL_KEYS):
+            return None
+        return {meal: self.render(idx, pantry) for meal, idx in chosen.items()}
+
+
+_corpus: Optional[RecipeCorpus] = None
+_lock = threading.Lock()
+
+
+def get_corpus() -> RecipeCorpus:
+    global _corpus
+    if _corpus is None:
+        with _lock:
+            if _corpus is None:
+                path = RECIPE_CORPUS_PATH or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "recipe_corpus.json")
+                _corpus = RecipeCorpus.from_file(path)
+    return _corpus
+
+
+def corpus_meal_plan(items: List[dict]) -> Optional[dict]:
+    """Plan from the local corpus, or None when it cannot cover all three meals."""
+    try:
+        plan = get_corpus().meal_plan(items)
+    except Exception as e:
+        logger.warning(f"Local recipe corpus unavailable: {e}")
+        plan = None
+    metrics.inc("local_corpus_plans_total", outcome="hit" if plan else "miss")
+    return plan
@@ -0,0 +1,124 @@
+"""
+Content-addressed recipe storage.
+
+Meal plan documents keep a small `recipe_refs` map ({"breakfast": <sha256>, ...})
+instead of three embedded recipes. Recipe bodies live once in the `recipes`
+collection under the hash of their normalized JSON, so identical recipes saved
+by the scheduler, manual and agentic paths share a single document.
+
+Normalization (whitespace collapsed, numbers as floats) only feeds the hash;
+the body is stored as the first writer sent it, so clients read back `2`, not
+`2.0`. Later recipes that differ only in formatting resolve to that body.
+
+Reads resolve references with one batched `$in` query; recipes are immutable by
+construction, so resolved bodies are cached in-process without expiry.
+"""
+import copy
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from app.config import RECIPE_CACHE_MAXSIZE, RECIPE_DEDUP_ENABLED
+from app.database import recipes_col
+from app.services.cache import TTLCache
+
+MEAL_KEYS = ("breakfast", "lunch", "dinner")
+
+_recipe_cache = TTLCache(maxsize=RECIPE_CACHE_MAXSIZE, ttl=None)
+
+
+def _normalize_value(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(v) for k, v in value.items() if k != "_id"}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    return str(value)
+
+
+def normalize_recipe(recipe: dict) -> dict:
+    """Canonical form used for hashing (not stored)."""
+    return _normalize_value(recipe or {})
+
+
+def recipe_hash(recipe: dict) -> str:
+    canonical = json.dumps(normalize_recipe(recipe), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def store_recipes(recipes: Iterable[dict]) -> List[str]:
+    """Upsert recipe bodies (one bulk round trip) and return their hashes in order."""
+    hashes = []
+    new_bodies = {}
+    for recipe in recipes:
+        h = recipe_hash(recipe)
+        hashes.append(h)
+        if h not in new_bodies and _recipe_cache.get(h) is None:
+            new_bodies[h] = copy.deepcopy({k: v for k, v in (recipe or {}).items() if k != "_id"})
+    if new_bodies:
+        now = datetime.utcnow().isoformat()
+        pending = list(new_bodies.items())
+        result = recipes_col.bulk_write(
+            [UpdateOne({"_id": h}, {"$setOnInsert": {**body, "created_at": now}}, upsert=True) for h, body in pending],
+            ordered=False,
+        )
+        # Only bodies this call inserted are known to be the stored form; others are read back on demand
+        for i in (result.upserted_ids or {}):
+            h, body = pending[i]
+            _recipe_cache.set(h, body)
+    return hashes
+
+
+def dehydrate_plan(doc: dict) -> dict:
+    """Return a copy of a meal plan document with embedded recipes replaced by hash refs."""
+    if not RECIPE_DEDUP_ENABLED or not isinstance(doc, dict):
+        return doc
+    keys = [k for k in MEAL_KEYS if isinstance(doc.get(k), dict) and doc.get(k)]
+    if not keys:
+        return doc
+    hashes = store_recipes(doc[k] for k in keys)
+    out = {k: v for k, v in doc.items() if k not in keys}
+    out["recipe_refs"] = dict(zip(keys, hashes))
+    return out
+
+
+def _fetch_recipes(hashes: Iterable[str]) -> Dict[str, dict]:
+    wanted = set(hashes)
+    found = _recipe_cache.get_many(wanted)
+    missing = [h for h in wanted if h not in found]
+    if missing:
+        for body in recipes_col.find({"_id": {"$in": missing}}, {"created_at": 0}):
+            h = body.pop("_id")
+            _recipe_cache.set(h, body)
+            found[h] = body
+    return found
+
+
+def hydrate_plans(docs: List[dict]) -> List[dict]:
+    """Resolve recipe_refs for a batch of plan documents in place (one query for all misses).
+    Legacy documents with embedded recipes pass through unchanged."""
+    refs = [h for d in docs if isinstance(d, dict) for h in (d.get("recipe_refs") or {}).values()]
+    if not refs:
+        return docs
+    bodies = _fetch_recipes(refs)
+    for doc in docs:
+        if not isinstance(doc, dict) or not doc.get("recipe_refs"):
+            continue
+        for meal, h in doc.pop("recipe_refs").items():
+            body = bodies.get(h)
+            doc[meal] = copy.deepcopy(body) if body is not None else {}
+    return docs
+
+
+def hydrate_plan(doc: Optional[dict]) -> Optional[dict]:
+    if doc:
+        hydrate_plans([doc])
+    return doc
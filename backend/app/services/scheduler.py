@@ -2,11 +2,14 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, date
 from pytz import timezone
 from app.database import users_col
-try:
-    from app.services.gemini_service import generate_meal_plan
-except ImportError:
-    from app.services.ai_service import generate_meal_plan
+from app.config import PLAN_REUSE_POLICY, SCHEDULER_PREGENERATE_MINUTES
+from app.services.plan_generation import batch_capacity_available, generate_plan
 from app.services.whatsapp_service import send_mealplan_whatsapp, process_whatsapp_reply
+from app.services.recipe_store import dehydrate_plan, hydrate_plan
+from app.services.inventory import list_ingredients
+from app.services.plan_reuse import REUSE_NEVER, inventory_fingerprint, should_reuse
+from app.services.plan_similarity import index_plan
+from app.services.provider_quota import BATCH
 import pytz
 
 
@@ -72,10 +75,10 @@ def job_send_mealplans():
             today_str = now_user.date().isoformat()
             user_id = user.get("email") or str(user.get("_id"))
             
-            existing_plan = mealplans_col.find_one({
+            existing_plan = hydrate_plan(mealplans_col.find_one({
                 "user_id": user_id, 
                 "date": today_str
-            }, sort=[("created_at", -1)])
+            }, sort=[("created_at", -1)]))
             
             if existing_plan:
                 # If a plan exists, send it unless WhatsApp was already sent
@@ -83,11 +86,16 @@ def job_send_mealplans():
                 if sent_at:
                     print(f"[Scheduler] Plan exists and WhatsApp already sent for {user_id} on {today_str}; skipping.")
                     should_send = False
-                else:
+                elif should_reuse(existing_plan, list_ingredients(user_id), for_delivery=True):
                     print(f"[Scheduler] Using existing plan for {user_id} on {today_str}; will send WhatsApp.")
                     should_send = True
                     using_existing_plan = True
                     plan = existing_plan
+                else:
+                    print(f"[Scheduler] Existing plan for {user_id} on {today_str} not reusable under PLAN_REUSE_POLICY; regenerating.")
+                    should_send = True
+                    using_existing_plan = False
+                    plan = None
             else:
                 # No plan yet; we will generate and send
                 should_send = True
@@ -95,7 +103,7 @@ def job_send_mealplans():
                 plan = None
         
         if should_send:
-            from app.database import ingredients_col, mealplans_col
+            from app.database import mealplans_col
             user_id = user.get("email") or str(user.get("_id"))
             if using_existing_plan:
                 # Send existing plan via WhatsApp and mark sent
@@ -113,23 +121,25 @@ def job_send_mealplans():
                 continue
 
             # Generate meal plan
-            ingredients = list(ingredients_col.find({"user_id": user_id}, {"_id":0, "user_id":0}))
+            ingredients = list_ingredients(user_id)
             if ingredients:
                 try:
-                    plan = generate_meal_plan(ingredients)
+                    plan = generate_plan(user_id, ingredients, shed=False)
                 except Exception as e:
                     print(f"[Scheduler] Meal plan generation failed for {user_id}: {e}")
                     continue
                 # Save plan
                 try:
-                    insert_result = mealplans_col.insert_one({
+                    insert_result = mealplans_col.insert_one(dehydrate_plan({
                         "user_id": user_id,
                         "date": now_user.date().isoformat(),
                         "created_at": datetime.utcnow().isoformat(),
                         "origin": "scheduler",
+                        "inventory_fingerprint": inventory_fingerprint(ingredients),
                         **plan
-                    })
-                    saved_doc = mealplans_col.find_one({"_id": insert_result.inserted_id}, {"_id":0})
+                    }))
+                    index_plan(insert_result.inserted_id, {"user_id": user_id, **plan})
+                    saved_doc = hydrate_plan(mealplans_col.find_one({"_id": insert_result.inserted_id}, {"_id":0}))
                     if saved_doc:
                         import json as _json
                         print("[SOURCE: MongoDB meal_plans | Gemini AI] Saved plan:", _json.dumps(saved_doc, ensure_ascii=False))
@@ -148,9 +158,105 @@ def job_send_mealplans():
                 print(f"[Scheduler] No ingredients for user {user_id}; not generating plan.")
 
 
+def job_pregenerate_mealplans():
+    """Generate today's plan ahead of delivery at batch priority, using idle provider quota.
+
+    Delivery (job_send_mealplans) then reuses the stored plan instead of every
+    user due at 08:00 hitting the provider at once. Stops for this round as soon
+    as the provider has no spare batch capacity. Only an LLM plan is stored: when
+    the provider fails (or refuses the batch request), nothing is saved and
+    delivery generates the plan at send time.
+    """
+    if SCHEDULER_PREGENERATE_MINUTES <= 0 or PLAN_REUSE_POLICY == REUSE_NEVER:
+        return
+    from app.database import mealplans_col
+    now_utc = datetime.now(pytz.utc)
+    for user in users_col.find({"delivery_enabled": True, "whatsappVerified": True}):
+        if not (user.get("phone") or "").strip():
+            continue
+        try:
+            user_tz = pytz.timezone(user.get("timezone", "UTC"))
+        except Exception:
+            user_tz = pytz.timezone("UTC")
+        now_user = now_utc.astimezone(user_tz)
+        try:
+            hour, minute = map(int, user.get("delivery_time", "08:00").split(":"))
+        except Exception:
+            continue
+        minutes_until = (hour * 60 + minute) - (now_user.hour * 60 + now_user.minute)
+        # Leave the delivery minute itself to job_send_mealplans
+        if not 0 < minutes_until <= SCHEDULER_PREGENERATE_MINUTES:
+            continue
+        try:
+            delivery_date = user.get("delivery_date")
+            if delivery_date and now_user.date() < datetime.strptime(str(delivery_date), "%Y-%m-%d").date():
+                continue
+        except Exception:
+            pass
+        user_id = user.get("email") or str(user.get("_id"))
+        today_str = now_user.date().isoformat()
+        # A provisional plan is only a placeholder; delivery will not send it
+        if mealplans_col.find_one({"user_id": user_id, "date": today_str, "provisional": {"$ne": True}}, {"_id": 1}):
+            continue
+        ingredients = list_ingredients(user_id)
+        if not ingredients:
+            continue
+        if not batch_capacity_available():
+            print("[Scheduler] Provider quota busy; deferring pre-generation to the next run.")
+            return
+        try:
+            plan = generate_plan(user_id, ingredients, shed=False, priority=BATCH, fallback=False)
+        except Exception as e:
+            print(f"[Scheduler] Pre-generation failed for {user_id}, leaving it to delivery: {e}")
+            continue
+        if not plan:
+            continue
+        inserted = mealplans_col.insert_one(dehydrate_plan({
+            "user_id": user_id,
+            "date": today_str,
+            "created_at": datetime.utcnow().isoformat(),
+            "origin": "scheduler_pregenerate",
+            "inventory_fingerprint": inventory_fingerprint(ingredients),
+            **plan
+        }))
+        index_plan(inserted.inserted_id, {"user_id": user_id, **plan})
+        print(f"[Scheduler] Pre-generated plan for {user_id} on {today_str} ({minutes_until} min before delivery)")
+
+
+def job_archive_mealplans():
+    from app.services.archive import archive_old_plans
+    try:
+        archive_old_plans()
+    except Exception as e:
+        print(f"[Scheduler] Meal plan archival failed: {e}")
+
+
+def job_fail_stale_agentic_jobs():
+    from app.services.agentic_jobs import fail_stale_jobs
+    try:
+        fail_stale_jobs()
+    except Exception as e:
+        print(f"[Scheduler] Agentic job sweep failed: {e}")
+
+
+def job_fail_stale_plan_upgrades():
+    from app.services.plan_upgrade import fail_stale_upgrades
+    try:
+        fail_stale_upgrades()
+    except Exception as e:
+        print(f"[Scheduler] Plan upgrade sweep failed: {e}")
+
+
 def start_scheduler():
     scheduler = BackgroundScheduler()
     # Run every 10 seconds to achieve near "alarm clock" immediacy
     scheduler.add_job(job_send_mealplans, 'interval', seconds=10)
+    # Build upcoming deliveries' plans from idle provider quota (own thread, may wait)
+    scheduler.add_job(job_pregenerate_mealplans, 'interval', minutes=5)
+    # Move old plans to cold storage once a day, off peak
+    scheduler.add_job(job_archive_mealplans, 'cron', hour=3, minute=30)
+    # Fail background agentic jobs whose process stopped
+    scheduler.add_job(job_fail_stale_agentic_jobs, 'interval', minutes=5)
+    scheduler.add_job(job_fail_stale_plan_upgrades, 'interval', minutes=5)
     scheduler.start()
     print("Scheduler started...")
@@ -0,0 +1,68 @@
+"""
+Single-flight call coalescing.
+
+Concurrent callers of SingleFlight.do() with the same key share one execution
+of the function: the first caller runs it, the others block until it finishes
+and receive a deep copy of its result (or its exception). Works across the
+request threadpool and the scheduler thread; nothing is cached afterwards.
+"""
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from app.services import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        metrics.describe("singleflight_calls_total", "Executions started by a leader caller")
+        metrics.describe("singleflight_coalesced_total", "Callers that shared another caller's execution")
+        metrics.describe("singleflight_inflight", "Executions currently running")
+        metrics.describe("singleflight_waiters", "Callers currently waiting on a shared execution")
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        if not leader:
+            metrics.inc("singleflight_coalesced_total", group=self.name)
+            metrics.gauge_add("singleflight_waiters", 1, group=self.name)
+            try:
+                call.done.wait()
+            finally:
+                metrics.gauge_add("singleflight_waiters", -1, group=self.name)
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        metrics.inc("singleflight_calls_total", group=self.name)
+        metrics.gauge_add("singleflight_inflight", 1, group=self.name)
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # No new waiters can join once the call is unregistered
+            with self._lock:
+                self._calls.pop(key, None)
+                shared = call.waiters > 0
+            metrics.gauge_add("singleflight_inflight", -1, group=self.name)
+            call.done.set()
+        # Waiters copy the stored result; give the leader its own copy too
+        return copy.deepcopy(call.result) if shared else call.result
@@ -0,0 +1,65 @@
+"""
+Tiny async stage graph.
+
+Each stage is an async function of the results gathered so far plus the
+names of the stages it depends on. A stage starts as soon as its
+dependencies have finished, so independent stages overlap. The first failure
+cancels whatever is still running and is re-raised. A stage that returns
+SKIPPED is reported as skipped and its result recorded as None.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Tuple
+
+SKIPPED = object()
+
+
+class Stage(NamedTuple):
+    fn: Callable[[Dict[str, Any]], Awaitable[Any]]
+    after: Tuple[str, ...] = ()
+
+
+async def run_stage_graph(stages: Dict[str, Stage], recorder=None) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Run stages respecting `after` edges. Returns (results, timings in ms).
+
+    recorder (optional) receives start(name), succeed(name), skip(name) and
+    fail(name, detail) calls, e.g. an agentic_jobs.StageRecorder.
+    """
+    results: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    pending = dict(stages)
+    running: Dict[asyncio.Task, str] = {}
+
+    async def run_one(name: str, stage: Stage):
+        if recorder is not None:
+            await recorder.start(name)
+        started = time.perf_counter()
+        try:
+            value = await stage.fn(results)
+        except BaseException as e:
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+            if recorder is not None and not isinstance(e, asyncio.CancelledError):
+                await recorder.fail(name, str(getattr(e, "detail", e)))
+            raise
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        if recorder is not None:
+            await (recorder.skip(name) if value is SKIPPED else recorder.succeed(name))
+        return None if value is SKIPPED else value
+
+    try:
+        while pending or running:
+            ready = [n for n, s in pending.items() if all(d in results for d in s.after)]
+            for name in ready:
+                running[asyncio.ensure_future(run_one(name, pending.pop(name)))] = name
+            if not running:
+                raise RuntimeError(f"Unsatisfiable stage dependencies: {sorted(pending)}")
+            done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                results[name] = task.result()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    return results, timings
@@ -0,0 +1,223 @@
+"""
+Recipe step clean-up and quality signals, shared by every generator.
+
+All rewrite terms (equipment, packaged foods, dals, prep verbs, known bad
+phrases) live in one table, compiled at import into a hashed vocabulary of
+word forms. check_step() tokenizes a step once, intersects its words with the
+vocabulary, and returns both the corrected text and the quality signals
+(looks_generic() computes only the signals, without the vocabulary):
+
+- drop equipment lists and workspace set-up lines (3+ equipment terms);
+- rewrite known bad phrases ("wash and chop cornflakes");
+- rewrite "wash/chop <packaged food or dal>" when the recipe uses it;
+- flag whether the step starts with an action verb and mentions a unit, time
+  or utensil.
+
+Rewrite terms match whole words (plus plural and past-tense forms), so "pot"
+does not fire inside "potato". Multi-word terms are keyed by their last word
+and confirmed with one substring test. The quality signal keeps the original
+substring test on purpose ("g" or "l" anywhere counts as a unit): it decides
+when Gemini is asked to refine steps. review_steps() gives the corrected steps
+and the generic verdict from the same pass. scripts/bench_step_sanitizer.py
+compares this with the per-term substring scans it replaced.
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+from app.services.ingredient_canon import canonical_name
+
+MAX_STEPS = 10
+
+# Flags per table term
+EQUIPMENT = 1    # counts towards dropping an equipment-list line
+WASH = 2
+CHOP = 4
+DICE = 8
+FOOD = 16        # packaged food or dal with a rewrite rule
+PREP_VERB = WASH | CHOP | DICE
+
+ACTION_VERBS = frozenset({
+    "peel", "wash", "rinse", "cut", "chop", "dice", "slice", "boil", "simmer", "sauté", "saute",
+    "mix", "whisk", "scramble", "heat", "preheat", "drain", "strain", "season", "serve", "garnish",
+    "toast", "stir", "fold", "marinate", "pour", "press", "cover", "rest", "reduce", "sear",
+})
+
+# Substrings that count as a unit, time or utensil for looks_generic(). These are
+# the original unit/time/utensil lists minus the terms already implied by "g" or
+# "l" (kg, ml, cups, tablespoon, bowl, spatula, skillet, cutting board, ...);
+# those two letters are tested first, the rest in one regex
+SIGNAL_SUBSTRINGS = ("g", "l", "cup", "tbsp", "teaspoon", "tsp", "minute", "mins", "sec",
+                     "knife", "pot", "pan", "strainer", "oven", "tray")
+_SIGNAL = re.compile("|".join(map(re.escape, SIGNAL_SUBSTRINGS[2:])))
+
+_TERMS: Dict[str, int] = {}
+
+
+def _add(flag: int, *terms: str) -> None:
+    for term in terms:
+        _TERMS[term] = _TERMS.get(term, 0) | flag
+
+
+_add(EQUIPMENT, "cutting board", "knife", "mixing bowl", "pot", "pan", "spatula", "strainer", "colander")
+_add(WASH, "wash")
+_add(CHOP, "chop")
+_add(DICE, "dice")
+
+# Food term -> rewrite when a "wash and chop"-style step names it ({name} is filled in)
+_FOOD_RULES: Dict[str, Tuple[str, bool]] = {
+    # (replacement, needs "wash" as well as "chop"/"dice")
+    "biscuits": ("Crush biscuits into coarse crumbs.", True),
+    "cornflakes": ("Use cornflakes as a crunchy topping; do not chop.", True),
+    "bread": ("Toast bread slices until golden; cut into triangles.", True),
+    "maggi": ("Cook Maggi noodles as per packet instructions.", True),
+    "papad": ("Roast or fry papad until crisp.", True),
+    "chana dal": ("Rinse {name}; boil until tender and season.", False),
+    "toor dal": ("Rinse {name}; boil until tender and season.", False),
+    "moong dal": ("Rinse {name}; boil until tender and season.", False),
+    "masoor dal": ("Rinse {name}; boil until tender and season.", False),
+    "rajma": ("Rinse {name}; boil until tender and season.", False),
+    "banana": ("Peel and slice bananas.", False),
+}
+_add(FOOD, *_FOOD_RULES)
+
+# Whole-phrase rewrites, applied whatever the ingredients ("" drops the line)
+_PHRASES: Dict[str, str] = {
+    "prepare your workspace": "",
+    "wash and chop cornflakes": "Use cornflakes as a crunchy topping; do not chop.",
+    "wash and chop bread": "Toast bread slices until golden; cut into pieces.",
+    "wash and chop chana dal": "Rinse chana dal; boil until tender; season to taste.",
+}
+
+# Steps are split on whitespace only, so forms are also listed with the punctuation
+# that can stick to a word ("pan," "(optional")
+_TRAILING = ("", ".", ",", ";", ":", "!", "?", ")")
+
+
+def _punctuated(form: str) -> List[str]:
+    return [form + p for p in _TRAILING] + ["(" + form]
+
+
+# Word as split from a step -> (table term, flags)
+_FORMS: Dict[str, Tuple[str, int]] = {}
+# Last word (as split) -> multi-word terms and phrases ending in it
+_MULTI: Dict[str, List[str]] = {}
+for _term in (*_TERMS, *_PHRASES):
+    if " " in _term:
+        for _word in _punctuated(_term.rsplit(" ", 1)[1]):
+            _MULTI.setdefault(_word, []).append(_term)
+        continue
+    _flags = _TERMS[_term]
+    _variants = ("ed", "d") if _flags & PREP_VERB else ("s", "es")
+    for _form in (_term, *(_term + v for v in _variants)):
+        for _word in _punctuated(_form):
+            _FORMS.setdefault(_word, (_term, _flags))
+_FORMS["chopped"] = ("chop", CHOP)
+_VOCAB = frozenset(_FORMS) | frozenset(_MULTI)
+
+
+class StepCheck(NamedTuple):
+    text: str           # corrected step, "" when it should be dropped
+    action_first: bool  # starts with an action verb
+    signal: bool        # mentions a unit, time or utensil (SIGNAL_SUBSTRINGS)
+
+
+class StepReview(NamedTuple):
+    steps: List[str]    # sanitize_steps() result
+    generic: bool       # looks_generic() of the steps as given
+
+
+def _signals(ls: str, words: List[str]) -> Tuple[bool, bool]:
+    """(action_first, signal) of a lower-cased step and its words."""
+    action_first = bool(words) and words[0].strip(".,:;()[]{}") in ACTION_VERBS
+    return action_first, "g" in ls or "l" in ls or _SIGNAL.search(ls) is not None
+
+
+def check_step(line, foods: Iterable[str] = ()) -> StepCheck:
+    """One scan of a step. foods: recipe_foods() of the recipe; the first one the step
+    names decides the rewrite."""
+    s = str(line).strip()
+    ls = s.lower()
+    words = ls.split()
+    action_first, signal = _signals(ls, words)
+    hits = _VOCAB.intersection(words)
+    # Without a multi-word term, a step changes only with 3+ equipment words or a
+    # prep verb next to one of the recipe's foods: most steps stop here
+    if len(hits) < (2 if foods else 3) and hits.isdisjoint(_MULTI) and not ls.startswith("set out"):
+        return StepCheck(s, action_first, signal)
+    flags, phrase, equipment, found = 0, None, set(), set()
+    for word in hits:
+        terms = [_FORMS[word]] if word in _FORMS else []
+        if word in _MULTI:
+            terms += [(t, _TERMS.get(t, 0)) for t in _MULTI[word] if t in ls]
+        for term, term_flags in terms:
+            if term in _PHRASES:
+                phrase = _PHRASES[term] if phrase is None else phrase
+                continue
+            flags |= term_flags
+            if term_flags & EQUIPMENT:
+                equipment.add(term)
+            if term_flags & FOOD:
+                found.add(term)
+    if ls.startswith("set out") or phrase == "" or len(equipment) >= 3:
+        return StepCheck("", action_first, signal)
+    if phrase:
+        return StepCheck(phrase, action_first, signal)
+    if found and flags & PREP_VERB:
+        for name in foods:
+            if name in found:
+                replacement, needs_wash = _FOOD_RULES[name]
+                if (flags & WASH and flags & (CHOP | DICE)) if needs_wash else flags & CHOP:
+                    return StepCheck(replacement.format(name=name), action_first, signal)
+    return StepCheck(s, action_first, signal)
+
+
+def recipe_foods(ingredients: Iterable[dict]) -> List[str]:
+    """Canonical names of a recipe's ingredients that have a rewrite rule, in order."""
+    out: List[str] = []
+    for ing in ingredients or []:
+        name = canonical_name((ing or {}).get("name"))
+        if name in _FOOD_RULES and name not in out:
+            out.append(name)
+    return out
+
+
+def review_steps(steps, ingredients=()) -> StepReview:
+    """sanitize_steps() and looks_generic() of the same steps, checking each step once."""
+    steps = steps or []
+    foods = recipe_foods(ingredients)
+    seen: Set[str] = set()
+    cleaned = []
+    generic = signal = 0
+    for line in steps:
+        check = check_step(line, foods)
+        generic += not check.action_first
+        signal += check.signal
+        if check.text and check.text not in seen:
+            seen.add(check.text)
+            cleaned.append(check.text)
+    return StepReview(cleaned[:MAX_STEPS], _too_generic(len(steps), generic, signal))
+
+
+def _too_generic(count: int, generic: int, signal: int) -> bool:
+    return count < 8 or generic > count // 3 or signal < count // 3
+
+
+def sanitize_steps(steps, ingredients) -> List[str]:
+    """Corrected steps without dropped lines or duplicates, capped at MAX_STEPS."""
+    if not steps:
+        return []
+    return review_steps(steps, ingredients).steps
+
+
+def looks_generic(steps) -> bool:
+    """Too short, or too many steps without an action verb first or without any
+    unit/time/utensil. Only the signals are computed, not the rewrites."""
+    if not steps or len(steps) < 8:
+        return True
+    generic = signal = 0
+    for line in steps:
+        ls = str(line).strip().lower()
+        action_first, has_signal = _signals(ls, ls.split())
+        generic += not action_first
+        signal += has_signal
+    return _too_generic(len(steps), generic, signal)
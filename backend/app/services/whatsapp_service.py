@@ -2,85 +2,16 @@ import requests
 import os
 from dotenv import load_dotenv
 from app.config import WHATSAPP_TEMPLATE_HELLO, WHATSAPP_TEMPLATE_LANG
+from app.services.ingredient_canon import normalize_recipe_ingredients
+from app.services.step_sanitizer import sanitize_steps
 
 
 # Sanitization helpers to improve recipe readability
-def _normalize_ingredients(ingredients):
-    normalized = []
-    for ing in (ingredients or []):
-        name = str(ing.get('name', '')).strip()
-        qty = ing.get('quantity')
-        unit = ing.get('unit')
-        # Convert dozens to pieces for clarity
-        if isinstance(unit, str) and unit.lower() == 'dozen' and isinstance(qty, (int, float)):
-            qty = float(qty) * 12
-            unit = 'pieces'
-        normalized.append({'name': name or 'Unknown', 'quantity': qty, 'unit': unit})
-    return normalized
-
-
-def _sanitize_steps(steps, ingredients):
-    if not steps:
-        return []
-    lower_names = [(ing.get('name') or '').lower() for ing in (ingredients or [])]
-    packaged = set(['biscuits', 'cornflakes', 'bread', 'maggi', 'papad', 'tomato ketchup', 'peanut butter', 'tea', 'coffee', 'sugar'])
-    dals = set(['chana dal', 'toor dal', 'moong dal', 'masoor dal', 'rajma'])
-
-    equipment_terms = ['cutting board', 'knife', 'mixing bowl', 'pot', 'pan', 'spatula', 'strainer', 'colander']
-
-    def fix_line(line):
-        s = str(line).strip()
-        ls = s.lower()
-        # Remove only when the line is an equipment list or workspace setup
-        eq_count = sum(1 for term in equipment_terms if term in ls)
-        if ls.startswith('set out') or 'prepare your workspace' in ls or eq_count >= 3:
-            return ''
-        # Specific corrections
-        if 'wash and chop chana dal' in ls:
-            return 'Rinse chana dal; boil until tender; season to taste.'
-        if 'wash and chop cornflakes' in ls:
-            return 'Cornflakes are ready-to-eat; sprinkle on top for crunch.'
-        if 'wash and chop bread' in ls:
-            return 'Toast bread and cut into pieces.'
-        # Generic corrections based on ingredient category
-        for name in lower_names:
-            if name in packaged and ('wash' in ls and ('chop' in ls or 'dice' in ls) and name in ls):
-                if name == 'biscuits':
-                    return 'Crush biscuits into coarse crumbs.'
-                if name == 'cornflakes':
-                    return 'Use cornflakes as a crunchy topping; do not chop.'
-                if name == 'bread':
-                    return 'Toast bread slices until golden; cut into triangles.'
-                if name == 'maggi':
-                    return 'Cook Maggi noodles as per packet instructions.'
-                if name == 'papad':
-                    return 'Roast or fry papad until crisp.'
-            if name in dals and ('chop' in ls and name in ls):
-                return f'Rinse {name}; boil until tender and season.'
-            if name in ['banana', 'bananas'] and 'chop' in ls and name in ls:
-                return 'Peel and slice bananas.'
-        return s
-
-    cleaned = []
-    for line in steps:
-        fixed = fix_line(line)
-        if fixed:
-            cleaned.append(fixed)
-    # Deduplicate while preserving order, cap to 10 steps
-    seen = set()
-    unique = []
-    for s in cleaned:
-        if s not in seen:
-            seen.add(s)
-            unique.append(s)
-    return unique[:10]
-
-
 def _sanitize_recipe(recipe: dict) -> dict:
     r = dict(recipe or {})
     ingredients = r.get('ingredients_used') or r.get('ingredients') or []
-    r['ingredients_used'] = _normalize_ingredients(ingredients)
-    r['steps'] = _sanitize_steps(r.get('steps') or [], r['ingredients_used'])
+    r['ingredients_used'] = normalize_recipe_ingredients(ingredients)
+    r['steps'] = sanitize_steps(r.get('steps') or [], r['ingredients_used'])
     return r
 
 
@@ -0,0 +1,24 @@
+"""
+Move meal plans older than MEALPLAN_ARCHIVE_AFTER_DAYS (or --days N) into
+compressed per-user monthly bundles in meal_plan_archives.
+
+Usage: MONGO_URI=... python scripts/archive_mealplans.py [--days N] [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import init_indexes
+from app.services.archive import archive_old_plans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=None, help="archive plans older than this many days")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    init_indexes()
+    stats = archive_old_plans(args.days, dry_run=args.dry_run)
+    print(stats)
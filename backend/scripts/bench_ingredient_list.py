@@ -0,0 +1,41 @@
+"""
+Compare serializing a large pantry through the Ingredient model (the old
+GET /ingredients path) with the lean FastJSONResponse path. No database needed.
+
+Usage: python scripts/bench_ingredient_list.py [ITEMS]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from app.models import Ingredient
+from app.responses import dumps
+
+
+def _timed(fn, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n: int = 5000):
+    rows = [
+        {"_id": ObjectId(), "name": f"item{i}", "quantity": float(i % 7), "unit": "pcs", "created_at": datetime.utcnow()}
+        for i in range(n)
+    ]
+    model_path = _timed(lambda: jsonable_encoder([Ingredient(**{k: v for k, v in r.items() if k != "_id"}) for r in rows]))
+    lean_path = _timed(lambda: dumps(rows))
+    print(f"{n} items: model {model_path / n * 1e6:.2f} us/item, lean {lean_path / n * 1e6:.2f} us/item")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
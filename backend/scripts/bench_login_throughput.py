@@ -0,0 +1,119 @@
+"""
+Login throughput benchmark.
+
+Fires N concurrent POST /auth/login requests at a running server and reports
+wall time against the single-request latency. When hashing blocks the event
+loop, N concurrent logins take ~N x single latency on one worker; with the
+off-loop executor they overlap up to PASSWORD_HASH_WORKERS at a time.
+
+Run the server with a single worker so serialization is visible:
+    uvicorn app.main:app --port 8000 --workers 1
+    BASE_URL=http://127.0.0.1:8000 CONCURRENCY=16 python scripts/bench_login_throughput.py
+
+Set LOCAL=1 to skip HTTP/Mongo and compare inline vs off-loop verification on
+an event loop, including the worst stall seen by a concurrent heartbeat task.
+"""
+import asyncio
+import os
+import random
+import string
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8000")
+CONCURRENCY = int(os.getenv("CONCURRENCY", "16"))
+PASSWORD = "Bench123!"
+
+
+def _signup():
+    suffix = ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(6))
+    email = f"bench.login.{suffix}@example.com"
+    r = requests.post(f"{BASE_URL}/auth/signup", json={
+        "name": "Bench User", "email": email, "phone": "+14155550000", "password": PASSWORD,
+    }, timeout=30)
+    r.raise_for_status()
+    return email
+
+
+def _login(email):
+    start = time.perf_counter()
+    r = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": PASSWORD}, timeout=60)
+    r.raise_for_status()
+    return time.perf_counter() - start
+
+
+def bench_http():
+    email = _signup()
+    _login(email)  # warm up the hash pool
+    single = _login(email)
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(_login, [email] * CONCURRENCY))
+        wall = time.perf_counter() - start
+    _report(single, wall, latencies)
+
+
+def bench_local():
+    from app.auth import get_password_hash, verify_password, verify_password_async
+
+    hashed = get_password_hash(PASSWORD)
+
+    async def on_loop():
+        # Mirrors the old handler: verification runs inline on the event loop
+        async def one():
+            return verify_password(PASSWORD, hashed)
+        return await asyncio.gather(*[one() for _ in range(CONCURRENCY)])
+
+    async def off_loop():
+        return await asyncio.gather(*[verify_password_async(PASSWORD, hashed) for _ in range(CONCURRENCY)])
+
+    async def measure(fn):
+        # A heartbeat task stands in for other requests sharing the worker;
+        # its worst wake-up delay is how long the loop was blocked.
+        stalls = []
+        done = asyncio.Event()
+
+        async def heartbeat():
+            while not done.is_set():
+                t = time.perf_counter()
+                await asyncio.sleep(0.001)
+                stalls.append(time.perf_counter() - t - 0.001)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await fn()
+        wall = time.perf_counter() - start
+        done.set()
+        await beat
+        return wall, max(stalls or [0.0])
+
+    start = time.perf_counter()
+    verify_password(PASSWORD, hashed)
+    single = time.perf_counter() - start
+    print(f"single verify: {single * 1000:.1f} ms")
+
+    asyncio.run(off_loop())  # warm up the hash pool
+    for label, fn in (("on-loop", on_loop), ("off-loop", off_loop)):
+        wall, stall = asyncio.run(measure(fn))
+        print(f"{label:>9}: {CONCURRENCY} verifies in {wall:.3f}s ({CONCURRENCY / wall:.1f}/s), max loop stall {stall * 1000:.1f} ms")
+
+
+def _report(single, wall, latencies):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    print(f"single login: {single * 1000:.1f} ms")
+    print(f"{CONCURRENCY} concurrent logins: wall={wall:.3f}s throughput={CONCURRENCY / wall:.1f}/s p50={p50 * 1000:.1f} ms max={latencies[-1] * 1000:.1f} ms")
+    print(f"serialization factor: {wall / single:.1f}x single latency (≈{CONCURRENCY} means fully serialized)")
+
+
+if __name__ == "__main__":
+    if os.getenv("LOCAL") == "1":
+        bench_local()
+    else:
+        bench_http()
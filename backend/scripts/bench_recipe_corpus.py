@@ -0,0 +1,52 @@
+"""
+Measure local corpus plan latency as the corpus grows. Builds synthetic
+corpora (random recipes over a 400-ingredient vocabulary) and times
+RecipeCorpus.meal_plan for a 15-item pantry. No database or network needed.
+
+Usage: python scripts/bench_recipe_corpus.py [RECIPES ...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.recipe_corpus import RecipeCorpus
+
+VOCAB = [f"ingredient{i}" for i in range(400)]
+MEALS = ("breakfast", "lunch", "dinner")
+
+
+def _corpus(n: int, rng: random.Random) -> RecipeCorpus:
+    recipes = []
+    for i in range(n):
+        names = rng.sample(VOCAB, rng.randint(2, 6))
+        recipes.append({
+            "id": f"r{i}",
+            "name": f"Recipe {i}",
+            "meals": rng.sample(MEALS, rng.randint(1, 2)),
+            "ingredients": [{"name": name, "quantity": 100, "unit": "g", "optional": j >= 3} for j, name in enumerate(names)],
+            "steps": [f"Cook {{{names[0]}}} in a pan for 10 minutes."],
+        })
+    return RecipeCorpus(recipes)
+
+
+def main(sizes):
+    rng = random.Random(7)
+    # A skewed pantry: common ingredients appear in many recipes
+    pantry = [{"name": name, "quantity": 1, "unit": "kg"} for name in VOCAB[:10] + rng.sample(VOCAB[10:], 5)]
+    for n in sizes:
+        start = time.perf_counter()
+        corpus = _corpus(n, rng)
+        build = time.perf_counter() - start
+        rounds = 200
+        start = time.perf_counter()
+        for _ in range(rounds):
+            corpus.meal_plan(pantry)
+        per_plan = (time.perf_counter() - start) / rounds
+        print(f"{n} recipes: index build {build * 1000:.1f} ms, {per_plan * 1e3:.3f} ms/plan")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100, 1000, 10000])
@@ -0,0 +1,158 @@
+"""
+Compare the compiled step sanitizer (app.services.step_sanitizer) with the
+per-step substring scans it replaced, on a large synthetic plan (1000 recipes
+of 12 steps) for growing ingredient lists. Reports the time per step for
+sanitizing, for the generic-step check, and for both at once (review_steps()
+against the two old functions), plus how many recipes differ: sanitized steps
+can (the new matcher matches whole words, so "pot" no longer fires inside
+"potato"), the generic verdict should not. No database or network needed.
+
+Usage: python scripts/bench_step_sanitizer.py [INGREDIENTS_PER_RECIPE ...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.step_sanitizer import looks_generic, review_steps, sanitize_steps
+
+INGREDIENTS = ["rice", "egg", "tomato", "onion", "bananas", "bread", "biscuits", "cornflakes", "chana dal",
+               "toor dal", "potato", "paneer", "spinach", "maggi", "papad", "milk", "oats", "chicken"]
+TEMPLATES = [
+    "Wash and chop {q} {name} on a cutting board.",
+    "Rinse {q} {name} in a strainer for 60 seconds.",
+    "Set out a cutting board, knife, mixing bowl, pot, pan and spatula.",
+    "Heat 1 tbsp oil in a pan over medium heat for 2 minutes.",
+    "Chop the {name} finely and keep aside in a bowl.",
+    "Add {name} and stir gently until everything is combined.",
+    "Serve warm, garnished with fresh herbs.",
+    "Prepare your workspace before you start.",
+    "Boil {q} {name} in a pot for 12 minutes, then drain.",
+    "Season to taste and let it rest briefly.",
+]
+
+
+# --- The substring-scan implementations this module replaced, kept as the baseline ---
+
+def legacy_sanitize_steps(steps, ingredients):
+    if not steps:
+        return []
+    lower_names = [(ing.get('name') or '').lower() for ing in (ingredients or [])]
+    packaged = set(['biscuits', 'cornflakes', 'bread', 'maggi', 'papad', 'tomato ketchup', 'peanut butter'])
+    dals = set(['chana dal', 'toor dal', 'moong dal', 'masoor dal', 'rajma'])
+    equipment_terms = ['cutting board', 'knife', 'mixing bowl', 'pot', 'pan', 'spatula', 'strainer', 'colander']
+
+    def fix_line(line):
+        s = str(line).strip()
+        ls = s.lower()
+        eq_count = sum(1 for term in equipment_terms if term in ls)
+        if ls.startswith('set out') or 'prepare your workspace' in ls or eq_count >= 3:
+            return ''
+        if 'wash and chop cornflakes' in ls:
+            return 'Use cornflakes as a crunchy topping; do not chop.'
+        if 'wash and chop bread' in ls:
+            return 'Toast bread slices until golden; cut into pieces.'
+        if 'wash and chop chana dal' in ls:
+            return 'Rinse chana dal; boil until tender; season to taste.'
+        for name in lower_names:
+            if name in packaged and ('wash' in ls and ('chop' in ls or 'dice' in ls) and name in ls):
+                if name == 'biscuits':
+                    return 'Crush biscuits into coarse crumbs.'
+                if name == 'cornflakes':
+                    return 'Use cornflakes as a crunchy topping; do not chop.'
+                if name == 'bread':
+                    return 'Toast bread slices until golden; cut into triangles.'
+                if name == 'maggi':
+                    return 'Cook Maggi noodles as per packet instructions.'
+                if name == 'papad':
+                    return 'Roast or fry papad until crisp.'
+            if name in dals and ('chop' in ls and name in ls):
+                return f'Rinse {name}; boil until tender and season.'
+            if name in ['banana', 'bananas'] and 'chop' in ls and name in ls:
+                return 'Peel and slice bananas.'
+        return s
+
+    cleaned = [fixed for fixed in (fix_line(line) for line in steps) if fixed]
+    seen = set()
+    unique = []
+    for s in cleaned:
+        if s not in seen:
+            seen.add(s)
+            unique.append(s)
+    return unique[:10]
+
+
+LEGACY_ACTION_VERBS = {
+    "peel", "wash", "rinse", "cut", "chop", "dice", "slice", "boil", "simmer", "sauté", "saute",
+    "mix", "whisk", "scramble", "heat", "preheat", "drain", "strain", "season", "serve", "garnish",
+    "toast", "stir", "fold", "marinate", "pour", "press", "cover", "rest", "reduce", "sear",
+}
+
+
+def legacy_looks_generic(steps):
+    def has_verb(s):
+        try:
+            return (s or "").strip().lower().split()[0].strip(".,:;()[]{}") in LEGACY_ACTION_VERBS
+        except Exception:
+            return False
+
+    def unit_or_time(s):
+        t = (s or "").lower()
+        return (any(u in t for u in ["kg", "g", "cup", "cups", "tablespoon", "tbsp", "teaspoon", "tsp", "ml", "l"])
+                or any(tm in t for tm in ["minute", "minutes", "mins", "second", "seconds", "sec"]))
+
+    def utensil(s):
+        t = (s or "").lower()
+        return any(u in t for u in ["bowl", "knife", "pot", "pan", "spatula", "strainer", "oven", "tray", "skillet", "cutting board"])
+
+    if not steps or len(steps) < 8:
+        return True
+    generic = sum(1 for s in steps if not has_verb(s))
+    signal = sum(1 for s in steps if unit_or_time(s) or utensil(s))
+    return generic > len(steps) // 3 or signal < len(steps) // 3
+
+
+def _recipes(n_ingredients: int, rng: random.Random, count: int = 1000, steps: int = 12):
+    vocab = INGREDIENTS + [f"ingredient {i}" for i in range(max(0, n_ingredients - len(INGREDIENTS)))]
+    recipes = []
+    for _ in range(count):
+        names = rng.sample(vocab, n_ingredients)
+        ingredients = [{"name": name.title(), "quantity": rng.randint(1, 500), "unit": "g"} for name in names]
+        lines = [rng.choice(TEMPLATES).format(name=rng.choice(names), q=f"{rng.randint(1, 500)} g") for _ in range(steps)]
+        recipes.append((lines, ingredients))
+    return recipes
+
+
+def _per_step_us(fn, recipes, repeat: int = 3) -> float:
+    steps = sum(len(lines) for lines, _ in recipes)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for lines, ingredients in recipes:
+            fn(lines, ingredients)
+        best = min(best, time.perf_counter() - start)
+    return best / steps * 1e6
+
+
+def main(sizes):
+    rng = random.Random(7)
+    print(f"{'ingredients':>11} {'sanitize old':>13} {'new':>8} {'generic old':>12} {'new':>8} "
+          f"{'both old':>9} {'new':>8} {'steps differ':>13} {'generic differ':>15}")
+    for n in sizes:
+        recipes = _recipes(n, rng)
+        old_s = _per_step_us(legacy_sanitize_steps, recipes)
+        new_s = _per_step_us(sanitize_steps, recipes)
+        old_g = _per_step_us(lambda lines, _: legacy_looks_generic(lines), recipes)
+        new_g = _per_step_us(lambda lines, _: looks_generic(lines), recipes)
+        old_b = _per_step_us(lambda lines, ings: (legacy_sanitize_steps(lines, ings), legacy_looks_generic(lines)), recipes)
+        new_b = _per_step_us(review_steps, recipes)
+        differ = sum(legacy_sanitize_steps(lines, ings) != sanitize_steps(lines, ings) for lines, ings in recipes)
+        generic_differ = sum(legacy_looks_generic(lines) != looks_generic(lines) for lines, _ in recipes)
+        print(f"{n:>11} {old_s:>11.2f}us {new_s:>6.2f}us {old_g:>10.2f}us {new_g:>6.2f}us "
+              f"{old_b:>7.2f}us {new_b:>6.2f}us {differ:>13} {generic_differ:>15}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [8, 30, 100])
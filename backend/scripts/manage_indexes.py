@@ -0,0 +1,39 @@
+"""
+Apply the declarative index registry (app/indexes.py) to MongoDB.
+
+Serverless deployments skip index creation at startup; run this once per
+deploy instead.
+
+Usage: MONGO_URI=... python scripts/manage_indexes.py [--dry-run] [--prune] [--verify]
+  --dry-run  print the actions without changing anything
+  --prune    also drop indexes that are not in the registry
+  --verify   explain() every registered query shape; exit 1 on any COLLSCAN
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.indexes import apply_indexes, verify_query_shapes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the app's MongoDB index registry")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--prune", action="store_true")
+    parser.add_argument("--verify", action="store_true")
+    args = parser.parse_args()
+
+    actions = apply_indexes(prune=args.prune, dry_run=args.dry_run)
+    for action in actions:
+        print(action)
+    print(f"{len(actions)} index change(s){' planned' if args.dry_run else ''}")
+
+    if args.verify:
+        failures = verify_query_shapes()
+        for name, stages in failures:
+            print(f"COLLSCAN: {name} -> {' > '.join(stages)}")
+        if failures:
+            sys.exit(1)
+        print("All query shapes use an index")
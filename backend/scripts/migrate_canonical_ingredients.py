@@ -0,0 +1,30 @@
+"""
+Backfill `name_key` (the canonical name) and canonical units on stored
+ingredients ("Eggs, 1 dozen" -> name_key "egg", 12 pcs), merging items that
+share a key (newest wins). Names stay as the user typed them.
+
+New writes carry name_key already; this brings rows saved earlier in line so
+lookups by name use the name_key index. Honors INGREDIENT_LAYOUT like the app.
+Re-running is safe.
+
+Usage: MONGO_URI=... python scripts/migrate_canonical_ingredients.py [--dry-run]
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import ingredients_col, inventories_col
+from app.services.inventory import canonicalize_user
+
+
+def main(dry_run: bool = False):
+    users = set(ingredients_col.distinct("user_id")) | set(inventories_col.distinct("_id"))
+    changed = 0
+    for user_id in sorted(users):
+        changed += canonicalize_user(user_id, dry_run=dry_run)
+    print(f"{'Would rewrite' if dry_run else 'Rewrote'} {changed} ingredient(s) for {len(users)} user(s)")
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,32 @@
+"""
+Build per-user `inventories` documents from the per-item `ingredients` collection.
+
+Run with INGREDIENT_LAYOUT=dual deployed so new writes land in both layouts,
+then run this script, then switch to INGREDIENT_LAYOUT=inventory. Re-running is
+safe: each user's inventory is rebuilt from the per-item documents.
+
+Usage: MONGO_URI=... python scripts/migrate_ingredient_inventory.py [--dry-run]
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import ingredients_col
+from app.services.inventory import migrate_user
+
+
+def main(dry_run: bool = False):
+    users = 0
+    items = 0
+    for user_id in ingredients_col.distinct("user_id"):
+        users += 1
+        if dry_run:
+            items += ingredients_col.count_documents({"user_id": user_id})
+            continue
+        items += migrate_user(user_id)
+    print(f"{'Would migrate' if dry_run else 'Migrated'} {items} ingredient(s) for {users} user(s)")
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
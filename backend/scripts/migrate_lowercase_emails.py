@@ -0,0 +1,42 @@
+"""
+Lowercase legacy mixed-case emails so every record matches the normalized
+JWT subject used by the API (and the case-insensitive idx_users_email_ci).
+
+Also rewrites user_id on ingredients and meal_plans written under the old
+mixed-case email. Users whose lowercase email already belongs to another
+record are reported and left untouched.
+
+Usage: MONGO_URI=... python scripts/migrate_lowercase_emails.py [--dry-run]
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import users_col, ingredients_col, mealplans_col, init_indexes
+
+
+def main(dry_run: bool = False):
+    init_indexes()
+    migrated = 0
+    conflicts = []
+    for user in users_col.find({"email": {"$regex": "[A-Z]"}}, {"_id": 1, "email": 1}):
+        old = user.get("email") or ""
+        new = old.strip().lower()
+        if users_col.find_one({"email": new, "_id": {"$ne": user["_id"]}}, {"_id": 1}):
+            conflicts.append(old)
+            continue
+        print(f"{old} -> {new}")
+        if dry_run:
+            continue
+        users_col.update_one({"_id": user["_id"]}, {"$set": {"email": new}})
+        ingredients_col.update_many({"user_id": old}, {"$set": {"user_id": new}})
+        mealplans_col.update_many({"user_id": old}, {"$set": {"user_id": new}})
+        migrated += 1
+    print(f"Migrated {migrated} user(s){' (dry run)' if dry_run else ''}")
+    for email in conflicts:
+        print(f"Skipped {email}: lowercase email already in use")
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
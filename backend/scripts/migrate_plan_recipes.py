@@ -0,0 +1,33 @@
+"""
+Move recipes embedded in existing meal_plans documents into the
+content-addressed `recipes` collection, replacing them with `recipe_refs`.
+
+Usage: MONGO_URI=... python scripts/migrate_plan_recipes.py [--dry-run]
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import mealplans_col
+from app.services.recipe_store import MEAL_KEYS, dehydrate_plan, recipe_hash
+
+
+def main(dry_run: bool = False):
+    embedded = {"$or": [{k: {"$type": "object"}} for k in MEAL_KEYS]}
+    plans = 0
+    hashes = set()
+    for doc in mealplans_col.find(embedded):
+        plans += 1
+        if dry_run:
+            hashes.update(recipe_hash(doc[k]) for k in MEAL_KEYS if isinstance(doc.get(k), dict) and doc.get(k))
+            continue
+        slim = dehydrate_plan(doc)
+        hashes.update((slim.get("recipe_refs") or {}).values())
+        unset = {k: "" for k in MEAL_KEYS if k in doc}
+        mealplans_col.update_one({"_id": doc["_id"]}, {"$set": {"recipe_refs": slim.get("recipe_refs", {})}, "$unset": unset})
+    print(f"{'Would migrate' if dry_run else 'Migrated'} {plans} plan(s) referencing {len(hashes)} distinct recipe(s)")
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv)
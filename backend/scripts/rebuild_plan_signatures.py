@@ -0,0 +1,41 @@
+"""
+Rebuild the MinHash/LSH index (`plan_signatures`) used for similar-plan reuse.
+
+Plans are indexed incrementally as they are saved; run this after changing
+PLAN_SIMILARITY_BANDS/ROWS, after bulk imports, or to drop stale entries.
+
+--report estimates the hit rate offline: every indexed plan's ingredient set is
+looked up as if it were a pantry, counting matches from *other* users at
+PLAN_SIMILARITY_THRESHOLD. The live rate is plan_similarity_hit_ratio on /metrics.
+
+Usage: MONGO_URI=... python scripts/rebuild_plan_signatures.py [--dry-run] [--report]
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.config import PLAN_SIMILARITY_THRESHOLD
+from app.database import plan_signatures_col
+from app.services.plan_similarity import find_candidates, rebuild_index
+
+
+def report():
+    total = hits = 0
+    for sig in plan_signatures_col.find({}, {"user_id": 1, "ingredients": 1}):
+        total += 1
+        if find_candidates(set(sig.get("ingredients") or []), exclude_user=sig.get("user_id")):
+            hits += 1
+    rate = hits / total if total else 0.0
+    print(f"Estimated hit rate at threshold {PLAN_SIMILARITY_THRESHOLD}: {hits}/{total} ({rate:.1%})")
+
+
+def main(dry_run: bool = False, with_report: bool = False):
+    indexed = rebuild_index(dry_run=dry_run)
+    print(f"{'Would index' if dry_run else 'Indexed'} {indexed} plan(s)")
+    if with_report:
+        report()
+
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv, with_report="--report" in sys.argv)
@@ -0,0 +1,5 @@
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "mongo: needs a real MongoDB at MONGO_TEST_URI (explain plans); the CI backend-tests job provides one",
+    )
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+mongomock = pytest.importorskip("mongomock")
+
+from fastapi import HTTPException
+
+from app.auth import create_access_token, token_subject
+from app.routes.agentic_routes import _stream_user
+from app.services import agentic_jobs
+from app.services.agentic_jobs import create_stream_token, stream_token_user
+
+USER = "a@example.com"
+
+
+@pytest.fixture
+def col(monkeypatch):
+    collection = mongomock.MongoClient().db.agentic_jobs
+    monkeypatch.setattr(agentic_jobs, "agentic_jobs_col", collection)
+    monkeypatch.setattr(agentic_jobs, "_semaphore", None)
+    return collection
+
+
+async def _pipeline(stages):
+    await stages.start("plan")
+    await stages.succeed("plan")
+    await stages.start("whatsapp")
+    await stages.skip("whatsapp")
+    return {"ok": True}
+
+
+async def _failing_pipeline(stages):
+    await stages.start("plan")
+    raise HTTPException(status_code=429, detail="Too many plan generations")
+
+
+async def _run_job(pipeline):
+    job_id = await agentic_jobs.create_job(USER, "agentic_run", {"meal": "lunch"})
+    agentic_jobs.launch(job_id, pipeline)
+    await asyncio.gather(*agentic_jobs._tasks)
+    return job_id
+
+
+def test_job_records_stages_and_result(col):
+    job_id = asyncio.run(_run_job(_pipeline))
+    job = asyncio.run(agentic_jobs.get_job(str(job_id), USER))
+    assert (job["id"], job["status"], job["result"]) == (str(job_id), "succeeded", {"ok": True})
+    assert job["request"] == {"meal": "lunch"}
+    assert job["stages"]["plan"]["status"] == "succeeded"
+    assert job["stages"]["plan"]["duration_ms"] >= 0
+    assert job["stages"]["whatsapp"]["status"] == "skipped"
+    assert "expires_at" not in job
+
+
+def test_failed_job_cancels_running_stages(col):
+    job_id = asyncio.run(_run_job(_failing_pipeline))
+    job = asyncio.run(agentic_jobs.get_job(str(job_id), USER))
+    assert job["status"] == "failed"
+    assert job["error"] == {"status_code": 429, "detail": "Too many plan generations"}
+    assert job["stages"]["plan"]["status"] == "cancelled"
+
+
+def test_jobs_are_only_visible_to_their_owner(col):
+    job_id = asyncio.run(agentic_jobs.create_job(USER, "agentic_run", {}))
+    assert asyncio.run(agentic_jobs.get_job(str(job_id), USER))["status"] == "queued"
+    assert asyncio.run(agentic_jobs.get_job(str(job_id), "b@example.com")) is None
+    assert asyncio.run(agentic_jobs.get_job("not-an-id", USER)) is None
+
+
+def test_event_stream_sends_stages_then_done(col):
+    async def scenario():
+        job_id = await agentic_jobs.create_job(USER, "agentic_run", {})
+        agentic_jobs.launch(job_id, _pipeline)
+        frames = [frame async for frame in agentic_jobs.stream_job_events(str(job_id), USER)]
+        await asyncio.gather(*agentic_jobs._tasks)
+        return frames
+
+    frames = [f for f in asyncio.run(scenario()) if not f.startswith(":")]
+    events = [(f.split("\n")[0], json.loads(f.split("\n")[1][len("data: "):])) for f in frames]
+    assert events[-1][0] == "event: done"
+    assert events[-1][1]["status"] == "succeeded"
+    # Intermediate transitions may be coalesced, the final one of each stage is always sent
+    last = {data["name"]: data["status"] for kind, data in events if kind == "event: stage"}
+    assert last == {"plan": "succeeded", "whatsapp": "skipped"}
+    assert agentic_jobs._wakeups == {}
+
+
+def test_event_stream_for_unknown_or_foreign_job(col):
+    async def scenario(job_id, user_id):
+        return [f async for f in agentic_jobs.stream_job_events(job_id, user_id)]
+
+    job_id = asyncio.run(agentic_jobs.create_job(USER, "agentic_run", {}))
+    assert asyncio.run(scenario("0" * 24, USER))[0].startswith("event: error")
+    assert asyncio.run(scenario(str(job_id), "b@example.com"))[0].startswith("event: error")
+
+
+def test_stale_jobs_are_failed(col):
+    old = (datetime.utcnow() - timedelta(minutes=30)).isoformat()
+    fresh = datetime.utcnow().isoformat()
+    col.insert_many([
+        {"user_id": USER, "status": "running", "updated_at": old},
+        {"user_id": USER, "status": "queued", "updated_at": old},
+        {"user_id": USER, "status": "running", "updated_at": fresh},
+        {"user_id": USER, "status": "succeeded", "updated_at": old},
+    ])
+    assert agentic_jobs.fail_stale_jobs(stale_minutes=5) == 2
+    assert sorted(j["status"] for j in col.find()) == ["failed", "failed", "running", "succeeded"]
+    failed = col.find_one({"status": "failed"})
+    assert failed["error"]["status_code"] == 503
+
+
+class _Request:
+    def __init__(self, authorization=""):
+        self.headers = {"authorization": authorization} if authorization else {}
+
+
+def test_stream_token_is_scoped_to_one_job():
+    token = create_stream_token("job1", USER)
+    assert stream_token_user(token, "job1") == USER
+    assert stream_token_user(token, "job2") is None
+    # Not usable as an access token
+    assert token_subject(token) is None
+    assert _stream_user("job1", _Request(), stream_token=token) == USER
+    with pytest.raises(HTTPException):
+        _stream_user("job2", _Request(), stream_token=token)
+    # An access token is accepted in the header only, not in the URL
+    access = create_access_token({"sub": USER})
+    assert _stream_user("job1", _Request(f"Bearer {access}")) == USER
+    with pytest.raises(HTTPException):
+        _stream_user("job1", _Request(), stream_token=access)
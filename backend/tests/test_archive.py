@@ -0,0 +1,137 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.services import archive
+
+USER = "a@example.com"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(archive, "mealplans_col", database.meal_plans)
+    monkeypatch.setattr(archive, "mealplan_archives_col", database.meal_plan_archives)
+    monkeypatch.setattr(archive, "plan_signatures_col", database.plan_signatures)
+    return database
+
+
+def _day(days_ago: int) -> str:
+    return (datetime.utcnow().date() - timedelta(days=days_ago)).isoformat()
+
+
+def _plan(date: str, user: str = USER, **extra) -> dict:
+    return {"user_id": user, "date": date, "created_at": f"{date}T07:00:00", "breakfast": {"recipe_name": "Poha"}, **extra}
+
+
+def test_archive_groups_by_user_and_month_then_deletes(db):
+    db.meal_plans.insert_many([
+        _plan("2023-01-05"), _plan("2023-01-20"), _plan("2023-02-01"),
+        _plan("2023-01-07", user="b@example.com"), _plan(_day(0)),
+    ])
+    db.plan_signatures.insert_many([{"_id": p["_id"], "user_id": p["user_id"]} for p in db.meal_plans.find()])
+    assert archive.archive_old_plans(max_age_days=30, dry_run=True)["plans"] == 4
+    assert db.meal_plans.count_documents({}) == 5
+
+    stats = archive.archive_old_plans(max_age_days=30)
+    assert (stats["plans"], stats["bundles"]) == (4, 3)
+    assert [p["date"] for p in db.meal_plans.find()] == [_day(0)]
+    # Similarity signatures of archived plans go with them
+    assert [s["_id"] for s in db.plan_signatures.find()] == [p["_id"] for p in db.meal_plans.find()]
+    bundle = db.meal_plan_archives.find_one({"_id": f"{USER}|2023-01"})
+    assert (bundle["count"], bundle["first_date"], bundle["last_date"]) == (2, "2023-01-05", "2023-01-20")
+    assert [p["date"] for p in archive._decompress(bundle["data"])] == ["2023-01-05", "2023-01-20"]
+
+
+def test_rerun_merges_bundle_by_id(db):
+    db.meal_plans.insert_many([_plan("2023-01-05"), _plan("2023-01-20")])
+    archive.archive_old_plans(max_age_days=30)
+    # A late plan for the same month, and a re-archived copy of an existing one
+    [first] = archive._decompress(db.meal_plan_archives.find_one()["data"])[:1]
+    db.meal_plans.insert_many([_plan("2023-01-10"), {**first, "breakfast": {"recipe_name": "Upma"}}])
+    archive.archive_old_plans(max_age_days=30)
+    plans = archive._decompress(db.meal_plan_archives.find_one()["data"])
+    assert [p["date"] for p in plans] == ["2023-01-05", "2023-01-10", "2023-01-20"]
+    assert plans[0]["breakfast"] == {"recipe_name": "Upma"}
+    assert db.meal_plan_archives.count_documents({}) == 1
+
+
+def test_interrupted_run_leaves_duplicates_not_gaps(db, monkeypatch):
+    db.meal_plans.insert_many([_plan("2023-01-05"), _plan("2023-02-05")])
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("worker killed")
+
+    with monkeypatch.context() as m:
+        m.setattr(db.meal_plans, "delete_many", crash)
+        with pytest.raises(RuntimeError):
+            archive.archive_old_plans(max_age_days=30)
+    # The January bundle was written but its plan is still hot: reads show it once
+    assert db.meal_plan_archives.count_documents({}) == 1
+    assert db.meal_plans.count_documents({}) == 2
+    history = archive.load_plan_history(USER)
+    assert [p["date"] for p in history] == ["2023-02-05", "2023-01-05"]
+    assert not any(p.get("archived") for p in history)
+
+    archive.archive_old_plans(max_age_days=30)
+    assert db.meal_plans.count_documents({}) == 0
+    assert [b["count"] for b in db.meal_plan_archives.find().sort("_id", 1)] == [1, 1]
+    assert [p["date"] for p in archive.load_plan_history(USER)] == ["2023-02-05", "2023-01-05"]
+
+
+def test_history_merges_hot_and_cold_newest_first(db):
+    db.meal_plans.insert_many([_plan("2023-01-05"), _plan("2023-03-01"), _plan("2023-03-02")])
+    archive.archive_old_plans(max_age_days=30)
+    db.meal_plans.insert_many([_plan(_day(1)), _plan(_day(0))])
+
+    history = archive.load_plan_history(USER)
+    assert [p["date"] for p in history] == [_day(0), _day(1), "2023-03-02", "2023-03-01", "2023-01-05"]
+    assert [bool(p.get("archived")) for p in history] == [False, False, True, True, True]
+
+    # The limit is filled from the hot tier first, then from bundles
+    assert [p["date"] for p in archive.load_plan_history(USER, limit=3)] == [_day(0), _day(1), "2023-03-02"]
+    # Date ranges apply to archived plans too
+    ranged = archive.load_plan_history(USER, date_from="2023-03-01", date_to="2023-03-01")
+    assert [p["date"] for p in ranged] == ["2023-03-01"]
+    trimmed = archive.load_plan_history(USER, date_to="2023-01-31", recipe_fields=["recipe_name"])
+    assert trimmed[0]["breakfast"] == {"recipe_name": "Poha"}
+
+
+def _page_through(limit, **kwargs):
+    pages, before = [], None
+    while True:
+        page = archive.load_plan_history(USER, limit=limit, before=before, **kwargs)
+        pages.append(page)
+        if len(page) < limit:
+            return pages
+        last = page[-1]
+        before = (last["date"], last["created_at"], str(last["_id"]))
+
+
+def test_history_pages_do_not_skip_ties(db):
+    # Three plans share (date, created_at), and a page boundary falls between them
+    db.meal_plans.insert_many([_plan("2024-03-02"), _plan("2024-03-01"), _plan("2024-03-01"), _plan("2024-03-01")])
+    ids = sorted((p["_id"] for p in db.meal_plans.find({"date": "2024-03-01"})), reverse=True)
+    pages = _page_through(2, date_from="2024-03-01")
+    seen = [p["_id"] for page in pages for p in page]
+    assert len(seen) == 4 and len(set(seen)) == 4
+    assert seen[1:] == ids
+
+
+def test_history_merge_orders_ties_across_hot_and_cold(db):
+    db.meal_plans.insert_many([_plan("2023-01-05"), _plan("2023-01-05")])
+    archive.archive_old_plans(max_age_days=30)
+    # A hot plan with the same (date, created_at) as the archived ones
+    db.meal_plans.insert_one(_plan("2023-01-05"))
+    expected = [str(i) for i in sorted(
+        [db.meal_plans.find_one()["_id"]] + [p["_id"] for p in archive._decompress(db.meal_plan_archives.find_one()["data"])],
+        reverse=True)]
+    assert [str(p["_id"]) for p in archive.load_plan_history(USER)] == expected
+    pages = _page_through(1)
+    assert [str(p["_id"]) for page in pages for p in page] == expected
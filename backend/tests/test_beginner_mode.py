@@ -0,0 +1,118 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import beginner_mode
+from app.services.beginner_mode import TOOLS_LINE, TemplateCatalog, apply_beginner_mode, get_catalog
+
+
+def test_single_covering_template_replaces_steps():
+    plan = {"lunch": {"steps": ["Cook dal."], "ingredients_used": [
+        {"name": "Chana Dal", "quantity": 500, "unit": "g"},
+        {"name": "moong dal", "quantity": 100, "unit": "g"},
+        {"name": "salt", "quantity": 1, "unit": "tsp"},
+    ]}}
+    steps = apply_beginner_mode(plan)["lunch"]["steps"]
+    assert steps[:2] == [TOOLS_LINE, "Measure 500 g chana dal using a measuring cup."]
+    assert "Cook dal." not in steps and steps.count(TOOLS_LINE) == 1
+
+
+def test_recipe_spanning_several_templates_keeps_its_steps():
+    own = [f"Biryani step {i}." for i in range(1, 19)]
+    plan = {"dinner": {"recipe_name": "Chicken Biryani", "steps": list(own), "ingredients_used": [
+        {"name": name, "quantity": 1, "unit": "pcs"} for name in ("rice", "chicken", "onion", "tomato", "salt", "oil")
+    ]}}
+    steps = apply_beginner_mode(plan)["dinner"]["steps"]
+    # Every original step survives (no 16-step cap) and the tools line appears once
+    assert steps == [TOOLS_LINE] + own
+    assert steps.count(TOOLS_LINE) == 1
+
+
+def test_ingredient_outside_the_template_keeps_its_steps():
+    plan = {"breakfast": {"steps": ["Blend banana with saffron milk."], "ingredients_used": [
+        {"name": "Bananas", "quantity": 2, "unit": "pcs"}, {"name": "saffron", "quantity": 1, "unit": "g"}]}}
+    steps = apply_beginner_mode(plan)["breakfast"]["steps"]
+    assert steps[:2] == [TOOLS_LINE, "Blend banana with saffron milk."]
+    assert "Peel 2 pcs bananas." not in steps
+
+
+def test_tools_line_is_emitted_once():
+    catalog = get_catalog()
+    tools = [idx for idx, t in enumerate(catalog.templates) if t.get("tools")][:2]
+    rendered = catalog.render(tuple((idx, "x", "1 pc") for idx in tools))
+    assert rendered.count(TOOLS_LINE) == 1 and rendered[0] == TOOLS_LINE
+    # Applying twice neither repeats the tools line nor the padding
+    plan = {"lunch": {"steps": ["Eat."], "ingredients_used": [{"name": "saffron"}]}}
+    once = list(apply_beginner_mode(plan)["lunch"]["steps"])
+    assert apply_beginner_mode(plan)["lunch"]["steps"] == once
+
+
+def test_corpus_recipes_are_never_rewritten():
+    recipe = {"source": "local_corpus", "steps": ["Rinse 1 cup rice."],
+              "ingredients_used": [{"name": "rice", "quantity": 1, "unit": "cup"}]}
+    assert apply_beginner_mode({"lunch": recipe})["lunch"]["steps"] == ["Rinse 1 cup rice."]
+
+
+def test_unmatched_recipe_keeps_its_steps():
+    plan = {"dinner": {"steps": ["Steep saffron."], "ingredients_used": [{"name": "saffron", "quantity": 1, "unit": "g"}]}}
+    steps = apply_beginner_mode(plan)["dinner"]["steps"]
+    assert steps[:2] == [TOOLS_LINE, "Steep saffron."]
+    assert len(steps) == 6
+
+
+def test_bundled_catalog_covers_common_pantry_items():
+    catalog = get_catalog()
+    assert len(catalog) >= 500
+    for name in ("Basmati Rice", "Tomatoes", "paneer", "Chicken Breast", "Spinach", "Mangoes", "Almonds", "Atta"):
+        assert catalog.picks([{"name": name, "quantity": 1, "unit": "kg"}]), name
+    # Each name belongs to the template that lists it, and every template renders
+    for idx, template in enumerate(catalog.templates):
+        for name in template["ingredients"]:
+            assert catalog.picks([{"name": name}])[0][0] == idx, name
+        assert catalog.render(((idx, "x", "1 pc"),))
+
+
+def test_large_catalog_lookup_and_render_cache(monkeypatch):
+    templates = [{"id": f"t{i}", "priority": i, "ingredients": [f"item {i}", f"alias {i}"],
+                  "default_quantity": "1 pc", "steps": [f"Prepare {{quantity}} {{name}} ({i})."]}
+                 for i in range(500)]
+    catalog = TemplateCatalog(templates, version="test-large")
+    assert len(catalog) == 1000
+    monkeypatch.setattr(beginner_mode, "_catalog", catalog)
+    assert catalog.picks([{"name": "Alias 7", "quantity": 2, "unit": "pcs"}, {"name": "item 3"}]) == (
+        (3, "item 3", "1 pc"), (7, "alias 7", "2 pcs"))
+    recipe = {"ingredients_used": [{"name": "Alias 7", "quantity": 2, "unit": "pcs"}, {"name": "item 7"}]}
+    before = beginner_mode._rendered_steps.cache_info().hits
+    first = beginner_mode._build_beginner_steps(recipe)
+    second = beginner_mode._build_beginner_steps(recipe)
+    assert first == second and first[0] == "Prepare 2 pcs alias 7 (7)."
+    assert beginner_mode._rendered_steps.cache_info().hits == before + 1
+    # Callers get their own list, not the cached one
+    first.append("x")
+    assert beginner_mode._build_beginner_steps(recipe) == second
+    assert get_catalog() is catalog
+
+
+def test_local_plans_get_beginner_steps(monkeypatch):
+    from app.services import plan_generation
+
+    corpus = {k: {"steps": ["Boil rice."], "ingredients_used": [{"name": "rice", "quantity": 1, "unit": "kg"}]}
+              for k in ("breakfast", "lunch", "dinner")}
+    monkeypatch.setattr(plan_generation, "PLAN_SIMILARITY_REUSE", False)
+    monkeypatch.setattr(plan_generation, "LOCAL_CORPUS_FIRST", True)
+    monkeypatch.setattr(plan_generation, "BEGINNER_MODE", True)
+    monkeypatch.setattr(plan_generation, "corpus_meal_plan", lambda items: corpus)
+    monkeypatch.setattr(plan_generation, "_local_meal_plan", lambda items: corpus)
+    items = [{"name": "rice", "quantity": 1, "unit": "kg"}]
+    assert plan_generation.local_plan(items)["dinner"]["steps"][0] == TOOLS_LINE
+    # Corpus plans keep their curated steps
+    curated = {k: {"source": "local_corpus", "steps": ["Boil rice."], "ingredients_used": items}
+               for k in ("breakfast", "lunch", "dinner")}
+    monkeypatch.setattr(plan_generation, "corpus_meal_plan", lambda items: curated)
+    assert plan_generation.generate_plan("u", items)["lunch"]["steps"] == ["Boil rice."]
+
+    monkeypatch.setattr(plan_generation, "BEGINNER_MODE", False)
+    fresh = {"lunch": {"steps": ["Boil rice."]}}
+    monkeypatch.setattr(plan_generation, "corpus_meal_plan", lambda items: fresh)
+    assert plan_generation.generate_plan("u", items)["lunch"]["steps"] == ["Boil rice."]
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+mongomock = pytest.importorskip("mongomock")
+
+from app import idempotency
+from app.auth import create_access_token
+from app.idempotency import IdempotencyMiddleware
+
+PATH = "/mealplan/save-now"
+
+
+@pytest.fixture
+def col(monkeypatch):
+    collection = mongomock.MongoClient().db.idempotency_keys
+    monkeypatch.setattr(idempotency, "idempotency_col", collection)
+    return collection
+
+
+class App:
+    """Counts calls; answers with `status` after `gate` (if any) is set."""
+
+    def __init__(self, status=200, gate=None):
+        self.calls = 0
+        self.status = status
+        self.gate = gate
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = (await receive())["body"]
+        if self.gate is not None:
+            await self.gate.wait()
+        payload = json.dumps({"call": self.calls, "echo": body.decode()}).encode()
+        await send({"type": "http.response.start", "status": self.status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+
+async def _post(middleware, body=b"{}", key="k1", query=b"", user="a@example.com", path=PATH):
+    headers = [(b"idempotency-key", key.encode())]
+    if user:
+        headers.append((b"authorization", f"Bearer {create_access_token({'sub': user})}".encode()))
+    scope = {"type": "http", "method": "POST", "path": path, "query_string": query, "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), json.loads(sent[1]["body"])
+
+
+def test_replays_first_response(col):
+    app = App()
+    mw = IdempotencyMiddleware(app)
+    status, headers, body = asyncio.run(_post(mw))
+    assert (status, body["call"]) == (200, 1)
+    assert b"idempotent-replayed" not in headers
+    status, headers, body = asyncio.run(_post(mw))
+    assert (status, body["call"]) == (200, 1)
+    assert headers[b"idempotent-replayed"] == b"true"
+    assert app.calls == 1
+    assert col.find_one()["status"] == "completed"
+
+
+def test_same_key_with_different_request_is_422(col):
+    mw = IdempotencyMiddleware(App())
+    asyncio.run(_post(mw, body=b'{"a": 1}', query=b"mode=job"))
+    assert asyncio.run(_post(mw, body=b'{"a": 2}', query=b"mode=job"))[0] == 422
+    # Same body, different query string
+    assert asyncio.run(_post(mw, body=b'{"a": 1}', query=b"mode=provisional"))[0] == 422
+
+
+def test_concurrent_duplicate_waits_for_original(col):
+    async def scenario():
+        gate = asyncio.Event()
+        app = App(gate=gate)
+        mw = IdempotencyMiddleware(app)
+        first = asyncio.ensure_future(_post(mw))
+        while not col.find_one():
+            await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(_post(mw))
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        gate.set()
+        return app, await first, await second
+
+    app, first, second = asyncio.run(scenario())
+    assert app.calls == 1
+    assert first[2] == second[2]
+    assert second[1][b"idempotent-replayed"] == b"true"
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_throttled_or_failed_response_releases_key(col, status):
+    app = App(status=status)
+    mw = IdempotencyMiddleware(app)
+    assert asyncio.run(_post(mw))[0] == status
+    assert col.count_documents({}) == 0
+    asyncio.run(_post(mw))
+    assert app.calls == 2
+
+
+def test_expired_pending_lease_is_taken_over(col):
+    app = App()
+    mw = IdempotencyMiddleware(app)
+    asyncio.run(_post(mw))
+    # Simulate an original whose worker died before storing its response
+    col.update_one({}, {"$set": {"status": "pending", "owner": "dead-worker",
+                                 "pending_until": datetime.utcnow() - timedelta(seconds=1)}})
+    status, _, body = asyncio.run(_post(mw))
+    assert (status, body["call"]) == (200, 2)
+    record = col.find_one()
+    assert record["status"] == "completed" and record["owner"] != "dead-worker"
+
+
+def test_live_pending_lease_is_not_taken_over(col, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.1)
+    app = App()
+    mw = IdempotencyMiddleware(app)
+    asyncio.run(_post(mw))
+    col.update_one({}, {"$set": {"status": "pending", "owner": "busy-worker",
+                                 "pending_until": datetime.utcnow() + timedelta(minutes=5)}})
+    assert asyncio.run(_post(mw))[0] == 409
+    assert app.calls == 1
+
+
+def test_unauthenticated_and_other_paths_pass_through(col):
+    app = App()
+    mw = IdempotencyMiddleware(app)
+    asyncio.run(_post(mw, user=None))
+    asyncio.run(_post(mw, user=None))
+    asyncio.run(_post(mw, path="/ingredients/bulk"))
+    asyncio.run(_post(mw, path="/ingredients/bulk"))
+    assert app.calls == 4
+    assert col.count_documents({}) == 0
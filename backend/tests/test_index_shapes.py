@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+from pymongo import MongoClient
+
+# Ensure project root is on sys.path for 'app' imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.indexes import apply_indexes, verify_query_shapes
+
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI", "")
+TEST_DB = "recipe_planner_index_check"
+
+
+@pytest.fixture(scope="module")
+def index_db():
+    # mongomock has no query planner, so these need a real server; once
+    # MONGO_TEST_URI is set (as in CI) an unreachable server is a failure
+    if not MONGO_TEST_URI:
+        pytest.skip("needs MongoDB for explain(): set MONGO_TEST_URI (the CI backend-tests job does)")
+    client = MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=5000)
+    try:
+        client.admin.command("ping")
+    except Exception as e:
+        pytest.fail(f"MONGO_TEST_URI={MONGO_TEST_URI} not reachable: {e}")
+    client.drop_database(TEST_DB)
+    yield client[TEST_DB]
+    client.drop_database(TEST_DB)
+
+
+@pytest.mark.mongo
+def test_registry_applies_idempotently(index_db):
+    assert apply_indexes(index_db)
+    assert apply_indexes(index_db) == []
+
+
+@pytest.mark.mongo
+def test_every_query_shape_uses_an_index(index_db):
+    apply_indexes(index_db)
+    assert verify_query_shapes(index_db) == []
+
+
+def test_startup_mode_creates_but_never_rebuilds():
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().db
+    database.meal_plans.create_index([("user_id", 1), ("date", 1)], name="idx_mealplans_user_date")
+    actions = apply_indexes(database, rebuild=False)
+    assert "outdated meal_plans.idx_mealplans_user_date" in actions
+    assert "create users.idx_users_email" in actions
+    assert list(database.meal_plans.index_information()["idx_mealplans_user_date"]["key"]) == [("user_id", 1), ("date", 1)]
+    assert "rebuild meal_plans.idx_mealplans_user_date" in apply_indexes(database)
@@ -0,0 +1,127 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import decode_access_token
+from app.routes import ingredient_routes
+
+USER = "a@example.com"
+
+
+class FakeIngredients:
+    """bulk_upsert that fails items named "bad" (skipping the rest when ordered)."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def bulk_upsert(self, user_id, items, ordered=False):
+        self.calls.append((user_id, items, ordered))
+        results, failed = [], False
+        for item in items:
+            if failed and ordered:
+                results.append({"name": item["name"], "status": "skipped"})
+            elif item["name"] == "bad":
+                failed = True
+                results.append({"name": item["name"], "status": "failed", "error": "write failed"})
+            else:
+                results.append({"name": item["name"], "status": "created"})
+        return results
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    fake = FakeIngredients()
+    monkeypatch.setattr(ingredient_routes, "ingredients", fake)
+    return fake
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(ingredient_routes.router)
+    app.dependency_overrides[decode_access_token] = lambda: USER
+    return TestClient(app)
+
+
+def _statuses(body):
+    return [(r["index"], r["status"]) for r in body["results"]]
+
+
+def test_json_list_and_items_object(client, repo):
+    res = client.post("/ingredients/bulk", json=[{"name": "Rice", "quantity": 1, "unit": "kg"}])
+    assert res.status_code == 200
+    assert res.json()["ok"] and _statuses(res.json()) == [(0, "created")]
+    client.post("/ingredients/bulk", json={"items": [{"name": "Dal", "quantity": 2, "unit": " kg "}], "ordered": True})
+    assert repo.calls[-1] == (USER, [{"name": "Dal", "quantity": 2.0, "unit": "kg"}], True)
+    assert repo.calls[0][2] is False
+
+
+def test_csv_body(client, repo):
+    body = "\ufeffName, Quantity ,unit\nEggs,12,pcs\nMilk, 1 ,l\n"
+    res = client.post("/ingredients/bulk", content=body.encode("utf-8"), headers={"content-type": "text/csv"})
+    assert _statuses(res.json()) == [(0, "created"), (1, "created")]
+    assert repo.calls[0][1] == [{"name": "Eggs", "quantity": 12.0, "unit": "pcs"}, {"name": "Milk", "quantity": 1.0, "unit": "l"}]
+
+
+def test_malformed_bodies_are_rejected(client, repo):
+    assert client.post("/ingredients/bulk", content=b"{not json", headers={"content-type": "application/json"}).status_code == 400
+    assert client.post("/ingredients/bulk", json={"rows": []}).status_code == 400
+    assert repo.calls == []
+
+
+def test_invalid_rows_are_reported_per_item(client, repo):
+    res = client.post("/ingredients/bulk", json=[
+        {"name": "Rice", "quantity": 1, "unit": "kg"},
+        "not an object",
+        {"name": "Dal", "quantity": -1, "unit": "kg"},
+        {"name": "   ", "quantity": 1, "unit": "kg"},
+        {"name": "Oats", "unit": "kg"},
+    ])
+    body = res.json()
+    assert _statuses(body) == [(0, "created"), (1, "invalid"), (2, "invalid"), (3, "invalid"), (4, "invalid")]
+    assert body["results"][2]["error"].startswith("quantity")
+    assert body["results"][3]["error"] == "name: must not be empty"
+    assert not body["ok"] and body["counts"] == {"created": 1, "invalid": 4}
+    assert [i["name"] for i in repo.calls[0][1]] == ["Rice"]
+
+
+def test_duplicates_keep_the_last_canonical_match(client, repo):
+    res = client.post("/ingredients/bulk", json=[
+        {"name": "Eggs", "quantity": 6, "unit": "pcs"},
+        {"name": "Rice", "quantity": 1, "unit": "kg"},
+        {"name": "egg", "quantity": 12, "unit": "pcs"},
+    ])
+    body = res.json()
+    assert _statuses(body) == [(0, "duplicate"), (1, "created"), (2, "created")]
+    assert (body["results"][0]["name"], body["results"][0]["error"]) == ("Eggs", "superseded by item 2")
+    assert repo.calls[0][1] == [{"name": "Rice", "quantity": 1.0, "unit": "kg"}, {"name": "egg", "quantity": 12.0, "unit": "pcs"}]
+
+
+@pytest.mark.parametrize("ordered, expected", [
+    (False, [(0, "created"), (1, "invalid"), (2, "failed"), (3, "created")]),
+    (True, [(0, "created"), (1, "invalid"), (2, "failed"), (3, "skipped")]),
+])
+def test_ordered_and_unordered_results(client, repo, ordered, expected):
+    res = client.post("/ingredients/bulk", json={"ordered": ordered, "items": [
+        {"name": "Rice", "quantity": 1, "unit": "kg"},
+        {"name": "Dal"},
+        {"name": "bad", "quantity": 1, "unit": "kg"},
+        {"name": "Oats", "quantity": 1, "unit": "kg"},
+    ]})
+    assert _statuses(res.json()) == expected
+    assert res.json()["results"][2]["error"] == "write failed"
+
+
+def test_item_limit(client, repo, monkeypatch):
+    monkeypatch.setattr(ingredient_routes, "BULK_MAX_ITEMS", 2)
+    rows = [{"name": f"item {i}", "quantity": 1, "unit": "pcs"} for i in range(3)]
+    res = client.post("/ingredients/bulk", json=rows)
+    assert res.status_code == 413
+    assert repo.calls == []
+    assert client.post("/ingredients/bulk", json=rows[:2]).status_code == 200
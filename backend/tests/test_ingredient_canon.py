@@ -0,0 +1,60 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import ingredient_canon
+from app.services.ingredient_canon import (
+    base_quantity,
+    canonical_name,
+    canonical_unit,
+    canonicalize_ingredient,
+    name_aliases,
+    normalize_recipe_ingredients,
+)
+from app.services.plan_reuse import inventory_fingerprint
+
+
+def test_names_collapse_case_plurals_and_synonyms():
+    assert canonical_name("  Tomatoes ") == "tomato"
+    assert canonical_name("EGGS") == canonical_name("egg") == "egg"
+    assert canonical_name("Green  Chillies") == canonical_name("hari mirch") == "green chili"
+    assert canonical_name("curd") == canonical_name("Dahi") == "yogurt"
+    assert canonical_name("Bread slices") == "bread"
+    assert canonical_name("Berries") == "berry"
+    # Mass nouns and singular words ending in s stay as written
+    for name in ("oats", "peas", "chickpeas", "hummus", "couscous", "glass"):
+        assert canonical_name(name) == name
+
+
+def test_canonical_names_are_fixed_points():
+    for name in set(ingredient_canon._SYNONYMS.values()) | ingredient_canon._INVARIANT:
+        assert canonical_name(name) == name
+
+
+def test_units_and_dozen_conversion():
+    assert canonical_unit("Grams") == ("g", 1)
+    assert canonical_unit("pieces") == ("pcs", 1)
+    assert canonical_unit("dozen") == ("pcs", 12)
+    assert canonical_unit("bunch") == ("bunch", 1)
+    item = canonicalize_ingredient({"name": " Eggs ", "quantity": 1, "unit": "Dozen"})
+    assert item == {"name": "Eggs", "name_key": "egg", "quantity": 12.0, "unit": "pcs"}
+    assert canonicalize_ingredient({"quantity": 2}) == {"quantity": 2}
+    assert normalize_recipe_ingredients([{"name": " Eggs ", "quantity": 2, "unit": "dozen"}, {}]) == [
+        {"name": "Eggs", "quantity": 24.0, "unit": "pcs"},
+        {"name": "Unknown", "quantity": None, "unit": None},
+    ]
+
+
+def test_base_quantity_and_fingerprint_across_units():
+    assert base_quantity(1.5, "kg") == (1500.0, "g")
+    assert base_quantity(2, "tbsp") == (30.0, "ml")
+    assert base_quantity("lots", "g") == (None, "g")
+    a = [{"name": "Eggs", "quantity": 1, "unit": "dozen"}, {"name": "Rice", "quantity": 1, "unit": "kg"}]
+    b = [{"name": "rice", "quantity": 1000, "unit": "grams"}, {"name": "egg", "quantity": 12, "unit": "pcs"}]
+    assert inventory_fingerprint(a) == inventory_fingerprint(b)
+
+
+def test_name_aliases_cover_legacy_spelling():
+    assert name_aliases(" Eggs ") == ["Eggs", "egg"]
+    assert name_aliases("rice") == ["rice"]
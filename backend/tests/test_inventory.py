@@ -0,0 +1,139 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.services import inventory
+
+USER = "a@example.com"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(inventory, "ingredients_col", database.ingredients)
+    monkeypatch.setattr(inventory, "inventories_col", database.inventories)
+    return database
+
+
+def _layout(monkeypatch, layout):
+    monkeypatch.setattr(inventory, "INGREDIENT_LAYOUT", layout)
+
+
+def test_mutate_retries_on_revision_conflict(db, monkeypatch):
+    _layout(monkeypatch, "inventory")
+    inventory.insert_ingredient(USER, {"name": "rice", "quantity": 1, "unit": "kg"})
+    calls = []
+
+    def mutate(items):
+        calls.append(len(items))
+        if len(calls) == 1:
+            # Another writer bumps rev between our read and our write
+            db.inventories.update_one({"_id": USER}, {"$inc": {"rev": 1}})
+        items.append({"_id": "x", "name": "dal"})
+        return "done"
+
+    assert inventory._mutate_inventory(USER, mutate) == "done"
+    assert calls == [1, 1]
+    doc = db.inventories.find_one({"_id": USER})
+    assert [i["name"] for i in doc["items"]] == ["rice", "dal"]
+    assert doc["rev"] == 3
+
+
+def test_mutate_gives_up_after_repeated_conflicts(db, monkeypatch):
+    _layout(monkeypatch, "inventory")
+    inventory.insert_ingredient(USER, {"name": "rice", "quantity": 1, "unit": "kg"})
+
+    def mutate(items):
+        db.inventories.update_one({"_id": USER}, {"$inc": {"rev": 1}})
+
+    with pytest.raises(RuntimeError):
+        inventory._mutate_inventory(USER, mutate)
+
+
+def test_dual_layout_reads_documents_until_materialized(db, monkeypatch):
+    db.ingredients.insert_one({"user_id": USER, "name": "rice", "quantity": 1, "unit": "kg"})
+    _layout(monkeypatch, "dual")
+    assert [i["name"] for i in inventory.list_ingredients(USER)] == ["rice"]
+    assert inventory.get_revision(USER) == 0
+    # The first write materializes the inventory from the per-item documents
+    inventory.insert_ingredient(USER, {"name": "Eggs", "quantity": 1, "unit": "dozen"})
+    assert inventory.get_revision(USER) == 1
+    db.ingredients.delete_many({})
+    assert [(i["name"], i["quantity"]) for i in inventory.list_ingredients(USER)] == [("rice", 1), ("Eggs", 12.0)]
+
+
+def test_items_keep_unknown_fields(db, monkeypatch):
+    _layout(monkeypatch, "inventory")
+    inventory.insert_ingredient(USER, {"name": "rice", "quantity": 1, "unit": "kg", "brand": "Acme"})
+    inventory.update_ingredient(USER, "Rice", {"quantity": 2, "expires_on": "2024-06-01"})
+    [item] = inventory.list_ingredients(USER)
+    assert (item["brand"], item["expires_on"], item["quantity"]) == ("Acme", "2024-06-01", 2)
+    assert "user_id" not in item
+
+
+def test_migrate_user_copies_documents(db, monkeypatch):
+    _layout(monkeypatch, "documents")
+    db.ingredients.insert_many([
+        {"user_id": USER, "name": "rice", "quantity": 1, "unit": "kg", "created_at": datetime(2024, 1, 1)},
+        {"user_id": USER, "name": "dal", "quantity": 500, "unit": "g"},
+        {"user_id": "other@example.com", "name": "oats", "quantity": 1, "unit": "kg"},
+    ])
+    assert inventory.migrate_user(USER) == 2
+    assert inventory.migrate_user(USER) == 2
+    doc = db.inventories.find_one({"_id": USER})
+    assert doc["rev"] == 2
+    assert [i["name"] for i in doc["items"]] == ["rice", "dal"]
+    assert doc["items"][0]["_id"] == db.ingredients.find_one({"name": "rice"})["_id"]
+
+
+@pytest.mark.parametrize("layout", ["documents", "inventory"])
+def test_bulk_upsert_matches_canonical_and_legacy_names(db, monkeypatch, layout):
+    _layout(monkeypatch, layout)
+    # A legacy row without name_key, under a different spelling of the same ingredient
+    if layout == "documents":
+        db.ingredients.insert_one({"user_id": USER, "name": "egg", "quantity": 2, "unit": "pcs"})
+    else:
+        db.inventories.insert_one({"_id": USER, "rev": 1, "items": [{"_id": "e", "name": "egg", "quantity": 2, "unit": "pcs"}]})
+    # (mongomock numbers upserts by their own count, so the new item goes first)
+    results = inventory.bulk_upsert(USER, [
+        {"name": "Tomatoes", "quantity": 3, "unit": "pieces"},
+        {"name": "EGGS", "quantity": 1, "unit": "dozen"},
+    ], ordered=True)
+    assert results == [{"name": "Tomatoes", "status": "created"}, {"name": "EGGS", "status": "updated"}]
+    items = {i["name_key"]: i for i in inventory.list_ingredients(USER)}
+    assert set(items) == {"tomato", "egg"}
+    assert (items["egg"]["name"], items["egg"]["quantity"], items["egg"]["unit"]) == ("EGGS", 12.0, "pcs")
+    assert items["tomato"]["name"] == "Tomatoes"
+    assert isinstance(items["tomato"]["created_at"], datetime)
+    assert "created_at" not in items["egg"]
+
+
+@pytest.mark.parametrize("layout", ["documents", "inventory"])
+def test_display_name_is_kept_and_lookups_use_the_key(db, monkeypatch, layout):
+    _layout(monkeypatch, layout)
+    inventory.insert_ingredient(USER, {"name": "Basmati Rice", "quantity": 1, "unit": "kg"})
+    [item] = inventory.list_ingredients(USER)
+    assert (item["name"], item["name_key"]) == ("Basmati Rice", "rice")
+    assert inventory.update_ingredient(USER, "rice", {"quantity": 2}) == 1
+    assert inventory.list_ingredients(USER)[0]["quantity"] == 2
+    assert inventory.delete_ingredient(USER, "chawal") == 1
+    assert inventory.list_ingredients(USER) == []
+
+
+def test_canonicalize_user_backfills_keys_and_keeps_names(db, monkeypatch):
+    _layout(monkeypatch, "documents")
+    db.ingredients.insert_many([
+        {"user_id": USER, "name": "Eggs", "quantity": 1, "unit": "dozen"},
+        {"user_id": USER, "name": "egg", "quantity": 6, "unit": "pcs"},
+        {"user_id": USER, "name": "Basmati Rice", "quantity": 1, "unit": "kg"},
+    ])
+    assert inventory.canonicalize_user(USER, dry_run=True) == 4
+    inventory.canonicalize_user(USER)
+    rows = sorted((d["name_key"], d["name"], d["quantity"]) for d in db.ingredients.find())
+    assert rows == [("egg", "egg", 6), ("rice", "Basmati Rice", 1)]
@@ -0,0 +1,110 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.auth import decode_access_token
+from app.routes import mealplan_routes
+from app.routes.mealplan_routes import _decode_cursor, _encode_cursor
+from app.services import archive, recipe_store
+from app.services.archive import _trim_recipes
+
+USER = "a@example.com"
+
+
+def test_history_cursor_round_trips():
+    plan = {"date": "2024-03-01", "created_at": "2024-03-01T07:00:00.123456", "id": "65e1a2b3c4d5e6f708192a3b"}
+    assert _decode_cursor(_encode_cursor(plan)) == ("2024-03-01", "2024-03-01T07:00:00.123456", "65e1a2b3c4d5e6f708192a3b")
+    with pytest.raises(HTTPException):
+        _decode_cursor("not-a-cursor")
+
+
+def test_trim_recipes_keeps_requested_fields_only():
+    plan = {"date": "2024-03-01", "breakfast": {"recipe_name": "Poha", "steps": ["Rinse"]}, "lunch": None}
+    assert _trim_recipes(plan, ["recipe_name"]) == {"date": "2024-03-01", "breakfast": {"recipe_name": "Poha"}, "lunch": None}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(archive, "mealplans_col", database.meal_plans)
+    monkeypatch.setattr(archive, "mealplan_archives_col", database.meal_plan_archives)
+    monkeypatch.setattr(archive, "plan_signatures_col", database.plan_signatures)
+    monkeypatch.setattr(recipe_store, "recipes_col", database.recipes)
+    return database
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(mealplan_routes.router)
+    app.dependency_overrides[decode_access_token] = lambda: USER
+    return TestClient(app)
+
+
+def _day(days_ago: int) -> str:
+    return (datetime.utcnow().date() - timedelta(days=days_ago)).isoformat()
+
+
+def _plan(date: str, created_at: str = "07:00:00", user: str = USER) -> dict:
+    return {"user_id": user, "date": date, "created_at": f"{date}T{created_at}", "origin": "manual_api",
+            "breakfast": {"recipe_name": f"Poha {date}", "steps": ["Rinse poha."]}}
+
+
+def _pages(client, limit, **params):
+    items, cursor = [], None
+    while True:
+        res = client.get("/mealplan/history", params={"limit": limit, **params, **({"cursor": cursor} if cursor else {})})
+        assert res.status_code == 200
+        body = res.json()
+        items += body["items"]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return items
+
+
+def test_paging_across_ties_has_no_duplicates_or_gaps(db, client):
+    # Five plans share date and created_at; only _id orders them
+    db.meal_plans.insert_many([_plan(_day(1)) for _ in range(5)] + [_plan(_day(0)), _plan(_day(2)), _plan(_day(1), user="b@example.com")])
+    expected = [str(p["_id"]) for p in db.meal_plans.find({"user_id": USER}).sort(
+        [("date", -1), ("created_at", -1), ("_id", -1)])]
+    for limit in (1, 2, 3):
+        assert [p["id"] for p in _pages(client, limit)] == expected
+    assert all("user_id" not in p for p in _pages(client, 2))
+
+
+def test_date_filters_are_inclusive_and_validated(db, client):
+    db.meal_plans.insert_many([_plan(_day(n)) for n in range(5)])
+    items = _pages(client, 10, date_from=_day(3), date_to=_day(1))
+    assert [p["date"] for p in items] == [_day(1), _day(2), _day(3)]
+    assert client.get("/mealplan/history", params={"date_from": "yesterday"}).status_code == 400
+
+
+def test_fields_keep_only_requested_recipe_fields(db, client):
+    db.meal_plans.insert_one(_plan(_day(0)))
+    [item] = client.get("/mealplan/history", params={"fields": "recipe_name"}).json()["items"]
+    assert item["breakfast"] == {"recipe_name": f"Poha {_day(0)}"}
+    assert (item["date"], item["origin"]) == (_day(0), "manual_api")
+
+
+def test_bad_cursor_is_rejected(db, client):
+    res = client.get("/mealplan/history", params={"cursor": "not-a-cursor"})
+    assert res.status_code == 400
+    assert res.json()["detail"] == "Invalid cursor"
+
+
+def test_pages_merge_hot_and_archived_plans(db, client):
+    db.meal_plans.insert_many([_plan(_day(n)) for n in (0, 1, 40, 41, 70)])
+    archive.archive_old_plans(max_age_days=30)
+    assert db.meal_plans.count_documents({}) == 2
+    items = _pages(client, 2)
+    assert [p["date"] for p in items] == [_day(n) for n in (0, 1, 40, 41, 70)]
+    assert [bool(p.get("archived")) for p in items] == [False, False, True, True, True]
+    assert len({p["id"] for p in items}) == 5
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import data_access
+from app.auth import decode_access_token
+from app.dependencies import get_user_profile
+from app.routes import mealplan_routes
+from app.routes.mealplan_routes import _etag_matches, _plan_etag
+from app.services import recipe_store
+
+USER = "a@example.com"
+
+
+def test_plan_etag_changes_with_updates_and_matches_weakly():
+    version = {"_id": "abc", "created_at": "2024-03-01T07:00:00"}
+    etag = _plan_etag(version)
+    assert _etag_matches(etag, etag)
+    assert _etag_matches(f'"other", W/{etag}', etag)
+    assert not _etag_matches(None, etag)
+    assert _plan_etag({**version, "whatsapp_sent_at": "2024-03-01T08:00:00"}) != etag
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(data_access, "mealplans_col", database.meal_plans)
+    monkeypatch.setattr(recipe_store, "recipes_col", database.recipes)
+    return database
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(mealplan_routes.router)
+    app.dependency_overrides[decode_access_token] = lambda: USER
+    app.dependency_overrides[get_user_profile] = lambda: {"email": USER, "timezone": "UTC"}
+    return TestClient(app)
+
+
+def _insert_today(db, **extra):
+    today = mealplan_routes._user_today({"timezone": "UTC"})
+    doc = {"user_id": USER, "date": today, "created_at": datetime.utcnow().isoformat(),
+           "breakfast": {"recipe_name": "Poha"}, **extra}
+    return db.meal_plans.insert_one(doc).inserted_id
+
+
+def test_today_returns_plan_with_etag(db, client):
+    _insert_today(db)
+    res = client.get("/mealplan/today")
+    assert res.status_code == 200
+    assert res.headers["etag"].startswith('"')
+    assert res.json()["meal_plan"]["breakfast"]["recipe_name"] == "Poha"
+    assert "user_id" not in res.json()["meal_plan"]
+
+
+def test_today_404_without_a_plan(db, client):
+    assert client.get("/mealplan/today").status_code == 404
+
+
+@pytest.mark.parametrize("header", ["{etag}", "W/{etag}", '"stale", {etag}', '"stale",W/{etag}', "*"])
+def test_matching_if_none_match_gets_304(db, client, header):
+    _insert_today(db)
+    etag = client.get("/mealplan/today").headers["etag"]
+    res = client.get("/mealplan/today", headers={"If-None-Match": header.format(etag=etag)})
+    assert res.status_code == 304
+    assert res.headers["etag"] == etag
+    assert not res.content
+
+
+@pytest.mark.parametrize("fields", [
+    lambda: {"provisional": False, "upgrade_status": "upgraded"},
+    lambda: {"whatsapp_sent_at": datetime.utcnow().isoformat()},
+], ids=["provisional_upgrade", "whatsapp_send"])
+def test_updates_change_the_etag(db, client, fields):
+    plan_id = _insert_today(db, provisional=True, upgrade_status="pending")
+    etag = client.get("/mealplan/today").headers["etag"]
+    # Same write path as the provisional upgrade and the WhatsApp send (bumps updated_at)
+    asyncio.run(data_access.mealplans.update({"_id": plan_id}, fields()))
+    res = client.get("/mealplan/today", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+    assert client.get("/mealplan/today", headers={"If-None-Match": res.headers["etag"]}).status_code == 304
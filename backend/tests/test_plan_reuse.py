@@ -0,0 +1,50 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.plan_reuse import inventory_fingerprint, should_reuse
+
+
+def test_fingerprint_ignores_order_and_case():
+    a = [{"name": "Rice", "quantity": 1, "unit": "kg"}, {"name": "egg", "quantity": 6.0, "unit": "pcs"}]
+    b = [{"name": "egg", "quantity": 6, "unit": "PCS"}, {"name": "rice", "quantity": 1.0, "unit": "kg"}]
+    assert inventory_fingerprint(a) == inventory_fingerprint(b)
+    assert inventory_fingerprint(a) != inventory_fingerprint(a[:1])
+
+
+def test_should_reuse_per_policy():
+    items = [{"name": "rice", "quantity": 1, "unit": "kg"}]
+    plan = {"inventory_fingerprint": inventory_fingerprint(items)}
+    assert not should_reuse(None, items, "always")
+    assert should_reuse({}, items, "always") is False
+    assert should_reuse(plan, [], "always")
+    assert should_reuse(plan, items, "if_unchanged")
+    assert not should_reuse(plan, items + [{"name": "egg", "quantity": 1, "unit": "pcs"}], "if_unchanged")
+    assert not should_reuse(plan, items, "never")
+
+
+def test_provisional_plans_are_not_delivered():
+    items = [{"name": "rice", "quantity": 1, "unit": "kg"}]
+    plan = {"inventory_fingerprint": inventory_fingerprint(items), "provisional": True}
+    assert should_reuse(plan, items, "always")
+    for policy in ("always", "if_unchanged"):
+        assert not should_reuse(plan, items, policy, for_delivery=True)
+    assert should_reuse({**plan, "provisional": False}, items, "always", for_delivery=True)
+
+
+def test_unknown_policy_fails_loudly(monkeypatch):
+    from app import config
+
+    monkeypatch.setenv("PLAN_REUSE_POLICY", "sometimes")
+    with pytest.raises(ValueError):
+        importlib.reload(config)
+    monkeypatch.setenv("PLAN_REUSE_POLICY", " If_Unchanged ")
+    assert importlib.reload(config).PLAN_REUSE_POLICY == "if_unchanged"
+    monkeypatch.delenv("PLAN_REUSE_POLICY")
+    importlib.reload(config)
+    with pytest.raises(ValueError):
+        should_reuse({"date": "2024-01-01"}, [], policy="sometimes")
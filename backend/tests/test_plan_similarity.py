@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import plan_similarity
+from app.services.ingredient_canon import pantry_set
+from app.services.plan_similarity import (
+    _adapt,
+    _signature_doc,
+    band_keys,
+    jaccard,
+    minhash,
+    plan_ingredient_set,
+)
+
+
+def _plan(*names):
+    used = [{"name": n, "quantity": 2, "unit": "pcs"} for n in names]
+    return {k: {"recipe_name": k, "ingredients_used": list(used)} for k in ("breakfast", "lunch", "dinner")}
+
+
+def test_names_are_canonical_and_staples_ignored():
+    assert plan_ingredient_set(_plan("Rice", "Eggs", "Salt", "oil")) == {"rice", "egg"}
+
+
+def test_identical_sets_share_every_band_and_similar_sets_some():
+    a = {"rice", "egg", "tomato", "onion", "chicken"}
+    assert band_keys(minhash(a)) == band_keys(minhash(set(a)))
+    close = band_keys(minhash(a | {"garlic"}))
+    far = band_keys(minhash({"oats", "milk", "banana", "apple", "honey"}))
+    shared_close = len(set(close) & set(band_keys(minhash(a))))
+    shared_far = len(set(far) & set(band_keys(minhash(a))))
+    assert shared_close > shared_far
+    assert jaccard(a, a | {"garlic"}) == 5 / 6
+
+
+def test_adapt_uses_pantry_names_and_caps_quantities():
+    pantry = pantry_set([{"name": "Egg", "quantity": 1, "unit": "pcs"}, {"name": "rice", "quantity": 0, "unit": "g"}])
+    assert set(pantry) == {"egg"}
+    adapted = _adapt(_plan("eggs"), pantry)
+    assert adapted["lunch"]["ingredients_used"] == [{"name": "Egg", "quantity": 1.0, "unit": "pcs"}]
+
+
+def test_provisional_and_copied_plans_are_not_indexed():
+    assert _signature_doc("id", {"user_id": "u", **_plan("rice", "egg")})["ingredients"] == ["egg", "rice"]
+    assert _signature_doc("id", {"provisional": True, **_plan("rice", "egg")}) is None
+    assert _signature_doc("id", {"similar_to": "x", **_plan("rice", "egg")}) is None
+    assert _signature_doc("id", _plan("rice")) is None
+
+
+def test_candidates_are_ranked_before_the_cap(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    col = mongomock.MongoClient().db.plan_signatures
+    monkeypatch.setattr(plan_similarity, "plan_signatures_col", col)
+    monkeypatch.setattr(plan_similarity, "MAX_CANDIDATES", 2)
+    pantry = {"rice", "egg", "tomato", "onion", "chicken"}
+    # Stored first: plans needing an ingredient the pantry lacks, then one from the asking user
+    for i in range(5):
+        col.insert_one(_signature_doc(f"missing{i}", {"user_id": "u", **_plan(*pantry, f"extra{i}")}))
+    col.insert_one(_signature_doc("own", {"user_id": "me", **_plan(*pantry)}))
+    col.insert_one(_signature_doc("partial", {"user_id": "u", **_plan("rice", "egg", "tomato", "onion")}))
+    col.insert_one(_signature_doc("exact", {"user_id": "u", **_plan(*pantry)}))
+
+    candidates = plan_similarity.find_candidates(pantry, exclude_user="me")
+    assert [sig["_id"] for _, sig in candidates] == ["exact", "partial"]
+    assert candidates[0][0] == 1.0
+    assert "bands" not in candidates[0][1]
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+
+from app.services import plan_upgrade
+
+ITEMS = [{"name": "rice", "quantity": 1, "unit": "kg"}]
+
+
+class FakePlans:
+    def __init__(self, cached=None):
+        self.cached = cached
+        self.docs = {}
+
+    async def latest_for_fingerprint(self, user_id, fingerprint):
+        return self.cached
+
+    async def insert(self, doc):
+        plan_id = ObjectId()
+        self.docs[plan_id] = dict(doc)
+        return plan_id
+
+    async def update(self, query, fields):
+        doc = self.docs.get(query["_id"])
+        if doc is None or doc.get("provisional") != query.get("provisional", doc.get("provisional")):
+            return 0
+        doc.update(fields)
+        return 1
+
+
+def _run(monkeypatch, plans, generate):
+    monkeypatch.setattr(plan_upgrade, "mealplans", plans)
+    monkeypatch.setattr(plan_upgrade, "generate_plan", generate)
+    monkeypatch.setattr(plan_upgrade, "dehydrate_plan", lambda doc: doc)
+    monkeypatch.setattr(plan_upgrade, "index_plan", lambda plan_id, doc: None)
+
+    async def scenario():
+        plan_id = await plan_upgrade.save_provisional("u@x.com", "2026-01-01", ITEMS, "manual_api")
+        provisional = dict(plans.docs[plan_id])
+        await asyncio.gather(*plan_upgrade._tasks)
+        return provisional, plans.docs[plan_id]
+
+    return asyncio.run(scenario())
+
+
+def test_local_plan_is_upgraded_in_place(monkeypatch):
+    llm = {k: {"recipe_name": f"LLM {k}"} for k in ("breakfast", "lunch", "dinner")}
+    provisional, upgraded = _run(monkeypatch, FakePlans(), lambda user_id, items, fallback: llm)
+    assert provisional["provisional"] is True
+    assert provisional["provisional_source"] == "local"
+    assert provisional["breakfast"]["recipe_name"] != "LLM breakfast"
+    assert upgraded["provisional"] is False
+    assert upgraded["upgrade_status"] == "upgraded"
+    assert upgraded["dinner"]["recipe_name"] == "LLM dinner"
+
+
+def test_cached_plan_for_same_inventory_is_served_first(monkeypatch):
+    cached = {k: {"recipe_name": f"Old {k}"} for k in ("breakfast", "lunch", "dinner")}
+
+    def fail(user_id, items, fallback):
+        raise RuntimeError("provider down")
+
+    provisional, after = _run(monkeypatch, FakePlans(cached=cached), fail)
+    assert provisional["provisional_source"] == "cached"
+    assert provisional["lunch"]["recipe_name"] == "Old lunch"
+    # A failed upgrade keeps the provisional plan
+    assert after["provisional"] is True
+    assert after["upgrade_status"] == "failed"
+    assert after["lunch"]["recipe_name"] == "Old lunch"
+
+
+def test_provider_failure_is_not_upgraded_to_a_fallback(monkeypatch):
+    from app.services import gemini_service, plan_generation
+
+    monkeypatch.setattr(plan_generation, "PLAN_SIMILARITY_REUSE", False)
+    monkeypatch.setattr(plan_generation, "LOCAL_CORPUS_FIRST", False)
+    monkeypatch.setattr(gemini_service, "GEMINI_API_KEY", "test-key")
+    fallbacks = []
+
+    def down(payload, model):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(gemini_service, "_post_gemini", down)
+    monkeypatch.setattr(gemini_service, "openai_generate_meal_plan",
+                        lambda items, fallback=True: fallbacks.append(fallback) or plan_generation.local_plan(items))
+    provisional, after = _run(monkeypatch, FakePlans(), plan_generation.generate_plan)
+    assert fallbacks == []
+    assert after["provisional"] is True
+    assert after["upgrade_status"] == "failed"
+    assert after["breakfast"] == provisional["breakfast"]
+
+
+def test_stale_pending_upgrades_are_failed(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    col = mongomock.MongoClient().db.meal_plans
+    monkeypatch.setattr(plan_upgrade, "mealplans_col", col)
+    old = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+    col.insert_many([
+        {"date": "a", "provisional": True, "upgrade_status": "pending", "created_at": old},
+        {"date": "b", "provisional": True, "upgrade_status": "pending", "created_at": datetime.utcnow().isoformat()},
+        {"date": "c", "provisional": False, "upgrade_status": "upgraded", "created_at": old},
+    ])
+    assert plan_upgrade.fail_stale_upgrades(stale_minutes=15) == 1
+    assert {p["date"]: p["upgrade_status"] for p in col.find()} == {"a": "failed", "b": "pending", "c": "upgraded"}
@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.provider_quota import BATCH, INTERACTIVE, ProviderBudget, QuotaExhausted, priority_class, current_priority
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_requests_per_minute_window_slides():
+    clock = FakeClock()
+    budget = ProviderBudget("test", rpm=2, tpm=10000, batch_headroom=0, clock=clock)
+    budget.acquire(10, INTERACTIVE, timeout=0)
+    budget.acquire(10, INTERACTIVE, timeout=0)
+    with pytest.raises(QuotaExhausted):
+        budget.acquire(10, INTERACTIVE, timeout=0)
+    clock.now += 61
+    budget.acquire(10, INTERACTIVE, timeout=0)
+
+
+def test_tokens_per_minute_and_settle():
+    clock = FakeClock()
+    budget = ProviderBudget("test", rpm=100, tpm=1000, batch_headroom=0, clock=clock)
+    reservation = budget.acquire(900, INTERACTIVE, timeout=0)
+    assert not budget.has_capacity(200, INTERACTIVE)
+    # Actual usage was lower than the estimate
+    budget.settle(reservation, 300)
+    assert budget.has_capacity(200, INTERACTIVE)
+
+
+def test_batch_only_uses_capacity_above_headroom():
+    clock = FakeClock()
+    budget = ProviderBudget("test", rpm=4, tpm=100000, batch_headroom=0.5, clock=clock)
+    budget.acquire(10, BATCH, timeout=0)
+    budget.acquire(10, BATCH, timeout=0)
+    assert not budget.has_capacity(10, BATCH)
+    # Interactive traffic still has the reserved half
+    assert budget.has_capacity(10, INTERACTIVE)
+
+
+def test_waiting_interactive_call_preempts_batch():
+    budget = ProviderBudget("test", rpm=1, tpm=100000, batch_headroom=0)
+    budget.acquire(10, INTERACTIVE, timeout=0)
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(budget.acquire(10, INTERACTIVE, timeout=0.3)))
+    waiter.start()
+    while not budget._waiting[INTERACTIVE]:
+        time.sleep(0.01)
+    budget._window.clear()
+    # The slot just freed up, but an interactive caller is queued for it
+    assert not budget.has_capacity(10, BATCH)
+    waiter.join()
+    assert admitted
+    assert not budget.has_capacity(10, BATCH)
+
+
+def test_provider_429_pauses_budget():
+    clock = FakeClock()
+    budget = ProviderBudget("test", rpm=100, tpm=100000, clock=clock)
+    budget.throttled(20)
+    assert not budget.has_capacity(10, INTERACTIVE)
+    clock.now += 21
+    assert budget.has_capacity(10, INTERACTIVE)
+
+
+def test_priority_class_context():
+    assert current_priority() == INTERACTIVE
+    with priority_class(BATCH):
+        assert current_priority() == BATCH
+    assert current_priority() == INTERACTIVE
+
+
+def test_release_returns_unused_reservation():
+    clock = FakeClock()
+    budget = ProviderBudget("test", rpm=1, tpm=10000, batch_headroom=0, clock=clock)
+    reservation = budget.acquire(10, INTERACTIVE, timeout=0)
+    assert not budget.has_capacity(10, INTERACTIVE)
+    budget.release(reservation)
+    assert budget.has_capacity(10, INTERACTIVE)
+    budget.release(reservation)
+
+
+def test_gemini_404_does_not_use_quota(monkeypatch):
+    from app.services import gemini_service
+
+    class Response:
+        def __init__(self, status_code):
+            self.status_code, self.headers = status_code, {}
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"usageMetadata": {"totalTokenCount": 50}}
+
+    statuses = iter([404, 404, 200])
+    budget = ProviderBudget("test", rpm=1, tpm=10000, batch_headroom=0, clock=FakeClock())
+    monkeypatch.setattr(gemini_service, "gemini_budget", budget)
+    monkeypatch.setattr(gemini_service.requests, "post", lambda *a, **k: Response(next(statuses)))
+    assert gemini_service._post_gemini({"contents": []}, "test-model")["usageMetadata"]["totalTokenCount"] == 50
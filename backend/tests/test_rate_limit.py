@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import metrics
+from app.services.rate_limit import GenerationGate, Overloaded, TokenBucket
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(rate_per_second=0.5, capacity=2)
+    assert bucket.take("u", now=0.0) == (True, 0.0)
+    assert bucket.take("u", now=0.0) == (True, 0.0)
+    allowed, retry_after = bucket.take("u", now=0.0)
+    assert not allowed
+    assert retry_after == pytest.approx(2.0)
+    # Other users have their own budget
+    assert bucket.take("v", now=0.0)[0]
+    assert bucket.take("u", now=2.0)[0]
+
+
+def test_token_bucket_evicts_oldest_keys():
+    bucket = TokenBucket(rate_per_second=1, capacity=1, max_keys=2)
+    for key in ("a", "b", "c"):
+        bucket.take(key, now=0.0)
+    # "a" was evicted, so it starts again with a full bucket
+    assert bucket.take("a", now=0.0)[0]
+    assert not bucket.take("c", now=0.0)[0]
+
+
+def test_gate_sheds_when_queue_is_full():
+    gate = GenerationGate(max_concurrent=1, max_queue=1, timeout=5)
+    gate.acquire()
+    waiter = threading.Thread(target=lambda: (gate.acquire(), gate.release()))
+    waiter.start()
+    while gate.waiting < 1:
+        time.sleep(0.01)
+    before = metrics.get("generation_shed_total", reason="queue_full")
+    with pytest.raises(Overloaded) as exc:
+        gate.acquire()
+    assert exc.value.reason == "queue_full"
+    assert metrics.get("generation_shed_total", reason="queue_full") == before + 1
+    gate.release()
+    waiter.join(timeout=2)
+    assert gate.active == 0 and gate.waiting == 0
+
+
+def test_gate_times_out_waiters():
+    gate = GenerationGate(max_concurrent=1, max_queue=4, timeout=0.05)
+    gate.acquire()
+    with pytest.raises(Overloaded) as exc:
+        gate.acquire()
+    assert exc.value.reason == "timeout"
+    gate.release()
+    gate.acquire()
+    gate.release()
+
+
+def test_release_wakes_waiters_behind_a_timed_out_one():
+    gate = GenerationGate(max_concurrent=1, max_queue=4, timeout=0.05)
+    gate.acquire()
+    acquired = threading.Event()
+    scheduler = threading.Thread(target=lambda: (gate.acquire(shed=False), acquired.set(), gate.release()))
+    scheduler.start()
+    while gate.waiting < 1:
+        time.sleep(0.01)
+    with pytest.raises(Overloaded):
+        gate.acquire()
+    gate.release()
+    assert acquired.wait(2)
+    scheduler.join(timeout=2)
+    assert gate.active == 0 and gate.waiting == 0
@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.ingredient_canon import canonical_name
+from app.services.recipe_corpus import RecipeCorpus, get_corpus
+
+PANTRY = [
+    {"name": "Rice", "quantity": 1, "unit": "kg"},
+    {"name": "Eggs", "quantity": 1, "unit": "pcs"},
+    {"name": "onion", "quantity": 3, "unit": "pcs"},
+    {"name": "Tomatoes", "quantity": 4, "unit": "pcs"},
+    {"name": "bread", "quantity": 4, "unit": "slices"},
+]
+
+
+def test_bundled_corpus_plans_from_pantry_only():
+    plan = get_corpus().meal_plan(PANTRY)
+    assert set(plan) == {"breakfast", "lunch", "dinner"}
+    assert len({meal["recipe_name"] for meal in plan.values()}) == 3
+    pantry_names = {canonical_name(i["name"]) for i in PANTRY}
+    for meal in plan.values():
+        assert {canonical_name(i["name"]) for i in meal["ingredients_used"]} <= pantry_names
+        assert not any("{" in step for step in meal["steps"])
+    # Quantities are capped at what the pantry holds (one egg)
+    eggs = [i for m in plan.values() for i in m["ingredients_used"] if i["name"] == "Eggs"]
+    assert eggs and all(i["quantity"] <= 1 for i in eggs)
+
+
+def test_no_plan_when_a_meal_cannot_be_covered():
+    assert get_corpus().meal_plan([{"name": "chana dal", "quantity": 500, "unit": "g"}]) is None
+
+
+def test_scoring_prefers_recipes_using_more_of_the_pantry():
+    corpus = RecipeCorpus([
+        {"id": "a", "name": "Plain", "meals": ["lunch"], "ingredients": [{"name": "rice"}], "steps": []},
+        {"id": "b", "name": "Loaded", "meals": ["lunch"],
+         "ingredients": [{"name": "rice"}, {"name": "peas", "optional": True}], "steps": ["Cook {rice} with {peas}."]},
+        {"id": "c", "name": "Needs chicken", "meals": ["lunch"],
+         "ingredients": [{"name": "rice"}, {"name": "chicken"}], "steps": []},
+    ])
+    scores = corpus.score({"rice", "peas"})
+    assert set(scores) == {0, 1}
+    assert corpus.best_meals({"rice", "peas"}) == {"lunch": 1}
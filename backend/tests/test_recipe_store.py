@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import recipe_store
+from app.services.cache import TTLCache
+from app.services.recipe_store import normalize_recipe, recipe_hash
+
+
+RECIPE = {
+    "recipe_name": "Egg & Tomato Skillet",
+    "ingredients_used": [{"name": "eggs", "quantity": 2, "unit": "pcs"}],
+    "steps": ["Crack 2 eggs into a bowl.", "Whisk for 30 seconds."],
+    "prep_time": "5 mins",
+}
+
+
+def test_recipe_hash_ignores_formatting_noise():
+    noisy = {
+        "prep_time": " 5  mins",
+        "steps": ["Crack 2 eggs into a bowl. ", "Whisk for 30 seconds."],
+        "ingredients_used": [{"unit": "pcs", "quantity": 2.0, "name": "eggs"}],
+        "recipe_name": "Egg &  Tomato Skillet",
+        "_id": "ignored",
+    }
+    assert recipe_hash(noisy) == recipe_hash(RECIPE)
+
+
+def test_recipe_hash_changes_with_content():
+    changed = dict(RECIPE, steps=RECIPE["steps"] + ["Serve warm."])
+    assert recipe_hash(changed) != recipe_hash(RECIPE)
+
+
+def test_normalize_recipe_only_feeds_the_hash():
+    body = normalize_recipe(RECIPE)
+    assert body["ingredients_used"][0]["quantity"] == 2.0
+    assert recipe_hash(body) == recipe_hash(RECIPE)
+
+
+def test_stored_body_is_the_original(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    col = mongomock.MongoClient().db.recipes
+    monkeypatch.setattr(recipe_store, "recipes_col", col)
+    monkeypatch.setattr(recipe_store, "_recipe_cache", TTLCache(maxsize=10, ttl=None))
+    spaced = dict(RECIPE, prep_time=" 5  mins")
+    [h] = recipe_store.store_recipes([RECIPE])
+    assert recipe_store.store_recipes([spaced]) == [h]
+    stored = col.find_one({"_id": h})
+    assert stored["ingredients_used"][0]["quantity"] == 2
+    assert isinstance(stored["ingredients_used"][0]["quantity"], int)
+    assert stored["recipe_name"] == "Egg & Tomato Skillet"
+    # Another process reads the stored body, not a formatting variant
+    recipe_store._recipe_cache.clear()
+    recipe_store.store_recipes([spaced])
+    assert recipe_store._fetch_recipes([h])[h]["prep_time"] == "5 mins"
@@ -0,0 +1,24 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+
+from app.responses import FastJSONResponse, dumps
+
+
+def test_dumps_encodes_mongo_types_stably():
+    oid = ObjectId()
+    rows = [{"_id": oid, "name": "rice", "quantity": 2.0, "unit": "kg", "created_at": datetime(2024, 1, 2, 3, 4, 5)}]
+    first = dumps(rows)
+    assert first == dumps(rows)
+    assert json.loads(first) == [{"_id": str(oid), "name": "rice", "quantity": 2.0, "unit": "kg", "created_at": "2024-01-02T03:04:05"}]
+
+
+def test_fast_json_response_sets_media_type():
+    response = FastJSONResponse([{"name": "egg"}])
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == [{"name": "egg"}]
@@ -0,0 +1,61 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+import pytz
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import database
+from app.services import scheduler
+
+ITEMS = [{"name": "rice", "quantity": 1, "unit": "kg"}]
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 1, 1, 7, 30, tzinfo=pytz.utc).astimezone(tz)
+
+
+def _setup(monkeypatch, generate):
+    mongomock = pytest.importorskip("mongomock")
+    db = mongomock.MongoClient().db
+    db.users.insert_one({"email": "u@x.com", "phone": "+100", "whatsappVerified": True,
+                         "delivery_enabled": True, "delivery_time": "08:00", "timezone": "UTC"})
+    monkeypatch.setattr(scheduler, "users_col", db.users)
+    monkeypatch.setattr(database, "mealplans_col", db.meal_plans)
+    monkeypatch.setattr(scheduler, "datetime", FrozenDatetime)
+    monkeypatch.setattr(scheduler, "SCHEDULER_PREGENERATE_MINUTES", 60)
+    monkeypatch.setattr(scheduler, "list_ingredients", lambda user_id: ITEMS)
+    monkeypatch.setattr(scheduler, "batch_capacity_available", lambda: True)
+    monkeypatch.setattr(scheduler, "generate_plan", generate)
+    monkeypatch.setattr(scheduler, "dehydrate_plan", lambda doc: doc)
+    monkeypatch.setattr(scheduler, "index_plan", lambda plan_id, doc: None)
+    return db
+
+
+def test_pregenerated_llm_plan_is_stored(monkeypatch):
+    calls = []
+
+    def generate(user_id, items, **kwargs):
+        calls.append(kwargs)
+        return {k: {"recipe_name": f"LLM {k}"} for k in ("breakfast", "lunch", "dinner")}
+
+    db = _setup(monkeypatch, generate)
+    scheduler.job_pregenerate_mealplans()
+    assert calls[0]["fallback"] is False
+    stored = db.meal_plans.find_one({"user_id": "u@x.com", "date": "2026-01-01"})
+    assert stored["origin"] == "scheduler_pregenerate"
+    assert stored["lunch"]["recipe_name"] == "LLM lunch"
+
+
+def test_provider_failure_stores_no_fallback_plan(monkeypatch):
+    def generate(user_id, items, **kwargs):
+        assert kwargs["fallback"] is False
+        raise RuntimeError("quota exhausted")
+
+    db = _setup(monkeypatch, generate)
+    scheduler.job_pregenerate_mealplans()
+    assert db.meal_plans.count_documents({}) == 0
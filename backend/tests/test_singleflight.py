@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import metrics
+from app.services.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight("test_share")
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"breakfast": {"recipe_name": "Poha"}}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [{"breakfast": {"recipe_name": "Poha"}}] * 5
+    assert len({id(r) for r in results}) == 5
+    assert metrics.get("singleflight_coalesced_total", group="test_share") == 4
+    assert metrics.get("singleflight_waiters", group="test_share") == 0
+    # Nothing is cached once the flight lands
+    flight.do("k", slow)
+    assert len(calls) == 2
+
+
+def test_plan_flights_are_separate_per_priority(monkeypatch):
+    from app.services import plan_generation
+    from app.services.provider_quota import BATCH, INTERACTIVE, current_priority
+
+    monkeypatch.setattr(plan_generation, "PLAN_SIMILARITY_REUSE", False)
+    monkeypatch.setattr(plan_generation, "LOCAL_CORPUS_FIRST", False)
+    started = threading.Event()
+    release = threading.Event()
+    seen = []
+
+    def generate(items, fallback=True):
+        seen.append(current_priority())
+        started.set()
+        release.wait(2)
+        return {"priority": current_priority()}
+
+    monkeypatch.setattr(plan_generation, "generate_meal_plan", generate)
+    items = [{"name": "rice", "quantity": 1, "unit": "kg"}]
+    results = {}
+    batch = threading.Thread(target=lambda: results.update(
+        batch=plan_generation.generate_plan("u", items, shed=False, priority=BATCH)))
+    batch.start()
+    started.wait(2)
+    # An interactive request does not join the batch flight
+    interactive = threading.Thread(target=lambda: results.update(
+        interactive=plan_generation.generate_plan("u", items, priority=INTERACTIVE)))
+    interactive.start()
+    while len(seen) < 2 and interactive.is_alive():
+        time.sleep(0.01)
+    release.set()
+    batch.join()
+    interactive.join()
+    assert sorted(seen) == [BATCH, INTERACTIVE]
+    assert results == {"batch": {"priority": BATCH}, "interactive": {"priority": INTERACTIVE}}
+
+
+def test_coalesced_plan_requests_are_charged_once(monkeypatch):
+    from app.services import plan_generation
+
+    monkeypatch.setattr(plan_generation, "PLAN_SIMILARITY_REUSE", False)
+    monkeypatch.setattr(plan_generation, "LOCAL_CORPUS_FIRST", False)
+    charged = []
+    monkeypatch.setattr(plan_generation, "check_rate_limit", lambda user_id, scope: charged.append((user_id, scope)))
+    started = threading.Event()
+    release = threading.Event()
+
+    def generate(items, fallback=True):
+        started.set()
+        release.wait(2)
+        return {"breakfast": {"recipe_name": "Poha"}}
+
+    monkeypatch.setattr(plan_generation, "generate_meal_plan", generate)
+    items = [{"name": "rice", "quantity": 1, "unit": "kg"}]
+    call = lambda: plan_generation.generate_plan("u", items, rate_limit_scope="preview")
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    threads[0].start()
+    started.wait(2)
+    for t in threads[1:]:
+        t.start()
+    while metrics.get("singleflight_waiters", group="plan_generation") < 2:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert charged == [("u", "preview")]
+    # No scope, no charge (the scheduler path)
+    plan_generation.generate_plan("u", items)
+    assert charged == [("u", "preview")]
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.stage_graph import SKIPPED, Stage, run_stage_graph
+
+
+def test_independent_stages_overlap_and_dependents_wait():
+    order = []
+
+    async def step(name, delay, value=None):
+        order.append(f"{name}:start")
+        await asyncio.sleep(delay)
+        order.append(f"{name}:end")
+        return value
+
+    async def run():
+        return await run_stage_graph({
+            "a": Stage(lambda r: step("a", 0.05, 1)),
+            "b": Stage(lambda r: step("b", 0.05, 2)),
+            "c": Stage(lambda r: step("c", 0, r["a"] + r["b"]), ("a", "b")),
+            "d": Stage(lambda r: asyncio.sleep(0, SKIPPED), ("c",)),
+        })
+
+    results, timings = asyncio.run(run())
+    assert results == {"a": 1, "b": 2, "c": 3, "d": None}
+    assert order[:2] == ["a:start", "b:start"]
+    assert order.index("c:start") > max(order.index("a:end"), order.index("b:end"))
+    assert set(timings) == {"a", "b", "c", "d"}
+
+
+def test_failure_cancels_running_stages():
+    cancelled = []
+
+    async def slow(_):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def bad(_):
+        raise ValueError("invalid input")
+
+    async def never(_):
+        raise AssertionError("dependent stage must not run")
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_stage_graph({"slow": Stage(slow), "bad": Stage(bad), "after": Stage(never, ("bad",))}))
+    assert cancelled == [True]
+
+
+def test_agentic_schedule_is_saved_only_after_the_plan(monkeypatch):
+    from fastapi import HTTPException
+
+    from app.routes import agentic_routes
+    from app.routes.agentic_routes import AgenticRunRequest, _agentic_pipeline
+    from app.services.agentic_jobs import StageRecorder
+
+    saved = []
+
+    class Ingredients:
+        async def list_for_user(self, user_id):
+            return [{"name": "rice", "quantity": 1, "unit": "kg"}]
+
+    class MealPlans:
+        async def get_for_date(self, user_id, date):
+            return None
+
+    class Users:
+        async def update(self, user_id, fields):
+            saved.append(fields)
+
+    def failing_generation(user_id, items, rate_limit_scope=None):
+        raise HTTPException(status_code=502, detail="Plan generation failed")
+
+    monkeypatch.setattr(agentic_routes, "ingredients", Ingredients())
+    monkeypatch.setattr(agentic_routes, "mealplans", MealPlans())
+    monkeypatch.setattr(agentic_routes, "users", Users())
+    monkeypatch.setattr(agentic_routes, "generate_plan", failing_generation)
+    payload = AgenticRunRequest(delivery_time="07:30")
+    with pytest.raises(HTTPException):
+        asyncio.run(_agentic_pipeline(payload, "a@example.com", {}, StageRecorder()))
+    assert saved == []
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.step_sanitizer import check_step, looks_generic, recipe_foods, review_steps, sanitize_steps
+
+INGREDIENTS = [{"name": "Bananas"}, {"name": "Biscuits"}, {"name": "Moong dal"}, {"name": "Potatoes"}]
+
+
+def test_drops_equipment_lists_and_rewrites_packaged_foods():
+    steps = [
+        "Set out a cutting board and knife.",
+        "Put the pot, pan, and knife on the counter.",
+        "Wash and dice 200g biscuits.",
+        "Chop 1 cup moong dal finely.",
+        "Wash and chop 2 bananas.",
+        "Wash and chop 2 bananas.",
+        "Add potatoes to the pan.",
+    ]
+    assert sanitize_steps(steps, INGREDIENTS) == [
+        "Crush biscuits into coarse crumbs.",
+        "Rinse moong dal; boil until tender and season.",
+        "Peel and slice bananas.",
+        "Add potatoes to the pan.",
+    ]
+    assert sanitize_steps(["Step"] * 20, []) == ["Step"]
+    assert len(sanitize_steps([f"Step {i}" for i in range(20)], [])) == 10
+
+
+def test_food_rules_need_the_ingredient_and_whole_words():
+    # Not in the recipe: left alone
+    assert check_step("Wash and chop biscuits.", []).text == "Wash and chop biscuits."
+    # "pot" inside "potato" is not equipment
+    assert check_step("Peel the potato, potatoes and pots", recipe_foods(INGREDIENTS)).text.startswith("Peel")
+    assert recipe_foods(INGREDIENTS) == ["banana", "biscuits", "moong dal"]
+
+
+def test_quality_signals_from_the_same_scan():
+    check = check_step("Heat 1 tbsp oil in a skillet for 2 minutes.")
+    assert check.action_first and check.signal
+    check = check_step("Enjoy your dish!")
+    assert not (check.action_first or check.signal)
+    detailed = [f"Stir the rice in the pot for {i} minutes." for i in range(8)]
+    assert not looks_generic(detailed)
+    assert looks_generic(["Enjoy your dish!"] * 8)
+    assert looks_generic(detailed[:3])
+    review = review_steps(detailed + ["Wash and chop 2 bananas."], INGREDIENTS)
+    assert review == (sanitize_steps(detailed + ["Wash and chop 2 bananas."], INGREDIENTS), False)
+    assert review.steps[-1] == "Peel and slice bananas."
+
+
+def test_generic_check_keeps_substring_signals():
+    # Any "g" or "l" counts as a unit mention, as before the shared sanitizer:
+    # the verdict decides when Gemini is asked to refine steps
+    assert not looks_generic(["Stir well."] * 8)
+    assert not looks_generic(["Serve with potatoes."] * 8)
+    assert looks_generic(["Serve it warm."] * 8)
+
+
+def test_step_quality_rechecks_only_refined_recipes(monkeypatch):
+    from app.services import gemini_service
+
+    detailed = [f"Stir the rice in the pot for {i} minutes." for i in range(8)]
+    plan = {"breakfast": {"steps": list(detailed)}, "lunch": {"steps": ["Enjoy!"]}, "dinner": {"steps": list(detailed)}}
+    checked = []
+
+    def refine(plan):
+        plan["lunch"]["steps"] = [f"Boil the dal in a pot for {i} minutes." for i in range(8)]
+        return plan
+
+    monkeypatch.setattr(gemini_service, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_service, "_refine_steps_with_gemini", refine)
+    monkeypatch.setattr(gemini_service, "looks_generic", lambda steps: checked.append(steps) or looks_generic(steps))
+    result = gemini_service._ensure_step_quality(plan, [])
+    assert len(checked) == 4
+    assert result["breakfast"]["steps"] == detailed
+    assert result["lunch"]["steps"][0] == "Boil the dal in a pot for 0 minutes."